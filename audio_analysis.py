@@ -0,0 +1,482 @@
+"""
+Offline audio analysis for the library: decoding plus vectorized NumPy measurements.
+
+Loudness follows ITU-R BS.1770 / EBU R128 integrated loudness:
+- K-weighting is applied in the frequency domain: each 100 ms segment is FFT'd and
+  its power spectrum weighted by |H(f)|^2 of the two K-weighting biquads, which keeps
+  the whole measurement in batched NumPy ops (no per-sample IIR loop)
+- 400 ms blocks with 75% overlap are sliding means of four 100 ms segments
+- absolute (-70 LUFS) and relative (-10 LU) gating
+
+Waveform peaks are min/max pairs per bucket at a few fixed resolutions, stored as raw
+int16 files on disk.
+
+Decoding uses ffmpeg when available (any format, resampled to ANALYSIS_RATE) and
+falls back to pygame.mixer.Sound. ffmpeg's output is read in DECODE_CHUNK_FRAMES
+pieces and fed to incremental meters (LoudnessMeter, PeakMeter), so peak memory is
+bounded by the chunk size rather than the track length; the pygame fallback has to
+decode the whole file at once.
+"""
+
+import os
+import time
+import queue
+import shutil
+import hashlib
+import threading
+import subprocess
+
+import numpy as np
+
+ANALYSIS_RATE = 22050
+CHUNK_SEGMENTS = 600  # 60 s of 100 ms segments per FFT batch, bounds peak memory
+DECODE_CHUNK_FRAMES = CHUNK_SEGMENTS * ANALYSIS_RATE // 10  # 60 s per read from ffmpeg
+WAVEFORM_RESOLUTIONS = (4096, 1024, 256)  # buckets per track, finest first; each divides the previous
+
+
+### --- Decoding -----------------------------------------------------------------
+
+class DecoderUnavailable(RuntimeError):
+    """Nothing can decode yet: no ffmpeg, and pygame's mixer isn't initialized."""
+
+
+def decode_stream(path, sample_rate=ANALYSIS_RATE, channels=2, ffmpeg=None,
+                  chunk_frames=DECODE_CHUNK_FRAMES):
+    """Decode `path` as float32 chunks shaped (<= chunk_frames, channels) in [-1, 1].
+
+    Returns (chunks, sample_rate); chunks is a generator, and the rate differs from
+    the request when falling back to pygame, which decodes at the mixer frequency.
+    """
+    ffmpeg = ffmpeg or shutil.which('ffmpeg')
+    if ffmpeg:
+        cmd = [ffmpeg, '-nostdin', '-v', 'error', '-threads', '1', '-i', path, '-vn',
+               '-ac', str(channels), '-ar', str(sample_rate), '-f', 'f32le', '-']
+        return _ffmpeg_chunks(cmd, channels, chunk_frames), sample_rate
+
+    import pygame
+    init = pygame.mixer.get_init()
+    if init is None:
+        raise DecoderUnavailable("no ffmpeg and the mixer isn't initialized")
+    freq, size, mixer_channels = init
+    arr = pygame.sndarray.array(pygame.mixer.Sound(path))
+    if arr.ndim == 1:
+        arr = arr[:, None]
+    scale = float(2 ** (abs(size) - 1))
+    samples = arr.astype(np.float32) / scale
+    return (samples[i:i + chunk_frames] for i in range(0, len(samples), chunk_frames)), freq
+
+
+def _ffmpeg_chunks(cmd, channels, chunk_frames):
+    frame_bytes = 4 * channels
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = proc.stdout.read(chunk_frames * frame_bytes)
+            usable = len(data) - len(data) % frame_bytes
+            if usable:
+                yield np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, channels)
+            if len(data) < chunk_frames * frame_bytes:
+                break
+        stderr = proc.stderr.read()
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+    finally:
+        # Stopped early (error in a consumer): don't leave ffmpeg blocked on the pipe
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def decode_audio(path, sample_rate=ANALYSIS_RATE, channels=2, ffmpeg=None):
+    """Decode all of `path`; returns (samples shaped (n, channels), sample_rate)."""
+    chunks, rate = decode_stream(path, sample_rate, channels, ffmpeg)
+    parts = list(chunks)
+    if not parts:
+        return np.zeros((0, channels), dtype=np.float32), rate
+    return np.concatenate(parts), rate
+
+
+### --- Loudness -------------------------------------------------------------------
+
+def _biquad_power(b, a, freqs, sample_rate):
+    z = np.exp(-1j * 2 * np.pi * freqs / sample_rate)
+    num = b[0] + b[1] * z + b[2] * z * z
+    den = a[0] + a[1] * z + a[2] * z * z
+    return np.abs(num / den) ** 2
+
+
+def k_weighting_power(n_fft, sample_rate):
+    """|H(f)|^2 of the BS.1770 K-weighting filter at the rfft bins of an n_fft transform."""
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+
+    # Stage 1: high shelf (+4 dB above ~1.7 kHz, models the head); libebur128 formulation
+    gain_db, q, fc = 3.999843853973347, 0.7071752369554196, 1681.974450955533
+    K = np.tan(np.pi * fc / sample_rate)
+    Vh = 10 ** (gain_db / 20)
+    Vb = Vh ** 0.4996667741545416
+    a0 = 1 + K / q + K * K
+    shelf_b = ((Vh + Vb * K / q + K * K) / a0, 2 * (K * K - Vh) / a0, (Vh - Vb * K / q + K * K) / a0)
+    shelf_a = (1.0, 2 * (K * K - 1) / a0, (1 - K / q + K * K) / a0)
+
+    # Stage 2: RLB high-pass (~38 Hz)
+    q, fc = 0.5003270373238773, 38.13547087602444
+    K = np.tan(np.pi * fc / sample_rate)
+    a0 = 1 + K / q + K * K
+    hp_b = (1.0, -2.0, 1.0)
+    hp_a = (1.0, 2 * (K * K - 1) / a0, (1 - K / q + K * K) / a0)
+
+    return _biquad_power(shelf_b, shelf_a, freqs, sample_rate) * _biquad_power(hp_b, hp_a, freqs, sample_rate)
+
+
+class LoudnessMeter:
+    """Integrated loudness and sample peak, fed chunk by chunk with add().
+
+    Keeps one float per 100 ms segment plus a partial segment between chunks; each
+    add() transforms its whole segments in batches of CHUNK_SEGMENTS.
+    """
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.seg = int(sample_rate * 0.1)
+        # Per-bin weights: K-weighting times the one-sided spectrum factor (Parseval)
+        weights = k_weighting_power(self.seg, sample_rate)
+        weights[1:] *= 2.0
+        if self.seg % 2 == 0:
+            weights[-1] /= 2.0
+        self.weights = weights / float(self.seg) ** 2
+        self.peak = 0.0
+        self._powers = []
+        self._carry = None
+
+    def add(self, samples):
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        if samples.size:
+            self.peak = max(self.peak, float(np.max(np.abs(samples))))
+        if self._carry is not None:
+            samples = np.concatenate((self._carry, samples))
+        seg = self.seg
+        n_seg = samples.shape[0] // seg
+        for start in range(0, n_seg, CHUNK_SEGMENTS):
+            stop = min(n_seg, start + CHUNK_SEGMENTS)
+            x = samples[start * seg:stop * seg].reshape(stop - start, seg, samples.shape[1])
+            spec = np.fft.rfft(x, axis=1)
+            power = spec.real ** 2 + spec.imag ** 2
+            # mean square per segment and channel, summed over channels (G = 1 for L/R)
+            self._powers.append(np.einsum('sbc,b->s', power, self.weights))
+        rest = samples[n_seg * seg:]
+        self._carry = rest.copy() if len(rest) else None
+
+    def result(self):
+        """(integrated_lufs, sample_peak_dbfs); loudness is None for clips shorter than one
+        400 ms block or entirely below the gate."""
+        peak_dbfs = float(20 * np.log10(self.peak)) if self.peak > 0 else float('-inf')
+        seg_power = np.concatenate(self._powers) if self._powers else np.zeros(0)
+        if len(seg_power) < 4:
+            return None, peak_dbfs
+        return _gated_loudness(seg_power), peak_dbfs
+
+
+def measure_loudness(samples, sample_rate):
+    """Return (integrated_lufs, sample_peak_dbfs) for float samples shaped (n, channels)."""
+    meter = LoudnessMeter(sample_rate)
+    meter.add(samples)
+    return meter.result()
+
+
+def _gated_loudness(seg_power):
+    # 400 ms blocks, 75% overlap -> sliding mean of four 100 ms segments
+    csum = np.concatenate(([0.0], np.cumsum(seg_power)))
+    block_power = (csum[4:] - csum[:-4]) / 4.0
+    block_lufs = -0.691 + 10 * np.log10(np.maximum(block_power, 1e-12))
+
+    above_abs = block_lufs > -70.0
+    if not above_abs.any():
+        return None
+    relative_gate = -0.691 + 10 * np.log10(block_power[above_abs].mean()) - 10.0
+    gated = block_power[above_abs & (block_lufs > relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def normalization_gain_db(lufs, peak_dbfs, target_lufs=-14.0, headroom_db=1.0):
+    """Gain that brings `lufs` to the target without pushing the sample peak past -headroom."""
+    if lufs is None:
+        return 0.0
+    gain = target_lufs - lufs
+    if np.isfinite(peak_dbfs):
+        gain = min(gain, -headroom_db - peak_dbfs)
+    return float(gain)
+
+
+def analyze_loudness(path, ffmpeg=None):
+    chunks, rate = decode_stream(path, ffmpeg=ffmpeg)
+    meter = LoudnessMeter(rate)
+    for chunk in chunks:
+        meter.add(chunk)
+    return meter.result()
+
+
+### --- Waveform peaks -------------------------------------------------------------
+
+def waveform_peaks(samples, resolutions=WAVEFORM_RESOLUTIONS):
+    """Return {buckets: int16 array shaped (buckets, 2)} of (min, max) pairs per bucket.
+
+    The finest level is reduced straight from the mono mixdown; coarser levels are
+    reduced from the finest, so the samples are only scanned once.
+    """
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1)
+    finest = resolutions[0]
+    per = max(1, -(-len(samples) // finest))
+    x = np.zeros(per * finest, dtype=np.float32)
+    x[:len(samples)] = samples
+    x = x.reshape(finest, per)
+    return _levels(x.min(axis=1), x.max(axis=1), resolutions)
+
+
+def _levels(lo, hi, resolutions):
+    # Every resolution from the finest (min, max) pairs
+    finest = resolutions[0]
+    levels = {}
+    for buckets in resolutions:
+        factor = finest // buckets
+        pair = np.stack((lo.reshape(buckets, factor).min(axis=1),
+                         hi.reshape(buckets, factor).max(axis=1)), axis=1)
+        levels[buckets] = np.round(np.clip(pair, -1.0, 1.0) * 32767).astype(np.int16)
+    return levels
+
+
+class PeakMeter:
+    """waveform_peaks() fed chunk by chunk with add().
+
+    Keeps (min, max) of the mono mixdown per block of `per` frames. Past
+    2 * detail * finest blocks, neighbours are merged and `per` doubles, so memory
+    stays bounded. result() regroups the blocks into waveform_peaks()'s bucket grid:
+    exact until the first merge, after that a bucket may take in up to one extra block
+    (1/detail of a bucket) at each edge.
+    """
+
+    def __init__(self, resolutions=WAVEFORM_RESOLUTIONS, detail=16):
+        self.resolutions = resolutions
+        self.limit = 2 * detail * resolutions[0]
+        self.per = 1
+        self.frames = 0
+        self._lo = np.zeros(0, dtype=np.float32)
+        self._hi = np.zeros(0, dtype=np.float32)
+        self._part = None   # (frames, lo, hi) of the unfinished block after _lo/_hi
+
+    def add(self, samples):
+        x = samples.mean(axis=1) if samples.ndim == 2 else samples
+        self.frames += len(x)
+        per = self.per
+        los, his = [self._lo], [self._hi]
+        if self._part is not None:
+            count, lo, hi = self._part
+            head, x = x[:per - count], x[per - count:]
+            if len(head):
+                count, lo, hi = count + len(head), min(lo, head.min()), max(hi, head.max())
+            self._part = (count, lo, hi)
+            if count < per:
+                return
+            los.append(np.array([lo], dtype=np.float32))
+            his.append(np.array([hi], dtype=np.float32))
+            self._part = None
+        k = len(x) // per
+        if k:
+            blocks = x[:k * per].reshape(k, per)
+            los.append(blocks.min(axis=1))
+            his.append(blocks.max(axis=1))
+        rest = x[k * per:]
+        if len(rest):
+            self._part = (len(rest), rest.min(), rest.max())
+        self._lo = np.concatenate(los)
+        self._hi = np.concatenate(his)
+        while len(self._lo) > self.limit:
+            self._merge()
+
+    def _merge(self):
+        lo, hi = self._lo, self._hi
+        even = len(lo) - len(lo) % 2
+        if even != len(lo):
+            # the odd block out joins the unfinished one, which stays shorter than 2 * per
+            count, plo, phi = self._part or (0, lo[-1], hi[-1])
+            self._part = (count + self.per, min(plo, lo[-1]), max(phi, hi[-1]))
+        self._lo = lo[:even].reshape(-1, 2).min(axis=1)
+        self._hi = hi[:even].reshape(-1, 2).max(axis=1)
+        self.per *= 2
+
+    def result(self):
+        """{buckets: int16 array shaped (buckets, 2)}, as waveform_peaks() returns."""
+        finest = self.resolutions[0]
+        lo, hi = self._lo, self._hi
+        if self._part is not None:
+            lo = np.append(lo, np.float32(self._part[1]))
+            hi = np.append(hi, np.float32(self._part[2]))
+        n, per = self.frames, self.per
+        bucket = max(1, -(-n // finest))
+        i = np.arange(finest, dtype=np.int64)
+        starts = i * bucket // per
+        ends = np.minimum(((i + 1) * bucket - 1) // per, len(lo) - 1)
+        out_lo = np.zeros(finest, dtype=np.float32)
+        out_hi = np.zeros(finest, dtype=np.float32)
+        valid = starts < len(lo)
+        if valid.any():
+            first = starts[valid]
+            out_lo[valid] = np.minimum(np.minimum.reduceat(lo, first), lo[ends[valid]])
+            out_hi[valid] = np.maximum(np.maximum.reduceat(hi, first), hi[ends[valid]])
+        # waveform_peaks() pads the last bucket(s) with silence
+        padded = (i + 1) * bucket > n
+        out_lo[padded] = np.minimum(out_lo[padded], 0.0)
+        out_hi[padded] = np.maximum(out_hi[padded], 0.0)
+        return _levels(out_lo, out_hi, self.resolutions)
+
+
+class WaveformTask:
+    """Writes waveform peak files to `cache_dir` and sets track['waveform'] to their key.
+
+    Each level is stored as `<key>.<buckets>.i16`: interleaved little-endian int16
+    (min, max) pairs. A 5-minute track costs 16 KB at 4096 buckets and 1 KB at 256.
+    """
+
+    def __init__(self, cache_dir, resolutions=WAVEFORM_RESOLUTIONS):
+        self.cache_dir = cache_dir
+        self.resolutions = resolutions
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, path):
+        st = os.stat(path)
+        return hashlib.blake2b(f"{path}:{st.st_size}:{st.st_mtime_ns}".encode(), digest_size=12).hexdigest()
+
+    def peaks_path(self, key, buckets):
+        return os.path.join(self.cache_dir, f"{key}.{buckets}.i16")
+
+    def needed(self, track):
+        if 'waveform' in track:
+            return False
+        try:
+            key = self.key(track['path'])
+        except OSError:
+            return False
+        if all(os.path.exists(self.peaks_path(key, n)) for n in self.resolutions):
+            track['waveform'] = key  # computed by a previous run
+            return False
+        return True
+
+    def meter(self, rate):
+        return PeakMeter(self.resolutions)
+
+    def run(self, track, meter):
+        key = self.key(track['path'])
+        for buckets, pairs in meter.result().items():
+            target = self.peaks_path(key, buckets)
+            tmp = target + '.part'
+            with open(tmp, 'wb') as f:
+                f.write(pairs.astype('<i2').tobytes())
+            os.replace(tmp, target)
+        track['waveform'] = key
+
+    def read(self, key, buckets, bits=8):
+        """Raw peak bytes for one level; bits=8 narrows to int8 (half the size)."""
+        with open(self.peaks_path(key, buckets), 'rb') as f:
+            data = f.read()
+        if bits == 8:
+            data = (np.frombuffer(data, dtype='<i2') >> 8).astype(np.int8).tobytes()
+        return data
+
+
+### --- Background worker ----------------------------------------------------------
+
+class LoudnessTask:
+    """Fills track['loudness_lufs'], track['peak_dbfs'] and track['gain_db']."""
+
+    def __init__(self, target_lufs=-14.0):
+        self.target_lufs = target_lufs
+
+    def needed(self, track):
+        return 'gain_db' not in track
+
+    def meter(self, rate):
+        return LoudnessMeter(rate)
+
+    def run(self, track, meter):
+        lufs, peak_dbfs = meter.result()
+        track['loudness_lufs'] = round(lufs, 2) if lufs is not None else None
+        track['peak_dbfs'] = round(peak_dbfs, 2) if np.isfinite(peak_dbfs) else None
+        track['gain_db'] = round(normalization_gain_db(lufs, peak_dbfs, self.target_lufs), 2)
+
+
+class AnalysisWorker:
+    """Background thread that decodes each queued track once and runs every pending task on it.
+
+    Each task makes a meter for the track (task.meter(rate)); every decoded chunk goes
+    to all of them, then task.run(track, meter) stores the results. Runs one track at a
+    time with a single-threaded decoder and a short pause between tracks, so it stays
+    out of the way of playback and request handling. submit() only queues; the per-task
+    `needed` checks (which stat and hash the file) run on the worker. Files that failed
+    to decode are remembered by (path, size, mtime) and not retried until they change;
+    a track that comes up before any decoder is available (no ffmpeg, mixer not started
+    yet) is queued again instead.
+    """
+
+    def __init__(self, tasks, on_done=None, ffmpeg=None, throttle=0.05, retry_delay=0.5):
+        self.tasks = tasks
+        self.on_done = on_done
+        self.ffmpeg = ffmpeg
+        self.throttle = throttle
+        self.retry_delay = retry_delay
+        self.analyzed = 0
+        self.failed = set()     # (path, size, mtime_ns) of files that couldn't be analyzed
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="analysis", daemon=True)
+            self._thread.start()
+
+    def submit(self, tracks):
+        for track in tracks:
+            if id(track) not in self._pending:
+                self._pending.add(id(track))
+                self._queue.put(track)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            track = self._queue.get()
+            self._pending.discard(id(track))
+            try:
+                st = os.stat(track['path'])
+            except OSError:
+                continue  # gone since it was queued
+            stamp = (track['path'], st.st_size, st.st_mtime_ns)
+            if stamp in self.failed:
+                continue
+            todo = [task for task in self.tasks if task.needed(track)]
+            if not todo:
+                continue
+            try:
+                chunks, rate = decode_stream(track['path'], ffmpeg=self.ffmpeg)
+                meters = [task.meter(rate) for task in todo]
+                for chunk in chunks:
+                    for meter in meters:
+                        meter.add(chunk)
+                for task, meter in zip(todo, meters):
+                    task.run(track, meter)
+                self.analyzed += 1
+                if self.on_done is not None:
+                    self.on_done(track)
+            except DecoderUnavailable:
+                # Server startup: the mixer is started on the command actor right before us
+                time.sleep(self.retry_delay)
+                self.submit([track])
+                continue
+            except Exception as e:
+                self.failed.add(stamp)
+                print(f"Analysis error for {track.get('filename', track['path'])}: {e}")
+            time.sleep(self.throttle)
@@ -0,0 +1,363 @@
+"""
+Benchmark suite for the gesture pipeline, the API and the desktop overlay.
+
+Covers:
+- HandDetector.find_hands          (synthetic frames at several sizes, or recorded video frames)
+- GestureRecognizer.recognize      (desktop version in gesture_spotify_player.py and
+                                    server version in server.py; synthetic poses or a .npz recording)
+- POST /api/detect-gesture         (end to end through the ASGI app, in-process, no network)
+- draw_modern_overlay / draw_song_list (several frame sizes and playlist lengths)
+- GET /api/state payload encoding   (FastAPI default vs fast_response JSON/MessagePack, gzip/brotli
+                                    sizes, on synthetic libraries up to 20k tracks)
+- TrackTable                        (bytes per track, column sorts/search, page views and
+                                    rebuilds at 10k and 100k tracks)
+
+Usage:
+    python benchmark.py                              # everything, writes bench_results.json
+    python benchmark.py --only recognize draw        # substring filter on benchmark names
+    python benchmark.py --recording session.npz      # also run recognizers on a recorded session
+    python benchmark.py --recording session.avi      # also run find_hands on recorded frames
+    python benchmark.py --compare old.json           # print p50 deltas against a previous run
+
+Each result reports throughput (ops/s) and the latency distribution in milliseconds.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import itertools
+import platform
+import argparse
+
+import cv2
+import numpy as np
+
+FRAME_SIZES = [(320, 240), (640, 480), (1280, 720)]
+PLAYLIST_SIZES = [10, 100, 1000, 10000]
+
+
+### --- Timing helpers -------------------------------------------------------------
+
+def measure(fn, iterations, warmup=5):
+    """Call fn() `iterations` times and return per-call latencies in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = (time.perf_counter() - t0) * 1000.0
+    return samples
+
+
+def summarize(name, params, samples):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    total_s = samples.sum() / 1000.0
+    return {
+        'name': name,
+        'params': params,
+        'n': int(len(samples)),
+        'throughput_per_s': float(len(samples) / total_s) if total_s > 0 else None,
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(samples.max()),
+    }
+
+
+def report(result):
+    params = ' '.join(f'{k}={v}' for k, v in result['params'].items())
+    print(f"{result['name']:<28} {params:<32} p50={result['p50_ms']:8.3f}ms "
+          f"p99={result['p99_ms']:8.3f}ms  {result['throughput_per_s'] or 0:10.1f} ops/s")
+
+
+### --- Synthetic inputs -----------------------------------------------------------
+
+# Finger chains as landmark indices (mcp, pip, dip, tip); thumb is (cmc, mcp, ip, tip)
+_FINGERS = {
+    'thumb': (1, 2, 3, 4),
+    'index': (5, 6, 7, 8),
+    'middle': (9, 10, 11, 12),
+    'ring': (13, 14, 15, 16),
+    'pinky': (17, 18, 19, 20),
+}
+
+POSES = {
+    'fist': (),
+    'two_fingers': ('index', 'middle'),
+    'open_palm': ('thumb', 'index', 'middle', 'ring', 'pinky'),
+    'thumb_up': ('thumb',),
+}
+
+
+def synthetic_landmarks(pose, x_offset=0.0, y_offset=0.0):
+    """Return 21 normalized (x, y, z) landmarks approximating `pose` (a key of POSES)."""
+    up = set(POSES[pose])
+    lm = [(0.5 + x_offset, 0.8 + y_offset, 0.0)] * 21
+    for i, (finger, chain) in enumerate(_FINGERS.items()):
+        x = 0.38 + 0.06 * i + x_offset
+        if finger in up:
+            ys = (0.62, 0.5, 0.44, 0.38) if finger != 'thumb' else (0.75, 0.68, 0.6, 0.5)
+        else:
+            ys = (0.62, 0.58, 0.63, 0.68)
+        for idx, y in zip(chain, ys):
+            lm[idx] = (x, y + y_offset, 0.0)
+    if 'thumb' not in up:
+        # keep the folded thumb close to the wrist horizontally
+        lm[4] = (0.5 + x_offset + 0.02, lm[4][1], 0.0)
+    return lm
+
+
+def synthetic_stream(n, seed=0):
+    """A deterministic mix of poses with drifting hand position, like a real session."""
+    rng = np.random.default_rng(seed)
+    names = list(POSES)
+    out = []
+    for i in range(n):
+        pose = names[(i // 15) % len(names)]
+        jitter = rng.normal(0, 0.005, size=2)
+        out.append(synthetic_landmarks(pose, x_offset=float(jitter[0]) + 0.1 * np.sin(i / 20.0),
+                                       y_offset=float(jitter[1])))
+    return out
+
+
+def synthetic_frame(w, h, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(frame, (9, 9), 0)
+
+
+### --- Benchmarks -----------------------------------------------------------------
+
+def bench_find_hands(iterations, recording=None):
+    from gesture_spotify_player import HandDetector
+    detector = HandDetector()
+    results = []
+    for w, h in FRAME_SIZES:
+        frame = synthetic_frame(w, h)
+        samples = measure(lambda: detector.find_hands(frame.copy(), draw=True), iterations)
+        results.append(summarize('find_hands', {'source': 'synthetic', 'size': f'{w}x{h}'}, samples))
+
+    if recording and not recording.lower().endswith('.npz'):
+        from gesture_replay import VideoSource
+        frames = [frame for _, frame, _ in VideoSource(recording)]
+        if frames:
+            h, w = frames[0].shape[:2]
+            cycle = itertools.cycle(frames)
+            samples = measure(lambda: detector.find_hands(next(cycle), draw=False),
+                              min(iterations * 4, len(frames)), warmup=1)
+            results.append(summarize('find_hands', {'source': os.path.basename(recording), 'size': f'{w}x{h}'}, samples))
+    return results
+
+
+def _landmark_streams(iterations, recording):
+    streams = {'synthetic': synthetic_stream(max(iterations, 300))}
+    if recording and recording.lower().endswith('.npz'):
+        from gesture_replay import LandmarkSource
+        src = LandmarkSource(recording)
+        streams[os.path.basename(recording)] = [hand['lm'] if hand else None for _, _, hand in src]
+    return streams
+
+
+def bench_recognize(iterations, recording=None):
+    from gesture_spotify_player import GestureRecognizer as DesktopRecognizer, make_hand
+    import server
+
+    results = []
+    for source, stream in _landmark_streams(iterations, recording).items():
+        hands = [make_hand(lm, 640, 480) if lm else None for lm in stream]
+
+        desktop = DesktopRecognizer()
+        cycle = itertools.cycle(hands)
+        samples = measure(lambda: desktop.recognize(next(cycle)), iterations * 10)
+        results.append(summarize('recognize.desktop', {'source': source}, samples))
+
+        srv = server.GestureRecognizer()
+        cycle = itertools.cycle(stream)
+        samples = measure(lambda: srv.recognize(next(cycle)), iterations * 10)
+        results.append(summarize('recognize.server', {'source': source}, samples))
+    return results
+
+
+def bench_detect_gesture(iterations):
+    import httpx
+    import server
+
+    # ASGITransport doesn't run the app's lifespan, so load the model the startup job would
+    server.load_gesture_model()
+    if server.hand_detector is None:
+        print('Hand detector not available; detect_gesture.asgi only measures the upload path')
+
+    async def run(payload, n):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            samples = np.empty(n, dtype=np.float64)
+            for i in range(-3, n):
+                t0 = time.perf_counter()
+                r = await client.post('/api/detect-gesture', files={'file': ('frame.jpg', payload, 'image/jpeg')})
+                r.raise_for_status()
+                if i >= 0:
+                    samples[i] = (time.perf_counter() - t0) * 1000.0
+            return samples
+
+    results = []
+    for w, h in FRAME_SIZES:
+        ok, buf = cv2.imencode('.jpg', synthetic_frame(w, h), [cv2.IMWRITE_JPEG_QUALITY, 80])
+        samples = asyncio.run(run(buf.tobytes(), iterations))
+        results.append(summarize('detect_gesture.asgi', {'size': f'{w}x{h}', 'bytes': len(buf)}, samples))
+    return results
+
+
+def bench_draw(iterations):
+    from gesture_spotify_player import draw_modern_overlay, draw_song_list
+    results = []
+    for w, h in FRAME_SIZES:
+        base = synthetic_frame(w, h)
+        frame = base.copy()
+        samples = measure(lambda: draw_modern_overlay(frame, 'Benchmark Track - Artist', 65, 'volume',
+                                                      time.time(), True), iterations)
+        results.append(summarize('draw_modern_overlay', {'size': f'{w}x{h}'}, samples))
+
+        for n in PLAYLIST_SIZES:
+            names = [f'Track {i:05d} - Some Artist' for i in range(n)]
+            samples = measure(lambda: draw_song_list(frame, names, n // 2, 280), iterations)
+            results.append(summarize('draw_song_list', {'size': f'{w}x{h}', 'tracks': n}, samples))
+    return results
+
+
+def synthetic_state(n):
+    # Same shape as MusicPlayer.get_state() with `n` cached safe tracks
+    tracks = [{'id': i, 'name': f'Track {i:05d}', 'filename': f'{i:05d} - Some Artist - Track.mp3',
+               'artist': f'Artist {i % 800}', 'album': f'Album {i % 1500}', 'year': str(1970 + i % 55),
+               'duration': f'{3 + i % 4}:{i % 60:02d}', 'duration_sec': 180 + i % 240} for i in range(n)]
+    return {'is_playing': True, 'is_paused': False, 'current_idx': n // 2, 'current_track': tracks[n // 2],
+            'volume': 70, 'position': 12.5, 'shuffle': False, 'repeat': False, 'tracks': tracks,
+            'track_count': n, 'up_next': tracks[n // 2 + 1:n // 2 + 21], 'queue_length': 0}
+
+
+def bench_encode(iterations):
+    import gzip
+    from fastapi.encoders import jsonable_encoder
+    import fast_response
+
+    results = []
+    for n in (1000, 20000):
+        state = synthetic_state(n)
+        encoders = {
+            # what FastAPI does for a returned dict: jsonable_encoder, then json.dumps
+            'fastapi_default': lambda: json.dumps(jsonable_encoder(state), ensure_ascii=False,
+                                                  allow_nan=False, indent=None, separators=(',', ':')).encode(),
+            'fast_response.json': lambda: fast_response.dumps(state),
+        }
+        if fast_response.msgpack is not None:
+            encoders['fast_response.msgpack'] = lambda: fast_response.msgpack.packb(state, use_bin_type=True)
+        for name, fn in encoders.items():
+            body = fn()
+            params = {'tracks': n, 'bytes': len(body), 'gzip': len(gzip.compress(body, compresslevel=5))}
+            if fast_response.brotli is not None:
+                params['br'] = len(fast_response.brotli.compress(body, quality=4))
+            samples = measure(fn, max(iterations // 5, 10) if n > 1000 else iterations)
+            results.append(summarize(f'encode.{name}', params, samples))
+    return results
+
+
+def bench_library(iterations):
+    import gc
+    import tracemalloc
+    from track_table import Track, TrackTable
+
+    results = []
+    for n in (10000, 100000):
+        gc.collect()
+        tracemalloc.start()
+        # Fresh strings per track, like tags read by mutagen
+        tracks = [Track({'id': i, 'name': f'Track {i:06d}', 'path': f'/music/{i:06d} - Track.mp3',
+                         'filename': f'{i:06d} - Track.mp3', 'size': 4_000_000 + i,
+                         'mtime_ns': 1_700_000_000_000_000_000 + i, 'artist': f'Artist {i % 900}',
+                         'album': f'Album {i % 2500}', 'year': str(1960 + i % 65),
+                         'duration': f'{3 + i % 4}:{i % 60:02d}', 'duration_sec': 180 + i % 240})
+                  for i in range(n)]
+        table = TrackTable(tracks)
+        per_track = tracemalloc.get_traced_memory()[0] // n
+        tracemalloc.stop()
+        cases = {
+            'sort_artist': lambda: table.order('artist'),
+            'sort_duration_desc': lambda: table.order('duration', descending=True),
+            'search': lambda: table.search('artist 12'),
+            'page': lambda: table.records(table.order('album')[5000:5200], with_index=True),
+            'rebuild': lambda: TrackTable(tracks),
+        }
+        for name, fn in cases.items():
+            samples = measure(fn, max(iterations // 5, 5) if name == 'rebuild' else iterations)
+            results.append(summarize(f'library.{name}', {'tracks': n, 'bytes_per_track': per_track}, samples))
+    return results
+
+
+BENCHMARKS = {
+    'find_hands': bench_find_hands,
+    'recognize': bench_recognize,
+    'detect_gesture': bench_detect_gesture,
+    'draw': bench_draw,
+    'encode': bench_encode,
+    'library': bench_library,
+}
+
+
+### --- Main -----------------------------------------------------------------------
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['name'], json.dumps(r['params'], sort_keys=True)): r for r in json.load(f)['results']}
+    print(f'\nComparison against {baseline_path} (p50):')
+    for r in results:
+        old = baseline.get((r['name'], json.dumps(r['params'], sort_keys=True)))
+        if old is None:
+            continue
+        delta = (r['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0.0
+        params = ' '.join(f'{k}={v}' for k, v in r['params'].items())
+        print(f"{r['name']:<28} {params:<32} {old['p50_ms']:8.3f} -> {r['p50_ms']:8.3f}ms ({delta:+.1f}%)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PalmPlay benchmark suite')
+    parser.add_argument('--only', nargs='*', help='Run only benchmarks whose name contains one of these')
+    parser.add_argument('--iterations', type=int, default=50, help='Iterations per case (default: 50)')
+    parser.add_argument('--recording', help='Recorded session from gesture_replay (.npz or video)')
+    parser.add_argument('--out', default='bench_results.json', help='Where to write JSON results')
+    parser.add_argument('--compare', metavar='PATH', help='Previous results JSON to diff against')
+    args = parser.parse_args()
+
+    results = []
+    for name, fn in BENCHMARKS.items():
+        if args.only and not any(o in name for o in args.only):
+            continue
+        print(f'== {name}')
+        kwargs = {'recording': args.recording} if name in ('find_hands', 'recognize') else {}
+        try:
+            for r in fn(args.iterations, **kwargs):
+                report(r)
+                results.append(r)
+        except Exception as e:
+            print(f'  skipped: {e}')
+
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'iterations': args.iterations,
+        'recording': args.recording,
+    }
+    with open(args.out, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f'\nWrote {len(results)} results to {args.out}')
+
+    if args.compare:
+        compare(results, args.compare)
+    sys.exit(0 if results else 1)
@@ -0,0 +1,110 @@
+"""
+Single-writer command actor for the server's MusicPlayer.
+
+Every player mutation (API routes, gestures, the volume stage, the playback monitor,
+analysis callbacks) is submitted as a command and executed on one thread, so:
+
+- the event loop never runs blocking pygame/disk calls itself; async routes just
+  `await asyncio.wrap_future(actor.submit(...))`
+- state changes are serialized no matter how many clients or threads send them
+
+Commands that pile up while one is running are taken as a batch and executed under a
+single acquisition of the player lock. Commands submitted with a `key` (absolute
+setters like volume/seek, or monitor ticks) collapse within a batch: only the last one
+with a given key runs, at its own position in the order, and every superseded
+submitter's future gets that result.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class _Command:
+    __slots__ = ('fn', 'args', 'key', 'futures')
+
+    def __init__(self, fn, args, key):
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.futures = [Future()]
+
+
+class CommandActor:
+    def __init__(self, lock=None, max_batch=64, name='player-commands'):
+        self.lock = lock or threading.RLock()
+        self.max_batch = max_batch
+        self.name = name
+        self.executed = 0
+        self.collapsed = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop = object()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(self._stop)
+
+    def submit(self, fn, *args, key=None):
+        """Queue fn(*args) for the actor thread. Returns a concurrent.futures.Future."""
+        cmd = _Command(fn, args, key)
+        self._queue.put(cmd)
+        return cmd.futures[0]
+
+    def call(self, fn, *args, key=None, timeout=None):
+        """Blocking submit for worker threads; runs inline if already on the actor thread."""
+        if threading.current_thread() is self._thread:
+            return fn(*args)
+        return self.submit(fn, *args, key=key).result(timeout)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _collapse(self, batch):
+        # Keep the last command per key; hand it the earlier submitters' futures
+        last = {}
+        for i, cmd in enumerate(batch):
+            if cmd.key is not None:
+                last[cmd.key] = i
+        out = []
+        for i, cmd in enumerate(batch):
+            if cmd.key is not None and last[cmd.key] != i:
+                batch[last[cmd.key]].futures.extend(cmd.futures)
+                self.collapsed += 1
+                continue
+            out.append(cmd)
+        return out
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = self._stop in batch
+            batch = self._collapse([cmd for cmd in batch if cmd is not self._stop])
+            with self.lock:
+                for cmd in batch:
+                    try:
+                        result = cmd.fn(*cmd.args)
+                    except Exception as e:
+                        print(f"Command error in {getattr(cmd.fn, '__name__', cmd.fn)}: {e}")
+                        for fut in cmd.futures:
+                            fut.set_exception(e)
+                    else:
+                        for fut in cmd.futures:
+                            fut.set_result(result)
+                    self.executed += 1
+            if stop:
+                return
@@ -0,0 +1,189 @@
+"""
+Fast response encoding for large API payloads (state with thousands of tracks).
+
+- FastJSONResponse renders with orjson when it's installed (falling back to a compact
+  json.dumps); endpoints return it directly, which also skips FastAPI's recursive
+  jsonable_encoder pass
+- respond(request, content) picks MessagePack instead when the client sends
+  `Accept: application/msgpack` and the msgpack package is available
+- CompressionMiddleware compresses complete (non-streamed) responses above
+  `minimum_size` with brotli (if installed and accepted) or gzip; audio streams and
+  range responses pass through untouched
+- RawJSON carries a pre-encoded part of a payload (the track list) so repeated
+  responses don't re-encode it
+
+orjson, msgpack and brotli are all optional.
+"""
+
+import gzip
+import json
+
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'text/', 'application/javascript', 'image/svg+xml')
+
+
+class RawJSON:
+    """Already encoded JSON (`data`), spliced in as-is by dumps() when it is a value of
+    the dict passed in or of a dict nested in it (a control response's "state"), but not
+    inside lists. `value()` rebuilds the object for every other encoder."""
+    __slots__ = ('data', 'value')
+
+    def __init__(self, data, value):
+        self.data = data
+        self.value = value
+
+
+def _default(obj):
+    if isinstance(obj, RawJSON):
+        return obj.value()
+    # numpy scalars/arrays and anything else with a plain-Python view
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def _has_raw(content):
+    return any(isinstance(v, RawJSON) or (isinstance(v, dict) and _has_raw(v)) for v in content.values())
+
+
+def _splice(content, parts):
+    # Plain values are encoded in one go; RawJSON values (and dicts holding one) are
+    # appended after them, so the pre-encoded bytes are copied once, by the final join
+    plain, raw = {}, []
+    for k, v in content.items():
+        if isinstance(v, RawJSON) or (isinstance(v, dict) and _has_raw(v)):
+            raw.append((k, v))
+        else:
+            plain[k] = v
+    parts.append(_dumps(plain)[:-1])
+    for i, (k, v) in enumerate(raw):
+        parts += [b',' if i or plain else b'', _dumps(k), b':']
+        if isinstance(v, RawJSON):
+            parts.append(v.data)
+        else:
+            _splice(v, parts)
+    parts.append(b'}')
+
+
+def dumps(content):
+    if isinstance(content, dict) and _has_raw(content):
+        # e.g. state with the library's track list, which is encoded once per library edit
+        parts = []
+        _splice(content, parts)
+        return b''.join(parts)
+    return _dumps(content)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+class MsgPackResponse(Response):
+    media_type = 'application/msgpack'
+
+    def render(self, content):
+        return msgpack.packb(content, use_bin_type=True, default=_default)
+
+
+def wants_msgpack(request):
+    accept = request.headers.get('accept', '')
+    return msgpack is not None and any(t in accept for t in MSGPACK_TYPES)
+
+
+def respond(request, content, status_code=200):
+    """JSON or MessagePack response for `content`, negotiated on the Accept header."""
+    if request is not None and wants_msgpack(request):
+        return MsgPackResponse(content, status_code=status_code)
+    return FastJSONResponse(content, status_code=status_code)
+
+
+class CompressionMiddleware:
+    """gzip/brotli for single-message responses of at least `minimum_size` bytes."""
+
+    def __init__(self, app, minimum_size=1400, gzip_level=5, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        accept = ''
+        for key, value in scope['headers']:
+            if key == b'accept-encoding':
+                accept = value.decode('latin-1').lower()
+                break
+        if brotli is not None and 'br' in accept:
+            encoding = 'br'
+        elif 'gzip' in accept:
+            encoding = 'gzip'
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def wrapped_send(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                start = message  # hold until we see whether the body comes in one piece
+                return
+            if message['type'] != 'http.response.body' or start is None:
+                # e.g. zerocopysend from a file response: never compressed
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            pending, start = start, None
+            body = message.get('body', b'')
+            headers = MutableHeaders(raw=pending['headers'])
+            if (message.get('more_body') or len(body) < self.minimum_size
+                    or pending['status'] != 200 or 'content-encoding' in headers
+                    or not headers.get('content-type', '').startswith(COMPRESSIBLE_TYPES)):
+                await send(pending)
+                await send(message)
+                return
+
+            if encoding == 'br':
+                body = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                body = gzip.compress(body, compresslevel=self.gzip_level)
+            headers['content-encoding'] = encoding
+            headers['content-length'] = str(len(body))
+            headers.add_vary_header('Accept-Encoding')
+            await send(pending)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, wrapped_send)
@@ -6,6 +6,7 @@ import Player from './components/Player';
 import LyricsPanel from './components/LyricsPanel';
 import QueuePanel from './components/QueuePanel';
 import GestureController from './components/GestureController';
+import RoomAudio from './components/RoomAudio';
 import {
   fetchState,
   playTrack,
@@ -18,6 +19,9 @@ import {
   deleteTrack,
   setVolume,
   seekTrack,
+  syncClock,
+  positionFromAnchor,
+  ROOM,
 } from './services/api';
 import './App.css';
 
@@ -25,7 +29,9 @@ function App() {
   const [view, setView] = useState('playlist'); // 'home' or 'playlist'
   const [searchTerm, setSearchTerm] = useState(''); // Global search state
   const [showLyrics, setShowLyrics] = useState(false); // Lyrics visibility
+  const [showQueue, setShowQueue] = useState(false); // Up Next visibility
   const [precisePosition, setPrecisePosition] = useState(0); // Interpolated position
+  const [clockOffset, setClockOffset] = useState(null); // server clock - local clock (seconds)
   const [state, setState] = useState({
     tracks: [],
     current_idx: -1,
@@ -44,10 +50,12 @@ function App() {
           const playStateChanged = prev.is_playing !== newState.is_playing;
           const idxChanged = prev.current_idx !== newState.current_idx;
           const posChanged = Math.abs((prev.position || 0) - (newState.position || 0)) > 1.5;
+          const anchorChanged = prev.anchor?.server_time !== newState.anchor?.server_time;
           const volChanged = prev.volume !== newState.volume;
           const controlsChanged = prev.shuffle !== newState.shuffle || prev.repeat !== newState.repeat;
+          const upNextChanged = prev.up_next?.join() !== newState.up_next?.join();
 
-          if (!tracksChanged && !playStateChanged && !idxChanged && !posChanged && !volChanged && !controlsChanged) {
+          if (!tracksChanged && !playStateChanged && !idxChanged && !posChanged && !anchorChanged && !volChanged && !controlsChanged && !upNextChanged) {
             return prev;
           }
           return newState;
@@ -92,14 +100,24 @@ function App() {
     }
   }, [state.position, state.is_playing]);
 
+  useEffect(() => {
+    syncClock().then(setClockOffset);
+  }, []);
+
   useEffect(() => {
     if (state.is_playing) {
       const interval = setInterval(() => {
-        setPrecisePosition(prev => prev + 0.05);
+        // Prefer the server anchor; fall back to local ticking until the clock is synced
+        const extrapolated = positionFromAnchor(state.anchor, clockOffset);
+        if (extrapolated !== null) {
+          setPrecisePosition(Math.max(0, Math.min(extrapolated, state.duration || extrapolated)));
+        } else {
+          setPrecisePosition(prev => prev + 0.05);
+        }
       }, 50);
       return () => clearInterval(interval);
     }
-  }, [state.is_playing]);
+  }, [state.is_playing, state.anchor, state.duration, clockOffset]);
 
   const handlePlay = async (idx) => {
     const result = await playTrack(idx);
@@ -243,15 +261,30 @@ function App() {
           }}
           showLyrics={showLyrics}
           onToggleLyrics={() => setShowLyrics(!showLyrics)}
+          showQueue={showQueue}
+          onToggleQueue={() => setShowQueue(!showQueue)}
         />
       )}
 
+      {ROOM && (
+        <RoomAudio state={state} position={precisePosition} onEnded={setState} />
+      )}
+
       <GestureController
         onGestureDetected={() => {
           updateState();
         }}
       />
 
+      {showQueue && (
+        <QueuePanel
+          tracks={state.tracks}
+          currentTrackIdx={state.current_idx}
+          upNext={state.up_next}
+          onPlay={handlePlayWithLog}
+        />
+      )}
+
       {showLyrics && (
         <LyricsPanel
           isOpen={showLyrics}
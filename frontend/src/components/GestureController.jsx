@@ -1,5 +1,6 @@
 import React, { useState, useRef, useEffect, useCallback } from 'react';
 import { Camera, CameraOff, Sparkles } from 'lucide-react';
+import { withRoom } from '../services/api';
 
 const GestureController = ({ onGestureDetected }) => {
     const [isActive, setIsActive] = useState(false);
@@ -59,7 +60,7 @@ const GestureController = ({ onGestureDetected }) => {
             formData.append('file', blob, 'frame.jpg');
 
             try {
-                const response = await fetch('/api/detect-gesture', {
+                const response = await fetch(withRoom('/api/detect-gesture'), {
                     method: 'POST',
                     body: formData
                 });
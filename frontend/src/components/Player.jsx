@@ -1,7 +1,52 @@
-import { Play, Pause, SkipBack, SkipForward, Shuffle, Repeat, Music, Volume2, AlignLeft } from 'lucide-react';
-import { getCoverUrl } from '../services/api';
+import { useState, useEffect } from 'react';
+import { Play, Pause, SkipBack, SkipForward, Shuffle, Repeat, Music, Volume2, AlignLeft, ListMusic } from 'lucide-react';
+import { getCoverUrl, fetchWaveform } from '../services/api';
+
+const WAVEFORM_BUCKETS = 256;
+
+const Waveform = ({ peaks, progress }) => {
+    // peaks: Int8Array of (min, max) pairs; drawn as one vertical bar per bucket
+    const bars = [];
+    for (let i = 0; i < peaks.length / 2; i++) {
+        const top = 50 - (peaks[2 * i + 1] / 128) * 50;
+        const bottom = 50 - (peaks[2 * i] / 128) * 50;
+        bars.push(<rect key={i} x={i} y={top} width={0.7} height={Math.max(1, bottom - top)} />);
+    }
+    const width = peaks.length / 2;
+    return (
+        <svg viewBox={`0 0 ${width} 100`} preserveAspectRatio="none" className="absolute inset-x-0 -top-3 h-8 w-full pointer-events-none">
+            <defs>
+                <clipPath id="waveform-played">
+                    <rect x="0" y="0" width={(progress / 100) * width} height="100" />
+                </clipPath>
+            </defs>
+            <g className="fill-white/15">{bars}</g>
+            <g className="fill-crimson/70" clipPath="url(#waveform-played)">{bars}</g>
+        </svg>
+    );
+};
+
+const Player = ({ track, isPlaying, currentTime, volume, isShuffle, isRepeat, onTogglePlay, onNext, onPrev, onShuffle, onRepeat, onVolumeChange, onSeek, showLyrics, onToggleLyrics, showQueue, onToggleQueue }) => {
+    const [peaks, setPeaks] = useState(null);
+    const trackIdx = track ? track.originalIdx : null;
+
+    useEffect(() => {
+        // Peaks are computed in the background; retry a few times until they exist
+        setPeaks(null);
+        if (trackIdx === null) return;
+        let cancelled = false;
+        let attempts = 0;
+        let timer = null;
+        const load = async () => {
+            const data = await fetchWaveform(trackIdx, WAVEFORM_BUCKETS);
+            if (cancelled) return;
+            if (data) setPeaks(data);
+            else if (++attempts < 6) timer = setTimeout(load, 5000);
+        };
+        load();
+        return () => { cancelled = true; clearTimeout(timer); };
+    }, [trackIdx, track && track.filename]);
 
-const Player = ({ track, isPlaying, currentTime, volume, isShuffle, isRepeat, onTogglePlay, onNext, onPrev, onShuffle, onRepeat, onVolumeChange, onSeek, showLyrics, onToggleLyrics }) => {
     if (!track) return null;
 
     const duration = track.duration_sec || 1; // Avoid divide by zero
@@ -92,6 +137,7 @@ const Player = ({ track, isPlaying, currentTime, volume, isShuffle, isRepeat, on
                         <div className="w-full md:w-96 flex items-center gap-3 text-xs font-mono font-medium text-white/30">
                             <span className="w-10 text-right">{formatTime(currentTime)}</span>
                             <div className="flex-1 relative group/bar flex items-center">
+                                {peaks && <Waveform peaks={peaks} progress={progress} />}
                                 <input
                                     type="range"
                                     min="0"
@@ -109,8 +155,15 @@ const Player = ({ track, isPlaying, currentTime, volume, isShuffle, isRepeat, on
                         </div>
                     </div>
 
-                    {/* Secondary Controls (Volume & Lyrics) */}
+                    {/* Secondary Controls (Volume, Queue & Lyrics) */}
                     <div className="flex items-center gap-4 flex-1 justify-end relative z-10 text-white/40 group/vol">
+                        <button
+                            onClick={onToggleQueue}
+                            className={`p-2 rounded-lg transition-all hover-micro ${showQueue ? 'text-crimson bg-crimson/10 shadow-[0_0_15px_rgba(225,29,72,0.2)]' : 'hover:text-white hover:bg-white/10'}`}
+                            title="Toggle Up Next"
+                        >
+                            <ListMusic size={18} />
+                        </button>
                         <button
                             onClick={onToggleLyrics}
                             className={`p-2 rounded-lg transition-all hover-micro ${showLyrics ? 'text-crimson bg-crimson/10 shadow-[0_0_15px_rgba(225,29,72,0.2)]' : 'hover:text-white hover:bg-white/10'}`}
@@ -1,10 +1,14 @@
 import { Music, Play, SkipForward } from 'lucide-react';
 import { getCoverUrl } from '../services/api';
 
-const QueuePanel = ({ tracks = [], currentTrackIdx, onPlay }) => {
-    // Determine the next songs in queue
+const QueuePanel = ({ tracks = [], currentTrackIdx, upNext, onPlay }) => {
+    // Determine the next songs in queue: the server's play order (shuffle-aware) if we have it
     const queue = [];
-    if (tracks.length > 0) {
+    if (upNext) {
+        upNext.slice(0, 5).filter(idx => tracks[idx]).forEach(idx => {
+            queue.push({ ...tracks[idx], originalIdx: idx });
+        });
+    } else if (tracks.length > 0) {
         // If we're at the last track, next is the first track
         for (let i = 1; i <= Math.min(5, tracks.length - 1); i++) {
             const nextIdx = (currentTrackIdx + i) % tracks.length;
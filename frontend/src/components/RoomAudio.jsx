@@ -0,0 +1,55 @@
+import React, { useEffect, useRef } from 'react';
+import { getStreamUrl, reportTrackEnded } from '../services/api';
+
+/**
+ * Plays a room's audio in this browser. The room on the server only keeps state
+ * (track, play/pause, position clock, volume); this element follows it.
+ */
+const RoomAudio = ({ state, position, onEnded }) => {
+    const audioRef = useRef(null);
+    const idx = state.current_idx;
+
+    // Switch source when the room changes track
+    useEffect(() => {
+        const audio = audioRef.current;
+        if (!audio) return;
+        if (idx < 0) {
+            audio.removeAttribute('src');
+            audio.load();
+            return;
+        }
+        audio.src = getStreamUrl(idx);
+        audio.currentTime = Math.max(0, position || 0);
+    }, [idx, state.current_track_id]);
+
+    useEffect(() => {
+        const audio = audioRef.current;
+        if (!audio || idx < 0) return;
+        if (state.is_playing) {
+            audio.play().catch(() => { }); // autoplay can be blocked until the first click
+        } else {
+            audio.pause();
+        }
+    }, [state.is_playing, idx]);
+
+    // Follow seeks and drift from the room clock
+    useEffect(() => {
+        const audio = audioRef.current;
+        if (audio && idx >= 0 && Math.abs(audio.currentTime - position) > 1.0) {
+            audio.currentTime = Math.max(0, position);
+        }
+    }, [position, idx]);
+
+    useEffect(() => {
+        if (audioRef.current) audioRef.current.volume = (state.volume ?? 50) / 100;
+    }, [state.volume]);
+
+    const handleEnded = async () => {
+        const result = await reportTrackEnded(state.current_track_id);
+        if (result?.state && onEnded) onEnded(result.state);
+    };
+
+    return <audio ref={audioRef} preload="auto" onEnded={handleEnded} className="hidden" />;
+};
+
+export default RoomAudio;
@@ -6,9 +6,18 @@
 // Since we setup proxy in vite.config.js, we can use relative paths
 const API_BASE = '/api';
 
+// Open the app with ?room=<id> to join a room; its audio plays in this browser
+export const ROOM = new URLSearchParams(window.location.search).get('room');
+
+// Scope a player-control URL to the current room (no-op for the main player)
+export const withRoom = (url) => {
+    if (!ROOM) return url;
+    return `${url}${url.includes('?') ? '&' : '?'}room=${encodeURIComponent(ROOM)}`;
+};
+
 export const fetchState = async () => {
     try {
-        const response = await fetch(`${API_BASE}/state`);
+        const response = await fetch(withRoom(`${API_BASE}/state`));
         if (!response.ok) throw new Error('Failed to fetch state');
         return await response.json();
     } catch (error) {
@@ -17,9 +26,43 @@ export const fetchState = async () => {
     }
 };
 
+/**
+ * Clock-sync handshake with the server's monotonic clock.
+ * Returns the offset (seconds) to add to performance.now()/1000 to get server time,
+ * taken from the sample with the lowest round trip.
+ */
+export const syncClock = async (samples = 5) => {
+    let best = null;
+    for (let i = 0; i < samples; i++) {
+        try {
+            const t0 = performance.now() / 1000;
+            const response = await fetch(`${API_BASE}/clock`);
+            const t1 = performance.now() / 1000;
+            if (!response.ok) continue;
+            const { server_time } = await response.json();
+            const rtt = t1 - t0;
+            if (!best || rtt < best.rtt) {
+                best = { rtt, offset: server_time - (t0 + t1) / 2 };
+            }
+        } catch (error) {
+            console.error('Clock sync error:', error);
+        }
+    }
+    return best ? best.offset : null;
+};
+
+/**
+ * Extrapolate the playback position from a server anchor.
+ */
+export const positionFromAnchor = (anchor, clockOffset) => {
+    if (!anchor || clockOffset === null || clockOffset === undefined) return null;
+    const serverNow = performance.now() / 1000 + clockOffset;
+    return anchor.position + anchor.rate * (serverNow - anchor.server_time);
+};
+
 export const playTrack = async (idx) => {
     try {
-        const response = await fetch(`${API_BASE}/play/${idx}`, { method: 'POST' });
+        const response = await fetch(withRoom(`${API_BASE}/play/${idx}`), { method: 'POST' });
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -29,7 +72,7 @@ export const playTrack = async (idx) => {
 
 export const togglePlay = async () => {
     try {
-        const response = await fetch(`${API_BASE}/toggle`, { method: 'POST' });
+        const response = await fetch(withRoom(`${API_BASE}/toggle`), { method: 'POST' });
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -39,7 +82,7 @@ export const togglePlay = async () => {
 
 export const nextTrack = async () => {
     try {
-        const response = await fetch(`${API_BASE}/next`, { method: 'POST' });
+        const response = await fetch(withRoom(`${API_BASE}/next`), { method: 'POST' });
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -49,7 +92,7 @@ export const nextTrack = async () => {
 
 export const prevTrack = async () => {
     try {
-        const response = await fetch(`${API_BASE}/prev`, { method: 'POST' });
+        const response = await fetch(withRoom(`${API_BASE}/prev`), { method: 'POST' });
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -59,7 +102,7 @@ export const prevTrack = async () => {
 
 export const toggleShuffle = async () => {
     try {
-        const response = await fetch(`${API_BASE}/shuffle`, { method: 'POST' });
+        const response = await fetch(withRoom(`${API_BASE}/shuffle`), { method: 'POST' });
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -69,7 +112,7 @@ export const toggleShuffle = async () => {
 
 export const toggleRepeat = async () => {
     try {
-        const response = await fetch(`${API_BASE}/repeat`, { method: 'POST' });
+        const response = await fetch(withRoom(`${API_BASE}/repeat`), { method: 'POST' });
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -79,7 +122,7 @@ export const toggleRepeat = async () => {
 
 export const setVolume = async (vol) => {
     try {
-        const response = await fetch(`${API_BASE}/volume/${vol}`, { method: 'POST' });
+        const response = await fetch(withRoom(`${API_BASE}/volume/${vol}`), { method: 'POST' });
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -89,7 +132,7 @@ export const setVolume = async (vol) => {
 
 export const seekTrack = async (seconds) => {
     try {
-        const response = await fetch(`${API_BASE}/seek/${seconds}`, { method: 'POST' });
+        const response = await fetch(withRoom(`${API_BASE}/seek/${seconds}`), { method: 'POST' });
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -107,28 +150,110 @@ export const deleteTrack = async (idx) => {
     }
 };
 
-export const loadFolder = async (path) => {
+export const fetchQueue = async () => {
+    try {
+        const response = await fetch(withRoom(`${API_BASE}/queue`));
+        return await response.json();
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+export const enqueueTrack = async (idx, playNext = false) => {
+    try {
+        const response = await fetch(withRoom(`${API_BASE}/queue`), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ idx, next: playNext })
+        });
+        return await response.json();
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+export const moveQueued = async (qid, after = null) => {
+    try {
+        const response = await fetch(withRoom(`${API_BASE}/queue/${qid}/move`), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ after })
+        });
+        return await response.json();
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+export const dequeueTrack = async (qid) => {
+    try {
+        const response = await fetch(withRoom(`${API_BASE}/queue/${qid}`), { method: 'DELETE' });
+        return await response.json();
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+/**
+ * Poll a background job until it finishes. Resolves to the final job record.
+ */
+export const waitForJob = async (jobId, onProgress, interval = 300) => {
+    while (true) {
+        const response = await fetch(`${API_BASE}/jobs/${jobId}`);
+        if (!response.ok) return null;
+        const job = await response.json();
+        if (onProgress) onProgress(job);
+        if (['done', 'failed', 'cancelled'].includes(job.status)) return job;
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+};
+
+export const cancelJob = async (jobId) => {
+    try {
+        const response = await fetch(`${API_BASE}/jobs/${jobId}`, { method: 'DELETE' });
+        return await response.json();
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+// Library loads run as server jobs; wait for them so callers still get { success, count }
+const finishJob = async (result, onProgress) => {
+    if (!result?.success || !result.job_id) return result;
+    const job = await waitForJob(result.job_id, onProgress);
+    if (!job || job.status !== 'done') {
+        return { success: false, error: job?.error || `Job ${job?.status || 'lost'}` };
+    }
+    return { success: true, count: job.result };
+};
+
+export const loadFolder = async (path, onProgress) => {
     try {
         const response = await fetch(`${API_BASE}/load-folder`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ folder: path })
         });
-        return await response.json();
+        return await finishJob(await response.json(), onProgress);
     } catch (error) {
         console.error('API Error:', error);
         return null;
     }
 };
 
-export const addFiles = async (filePaths) => {
+export const addFiles = async (filePaths, onProgress) => {
     try {
         const response = await fetch(`${API_BASE}/add-files`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ files: filePaths })
         });
-        return await response.json();
+        return await finishJob(await response.json(), onProgress);
     } catch (error) {
         console.error('API Error:', error);
         return null;
@@ -146,6 +271,38 @@ export const uploadFiles = async (files) => {
             method: 'POST',
             body: formData
         });
+        return await finishJob(await response.json());
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+/**
+ * One page of albums or artists in name order, from the server's aggregate index.
+ * `start` jumps to the first name at or after a prefix (for A-Z bars).
+ * Entries carry track_count, duration_sec and cover_idx (use with getCoverUrl).
+ */
+const fetchGroupPage = async (kind, { offset = 0, limit = 50, order = 'asc', start = null } = {}) => {
+    try {
+        const params = new URLSearchParams({ offset, limit, order });
+        if (start) params.set('start', start);
+        const response = await fetch(`${API_BASE}/${kind}?${params}`);
+        return await response.json();
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+export const fetchAlbums = (options) => fetchGroupPage('albums', options);
+export const fetchArtists = (options) => fetchGroupPage('artists', options);
+
+// An album with its tracks, or an artist with its albums
+const fetchGroup = async (kind, id) => {
+    try {
+        const response = await fetch(`${API_BASE}/${kind}/${id}`);
+        if (!response.ok) return null;
         return await response.json();
     } catch (error) {
         console.error('API Error:', error);
@@ -153,11 +310,52 @@ export const uploadFiles = async (files) => {
     }
 };
 
+export const fetchAlbum = (id) => fetchGroup('albums', id);
+export const fetchArtist = (id) => fetchGroup('artists', id);
+
 export const getCoverUrl = (idx) => {
     // Direct URL to the cover endpoint
     return `${API_BASE}/cover/${idx}`;
 };
 
+/**
+ * Waveform peaks for a track as an Int8Array of interleaved (min, max) pairs.
+ * Returns null while the server is still analyzing the track.
+ */
+export const fetchWaveform = async (idx, buckets = 1024) => {
+    try {
+        const response = await fetch(`${API_BASE}/waveform/${idx}?buckets=${buckets}`);
+        if (!response.ok) return null;
+        return new Int8Array(await response.arrayBuffer());
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+/**
+ * Tell a room its track finished playing here; the room advances once even if
+ * several clients report the same track.
+ */
+export const reportTrackEnded = async (trackId) => {
+    try {
+        const response = await fetch(`${API_BASE}/rooms/${encodeURIComponent(ROOM)}/ended`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ track_id: trackId })
+        });
+        return await response.json();
+    } catch (error) {
+        console.error('API Error:', error);
+        return null;
+    }
+};
+
+export const getStreamUrl = (idx) => {
+    // Range-capable audio URL for an <audio> element; seeking costs one range request
+    return `${API_BASE}/stream/${idx}`;
+};
+
 export const fetchLyrics = async (artist, title, duration) => {
     const cleanQuery = (str) => {
         if (!str) return '';
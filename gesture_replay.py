@@ -0,0 +1,256 @@
+"""
+Record-and-replay harness for the gesture pipeline.
+
+Recording (from the desktop app):
+    python gesture_spotify_player.py --record session.npz   # landmarks only (float16, compact)
+    python gesture_spotify_player.py --record session.avi   # raw camera frames + timestamps
+
+Replay (headless, no camera needed):
+    python gesture_replay.py session.npz
+    python gesture_replay.py session.avi --events out.jsonl
+    python gesture_replay.py session.npz --expect out.jsonl   # exit 1 if the gestures differ
+
+Landmark recordings skip MediaPipe entirely and feed GestureRecognizer directly, so they
+replay in milliseconds. Video recordings (or any video file) go through the same
+HandDetector.find_hands -> GestureRecognizer.recognize path as the live app. In both cases
+the recognizer clock is driven by the recorded timestamps, so swipe velocities and
+cooldowns come out identical on every run.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+import cv2
+import numpy as np
+
+NUM_LANDMARKS = 21
+
+
+### --- Recorders ----------------------------------------------------------------
+
+class LandmarkRecorder:
+    """Collects per-frame hand landmarks and writes them as one compressed .npz.
+
+    Arrays stored:
+      t        float64 (N,)        wall-clock timestamp of each frame
+      present  bool    (N,)        whether a hand was detected
+      lm       float16 (N, 21, 3)  normalized landmarks (zeros where absent)
+      size     int32   (2,)        frame width, height (needed to rebuild pixel centers)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.t = []
+        self.present = []
+        self.lm = []
+        self.size = (0, 0)
+
+    def add(self, t, hand, frame_shape):
+        h, w = frame_shape[:2]
+        self.size = (w, h)
+        self.t.append(t)
+        if hand:
+            self.present.append(True)
+            self.lm.append(np.asarray(hand['lm'], dtype=np.float16))
+        else:
+            self.present.append(False)
+            self.lm.append(np.zeros((NUM_LANDMARKS, 3), dtype=np.float16))
+
+    def close(self):
+        lm = np.stack(self.lm) if self.lm else np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float16)
+        np.savez_compressed(
+            self.path,
+            t=np.asarray(self.t, dtype=np.float64),
+            present=np.asarray(self.present, dtype=bool),
+            lm=lm,
+            size=np.asarray(self.size, dtype=np.int32))
+        print(f'Recorded {len(self.t)} frames of landmarks to {self.path}')
+
+
+class FrameRecorder:
+    """Writes raw camera frames to a video file plus a `<path>.ts.npy` timestamp sidecar."""
+
+    def __init__(self, path, fps=30.0, fourcc='MJPG'):
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+        self.t = []
+
+    def add(self, t, frame):
+        if self.writer is None:
+            h, w = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (w, h))
+        self.writer.write(frame)
+        self.t.append(t)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+        np.save(timestamps_path(self.path), np.asarray(self.t, dtype=np.float64))
+        print(f'Recorded {len(self.t)} frames to {self.path}')
+
+
+def timestamps_path(video_path):
+    return video_path + '.ts.npy'
+
+
+def open_recorder(path, fps=30.0):
+    """Pick a recorder from the file extension: .npz -> landmarks, anything else -> video."""
+    if path.lower().endswith('.npz'):
+        return LandmarkRecorder(path)
+    return FrameRecorder(path, fps=fps)
+
+
+### --- Replay sources -----------------------------------------------------------
+
+class LandmarkSource:
+    """Yields (t, None, hand) from a LandmarkRecorder file. No MediaPipe required."""
+
+    def __init__(self, path):
+        data = np.load(path)
+        self.t = data['t']
+        self.present = data['present']
+        self.lm = data['lm'].astype(np.float32)
+        self.w, self.h = (int(v) for v in data['size'])
+
+    def __len__(self):
+        return len(self.t)
+
+    def __iter__(self):
+        from gesture_spotify_player import make_hand
+        for i in range(len(self.t)):
+            hand = None
+            if self.present[i]:
+                hand = make_hand([tuple(p) for p in self.lm[i].tolist()], self.w, self.h)
+            yield float(self.t[i]), None, hand
+
+
+class VideoSource:
+    """Yields (t, frame, None) from a video file.
+
+    Timestamps come from the `.ts.npy` sidecar written by FrameRecorder, or are
+    synthesized from the container frame rate for arbitrary videos.
+    """
+
+    def __init__(self, path, fps=None):
+        self.path = path
+        self.t = None
+        if os.path.exists(timestamps_path(path)):
+            self.t = np.load(timestamps_path(path))
+        self.fps = fps
+
+    def __iter__(self):
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            raise RuntimeError(f'Cannot open video: {self.path}')
+        fps = self.fps or cap.get(cv2.CAP_PROP_FPS) or 30.0
+        i = 0
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if self.t is not None and i < len(self.t):
+                    t = float(self.t[i])
+                else:
+                    t = i / fps
+                yield t, frame, None
+                i += 1
+        finally:
+            cap.release()
+
+
+def open_source(path):
+    if path.lower().endswith('.npz'):
+        return LandmarkSource(path)
+    return VideoSource(path)
+
+
+### --- Replay ---------------------------------------------------------------------
+
+class ReplayClock:
+    """Clock that returns whatever timestamp the replay loop last set."""
+
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def replay(source, detector=None, recognizer=None, on_frame=None):
+    """Feed `source` through find_hands -> recognize and return the gesture events.
+
+    Each event is a dict {frame, t, gesture, data}. `detector` is only needed for
+    video sources; a HandDetector is created on demand. `on_frame(i, t, hand, result)`
+    is called for every frame, which is handy for benchmarks.
+    """
+    from gesture_spotify_player import GestureRecognizer, HandDetector
+
+    clock = ReplayClock()
+    if recognizer is None:
+        recognizer = GestureRecognizer(clock=clock)
+    else:
+        recognizer.clock = clock
+
+    events = []
+    for i, (t, frame, hand) in enumerate(source):
+        clock.t = t
+        if frame is not None:
+            if detector is None:
+                detector = HandDetector()
+            _, hands = detector.find_hands(frame, draw=False)
+            hand = hands[0] if hands else None
+        gesture, data = recognizer.recognize(hand)
+        if on_frame is not None:
+            on_frame(i, t, hand, (gesture, data))
+        if gesture is not None:
+            events.append({'frame': i, 't': round(t, 6), 'gesture': gesture, 'data': data})
+    return events
+
+
+def diff_events(actual, expected):
+    """Return a list of human-readable differences between two event lists."""
+    diffs = []
+    for i in range(max(len(actual), len(expected))):
+        a = actual[i] if i < len(actual) else None
+        e = expected[i] if i < len(expected) else None
+        if a is None or e is None or (a['frame'], a['gesture'], a['data']) != (e['frame'], e['gesture'], e['data']):
+            diffs.append(f'event {i}: expected {e}, got {a}')
+    return diffs
+
+
+def load_events(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_events(path, events):
+    with open(path, 'w') as f:
+        for ev in events:
+            f.write(json.dumps(ev) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded gesture session headlessly')
+    parser.add_argument('recording', help='.npz landmark recording or a video file')
+    parser.add_argument('--events', metavar='PATH', help='Write recognized gesture events as JSONL')
+    parser.add_argument('--expect', metavar='PATH', help='Compare against a previous --events file; exit 1 on mismatch')
+    args = parser.parse_args()
+
+    events = replay(open_source(args.recording))
+    for ev in events:
+        print(f"[{ev['frame']:5d}] t={ev['t']:.3f} {ev['gesture']} {ev['data'] if ev['data'] is not None else ''}")
+    print(f'{len(events)} gesture events')
+
+    if args.events:
+        save_events(args.events, events)
+    if args.expect:
+        diffs = diff_events(events, load_events(args.expect))
+        if diffs:
+            print('\n'.join(diffs))
+            sys.exit(1)
+        print('Replay matches expected events.')
@@ -18,7 +18,12 @@ python gesture_spotify_player.py
 """
 
 import os
+import csv
+import json
 import time
+import queue
+import platform
+import threading
 import argparse
 from collections import deque
 from dotenv import load_dotenv
@@ -29,6 +34,8 @@ load_dotenv()
 import cv2
 import numpy as np
 import math
+from volume_stage import VolumeStage
+from shuffle_order import ShuffleOrder
 import tkinter as tk
 from tkinter import filedialog
 
@@ -47,6 +54,7 @@ except Exception:
 # spotipy is optional (we currently run local-only). If you later add it, the code will try to use it.
 try:
     import spotipy
+    import requests
     from spotipy.oauth2 import SpotifyOAuth
 except Exception:
     spotipy = None
@@ -67,8 +75,99 @@ def now():
     return time.time()
 
 
+class StageTimer:
+    """Per-stage latency recorder for the main loop.
+
+    Keeps a rolling window of samples (milliseconds) per stage so p50/p95/p99
+    reflect recent behaviour rather than the whole session. Use as:
+
+        with timer.stage('detect'):
+            detector.find_hands(frame)
+    """
+
+    STAGES = ('capture', 'detect', 'recognize', 'control', 'draw', 'display', 'frame')
+
+    def __init__(self, window=300):
+        self.window = window
+        self.samples = {name: deque(maxlen=window) for name in self.STAGES}
+        self.counts = {name: 0 for name in self.STAGES}
+
+    class _Stage:
+        __slots__ = ('timer', 'name', 't0')
+
+        def __init__(self, timer, name):
+            self.timer = timer
+            self.name = name
+
+        def __enter__(self):
+            self.t0 = time.perf_counter()
+            return self
+
+        def __exit__(self, *exc):
+            self.timer.add(self.name, (time.perf_counter() - self.t0) * 1000.0)
+            return False
+
+    def stage(self, name):
+        return StageTimer._Stage(self, name)
+
+    def add(self, name, ms):
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.window)
+            self.counts[name] = 0
+        self.samples[name].append(ms)
+        self.counts[name] += 1
+
+    def summary(self):
+        """Return {stage: {count, mean, p50, p95, p99, max}} over the rolling window."""
+        out = {}
+        for name, buf in self.samples.items():
+            if not buf:
+                continue
+            arr = np.fromiter(buf, dtype=np.float64, count=len(buf))
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            out[name] = {
+                'count': self.counts[name],
+                'mean': float(arr.mean()),
+                'p50': float(p50),
+                'p95': float(p95),
+                'p99': float(p99),
+                'max': float(arr.max()),
+            }
+        return out
+
+    def export(self, path):
+        """Write the summary to `path` as CSV or JSONL (chosen by extension)."""
+        host = {
+            'host': platform.node(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+        }
+        rows = [dict(host, stage=name, **stats) for name, stats in self.summary().items()]
+        if path.lower().endswith('.csv'):
+            fields = list(host) + ['stage', 'count', 'mean', 'p50', 'p95', 'p99', 'max']
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, 'w') as f:
+                for row in rows:
+                    f.write(json.dumps(row) + '\n')
+        return len(rows)
+
+
 ### --- Hand Detector -------------------------------------------------------------
 
+def make_hand(lm, w, h):
+    """Build the hand dict consumed by GestureRecognizer from normalized (x, y, z) landmarks."""
+    # compute center in pixels of a w x h frame
+    cx = int(np.mean([p[0] for p in lm]) * w)
+    cy = int(np.mean([p[1] for p in lm]) * h)
+    return {'lm': lm, 'center': (cx, cy)}
+
+
 class HandDetector:
     """Wrapper around MediaPipe Higher-Level Tasks API."""
     def __init__(self, max_num_hands=1, detection_conf=0.7, tracking_conf=0.5):
@@ -105,15 +204,9 @@ class HandDetector:
                 for lm_pt in hand_landmarks:
                     lm.append((lm_pt.x, lm_pt.y, lm_pt.z))
                 
-                # compute center
-                cx = int(np.mean([p[0] for p in lm]) * w)
-                cy = int(np.mean([p[1] for p in lm]) * h)
-                
-                hands_data.append({
-                    'lm': lm,
-                    'center': (cx, cy),
-                    'raw': hand_landmarks # This is now a list of objects, not a protobuf
-                })
+                hand = make_hand(lm, w, h)
+                hand['raw'] = hand_landmarks # This is now a list of objects, not a protobuf
+                hands_data.append(hand)
                 
                 if draw:
                     # Drawing is trickier since we don't have the protobuf formatted object exactly as 'solutions' expected
@@ -151,7 +244,9 @@ class GestureRecognizer:
     and cooldowns to avoid repeated triggers. Tweak parameters below for sensitivity.
     """
 
-    def __init__(self, buffer_len=6, swipe_vpx=450.0, cooldown=0.9):
+    def __init__(self, buffer_len=6, swipe_vpx=450.0, cooldown=0.9, clock=None):
+        # clock is injectable so recorded sessions replay deterministically (see gesture_replay.py)
+        self.clock = clock or time.time
         # center buffer stores tuples (x, y, t)
         self.center_buf = deque(maxlen=buffer_len)
         self.finger_buf = deque(maxlen=buffer_len)
@@ -185,7 +280,7 @@ class GestureRecognizer:
 
     def add_center(self, center):
         # center is (x_px, y_px)
-        self.center_buf.append((center[0], center[1], time.time()))
+        self.center_buf.append((center[0], center[1], self.clock()))
 
     def detect_swipe(self):
         if len(self.center_buf) < 3:
@@ -202,7 +297,7 @@ class GestureRecognizer:
         return None
 
     def cooldown_ok(self, action):
-        t = time.time()
+        t = self.clock()
         last = self.last_trigger.get(action, 0)
         if t - last >= self.cooldown:
             self.last_trigger[action] = t
@@ -269,19 +364,120 @@ class GestureRecognizer:
 ### --- Spotify Controller -------------------------------------------------------
 
 class SpotifyController:
-    """Controls playback via Spotipy. Requires SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI as env vars or will prompt."""
+    """Controls playback via Spotipy. Requires SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI as env vars or will prompt.
 
-    def __init__(self, scope='user-modify-playback-state user-read-playback-state user-read-currently-playing'):
+    All Web API calls run on a background worker so the video loop never waits on the
+    network. Commands are queued fire-and-forget; playback state is cached and refreshed
+    on a timer, so toggle decisions are made locally from the cache. Volume commands are
+    coalesced: only the latest pending value is sent.
+
+    `api_prefix` (or SPOTIPY_API_PREFIX) and `auth_manager` can point the controller at a
+    local stand-in for the Web API, e.g. api_prefix='http://127.0.0.1:9999/v1/'.
+    """
+
+    def __init__(self, scope='user-modify-playback-state user-read-playback-state user-read-currently-playing',
+                 auth_manager=None, api_prefix=None, refresh_interval=2.0, pool_size=4):
         if spotipy is None:
             raise RuntimeError('spotipy is not installed')
         client_id = os.environ.get('SPOTIPY_CLIENT_ID')
         client_secret = os.environ.get('SPOTIPY_CLIENT_SECRET')
         redirect_uri = os.environ.get('SPOTIPY_REDIRECT_URI')
-        if not (client_id and client_secret and redirect_uri):
+        if auth_manager is None and not (client_id and client_secret and redirect_uri):
             print('Spotify credentials not found in env. You will be prompted to login via a URL.')
         # Create SpotifyOAuth; spotipy will open a local server for redirect when possible
-        self.auth_manager = SpotifyOAuth(scope=scope)
-        self.sp = spotipy.Spotify(auth_manager=self.auth_manager)
+        self.auth_manager = auth_manager or SpotifyOAuth(scope=scope)
+
+        # Pooled keep-alive session shared by every API call
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.sp = spotipy.Spotify(auth_manager=self.auth_manager, requests_session=self.session)
+        api_prefix = api_prefix or os.environ.get('SPOTIPY_API_PREFIX')
+        if api_prefix:
+            self.sp.prefix = api_prefix  # an instance attribute, not a constructor argument
+
+        # Cached playback state, written by the worker and read by the video loop
+        self.refresh_interval = refresh_interval
+        self._state_lock = threading.Lock()
+        self._is_playing = False
+        self._track = None
+        self._volume = None
+        self._last_refresh = 0.0
+        self._last_local_change = 0.0
+        self._pending_volume = None
+
+        self._commands = queue.Queue()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name='spotify-worker', daemon=True)
+        self._worker.start()
+
+    # --- worker -------------------------------------------------------------
+
+    def _submit(self, name):
+        self._commands.put(name)
+
+    def _run(self):
+        next_refresh = 0.0
+        while not self._stop.is_set():
+            timeout = max(0.0, next_refresh - time.monotonic())
+            try:
+                cmd = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                cmd = None
+            if self._stop.is_set():
+                break
+            if cmd is None:
+                self._refresh()
+                next_refresh = time.monotonic() + self.refresh_interval
+                continue
+            self._execute(cmd)
+            # reconcile the cache shortly after a command lands
+            next_refresh = min(next_refresh, time.monotonic() + 0.5)
+
+    def _execute(self, cmd):
+        try:
+            if cmd == 'play':
+                self.sp.start_playback()
+            elif cmd == 'pause':
+                self.sp.pause_playback()
+            elif cmd == 'next':
+                self.sp.next_track()
+            elif cmd == 'previous':
+                self.sp.previous_track()
+            elif cmd == 'volume':
+                with self._state_lock:
+                    vol, self._pending_volume = self._pending_volume, None
+                if vol is not None:
+                    self.sp.volume(vol)
+        except Exception as e:
+            print(f'Spotify {cmd} error:', e)
+
+    def _refresh(self):
+        try:
+            cur = self.sp.current_playback()
+        except Exception as e:
+            print('Spotify state refresh error:', e)
+            return
+        with self._state_lock:
+            self._last_refresh = time.monotonic()
+            # don't let a stale server view undo a toggle we just made locally
+            if time.monotonic() - self._last_local_change < self.refresh_interval:
+                return
+            self._is_playing = bool(cur and cur.get('is_playing'))
+            item = cur.get('item') if cur else None
+            self._track = f"{item['name']} - {', '.join([a['name'] for a in item['artists']])}" if item else None
+            device = cur.get('device') if cur else None
+            if device and device.get('volume_percent') is not None:
+                self._volume = device['volume_percent']
+
+    def close(self, timeout=2.0):
+        self._stop.set()
+        self._commands.put(None)
+        self._worker.join(timeout)
+        self.session.close()
+
+    # --- controller interface -----------------------------------------------
 
     def is_available(self):
         try:
@@ -291,51 +487,38 @@ class SpotifyController:
         except Exception:
             return False
 
+    def is_playing(self):
+        with self._state_lock:
+            return self._is_playing
+
     def toggle_play_pause(self):
-        try:
-            cur = self.sp.current_playback()
-            if cur and cur.get('is_playing'):
-                self.sp.pause_playback()
-            else:
-                # start playback on user's active device
-                self.sp.start_playback()
-            return True
-        except Exception as e:
-            print('Spotify play/pause error:', e)
-            return False
+        with self._state_lock:
+            playing = self._is_playing
+            self._is_playing = not playing
+            self._last_local_change = time.monotonic()
+        self._submit('pause' if playing else 'play')
+        return True
 
     def next(self):
-        try:
-            self.sp.next_track()
-            return True
-        except Exception as e:
-            print('Spotify next error:', e)
-            return False
+        self._submit('next')
+        return True
 
     def previous(self):
-        try:
-            self.sp.previous_track()
-            return True
-        except Exception as e:
-            print('Spotify prev error:', e)
-            return False
+        self._submit('previous')
+        return True
 
     def set_volume(self, vol_percent):
-        try:
-            self.sp.volume(vol_percent)
-            return True
-        except Exception as e:
-            print('Spotify set volume error:', e)
-            return False
+        with self._state_lock:
+            already_queued = self._pending_volume is not None
+            self._pending_volume = int(vol_percent)
+            self._volume = int(vol_percent)
+        if not already_queued:
+            self._submit('volume')
+        return True
 
     def currently_playing(self):
-        try:
-            cur = self.sp.current_playback()
-            if cur and cur.get('item'):
-                return f"{cur['item']['name']} - {', '.join([a['name'] for a in cur['item']['artists']])}"
-            return None
-        except Exception:
-            return None
+        with self._state_lock:
+            return self._track
 
 
 ### --- Local Controller (fallback) ---------------------------------------------
@@ -356,7 +539,7 @@ class LocalController:
         self.volume = 0.5
         self.shuffle = False
         self.repeat = False  # 0=off, 1=repeat all, 2=repeat one
-        self.shuffle_order = list(range(len(self.track_paths)))
+        self.shuffler = ShuffleOrder(range(len(self.track_paths)))
         self.start_time = 0  # Track playback start time
         self.pause_offset = 0  # Time when paused
         pygame.mixer.music.set_volume(self.volume)
@@ -393,6 +576,8 @@ class LocalController:
         if not self.track_paths or index < 0 or index >= len(self.track_paths):
             return False
         self.idx = index
+        if self.shuffle:
+            self.shuffler.jump(index)
         pygame.mixer.music.load(self.track_paths[self.idx])
         pygame.mixer.music.play()
         self.start_time = time.time()
@@ -404,8 +589,7 @@ class LocalController:
         if not self.track_paths:
             return False
         if self.shuffle:
-            import random
-            self.idx = random.randint(0, len(self.track_paths) - 1)
+            self.idx = self.shuffler.next()
         else:
             self.idx = (self.idx + 1) % len(self.track_paths)
         pygame.mixer.music.load(self.track_paths[self.idx])
@@ -418,7 +602,13 @@ class LocalController:
     def previous(self):
         if not self.track_paths:
             return False
-        self.idx = (self.idx - 1) % len(self.track_paths)
+        if self.shuffle:
+            # back through the shuffle history; at its start, restart the current track
+            key = self.shuffler.prev()
+            if key is not None:
+                self.idx = key
+        else:
+            self.idx = (self.idx - 1) % len(self.track_paths)
         pygame.mixer.music.load(self.track_paths[self.idx])
         pygame.mixer.music.play()
         self.start_time = time.time()
@@ -434,6 +624,8 @@ class LocalController:
 
     def toggle_shuffle(self):
         self.shuffle = not self.shuffle
+        if self.shuffle:
+            self.shuffler.reset(range(len(self.track_paths)), current=self.idx)
         return self.shuffle
 
     def toggle_repeat(self):
@@ -746,6 +938,26 @@ def draw_song_list(frame, track_names, current_idx, sidebar_width=250):
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (150, 150, 150), 1)
 
 
+def draw_latency_hud(frame, timer, origin=(10, 10)):
+    """Draw a small per-stage latency table (p50/p95/p99 in ms) in the top-left corner."""
+    stats = timer.summary()
+    if not stats:
+        return
+    x, y = origin
+    line_h = 16
+    width = 250
+    height = line_h * (len(stats) + 1) + 10
+    overlay = frame.copy()
+    cv2.rectangle(overlay, (x, y), (x + width, y + height), (20, 20, 25), -1)
+    cv2.addWeighted(overlay, 0.75, frame, 0.25, 0, frame)
+    cv2.putText(frame, "stage        p50    p95    p99", (x + 8, y + line_h),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 150, 150), 1, cv2.LINE_AA)
+    for i, (name, s) in enumerate(stats.items()):
+        row_y = y + line_h * (i + 2)
+        color = (100, 200, 100) if s['p95'] < 33.0 else (80, 160, 255)
+        cv2.putText(frame, f"{name:<10}{s['p50']:6.1f} {s['p95']:6.1f} {s['p99']:6.1f}", (x + 8, row_y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1, cv2.LINE_AA)
+
 
 def select_music_folder():
     """Open a folder picker dialog and return the selected path."""
@@ -760,7 +972,8 @@ def select_music_folder():
     return folder_path if folder_path else None
 
 
-def main(debug=False):
+def main(debug=False, show_hud=False, latency_log=None, profile_seconds=None, profile_out='palmplay.prof',
+         record_path=None):
     print('Starting gesture-controlled local player (debug=' + str(debug) + ')')
     
     # Ask user to select a music folder at startup
@@ -810,6 +1023,9 @@ def main(debug=False):
             except Exception as e:
                 print('Local controller error or pygame missing:', e)
 
+    # Gesture volume goes through a deadband/rate-limited stage instead of one backend call per frame
+    volume_stage = VolumeStage(controller.set_volume) if controller else None
+
     # State variables
     current_volume = 50
     last_action_time = 0
@@ -826,21 +1042,53 @@ def main(debug=False):
     # Sidebar width
     SIDEBAR_WIDTH = 280
 
+    # Latency instrumentation ('l' toggles the HUD)
+    timer = StageTimer()
+
+    # Optional session recording for offline replay (see gesture_replay.py)
+    recorder = None
+    records_landmarks = False   # landmark (.npz) recorders take hands; video recorders take frames
+    if record_path:
+        from gesture_replay import open_recorder, LandmarkRecorder
+        recorder = open_recorder(record_path, fps=cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        records_landmarks = isinstance(recorder, LandmarkRecorder)
+        print(f'Recording session to {record_path}')
+
+    profiler = None
+    profile_deadline = None
+    if profile_seconds:
+        import cProfile
+        profiler = cProfile.Profile()
+        profile_deadline = time.perf_counter() + profile_seconds
+        print(f'Profiling main loop for {profile_seconds}s -> {profile_out}')
+        profiler.enable()
+
     try:
         while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame = cv2.flip(frame, 1)
+            frame_t0 = time.perf_counter()
+            with timer.stage('capture'):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frame = cv2.flip(frame, 1)
             
             # Get camera dimensions
             cam_h, cam_w = frame.shape[:2]
+            frame_time = time.time()
+            if recorder is not None and not records_landmarks:
+                recorder.add(frame_time, frame)
             
             # Process hands
-            out_frame, hands = detector.find_hands(frame, draw=True)
+            with timer.stage('detect'):
+                out_frame, hands = detector.find_hands(frame, draw=True)
             hand = hands[0] if hands else None
+            if records_landmarks:
+                recorder.add(frame_time, hand, frame.shape)
 
-            gesture, data = recognizer.recognize(hand)
+            with timer.stage('recognize'):
+                gesture, data = recognizer.recognize(hand)
+
+            control_t0 = time.perf_counter()
 
             # Get track info
             track_name = None
@@ -855,12 +1103,11 @@ def main(debug=False):
             # Handle gestures
             if gesture == 'volume':
                 vol = data
-                if controller:
-                    controller.set_volume(vol)
+                if volume_stage and volume_stage.submit(vol):
+                    print(f'[GESTURE] volume -> {vol}%')
                 current_volume = vol
                 action_icon = 'volume'
                 last_action_time = time.time()
-                print(f'[GESTURE] volume -> {vol}%')
                 
             elif gesture == 'fist' and recognizer.cooldown_ok('toggle'):
                 if controller:
@@ -902,7 +1149,9 @@ def main(debug=False):
                     action_icon = 'repeat'
                     last_action_time = time.time()
                     print(f'[GESTURE] thumb up -> repeat {"ON" if repeat_active else "OFF"}')
+            timer.add('control', (time.perf_counter() - control_t0) * 1000.0)
 
+            draw_t0 = time.perf_counter()
             # Create composite frame with sidebar
             composite_width = cam_w + SIDEBAR_WIDTH
             composite_frame = np.zeros((cam_h, composite_width, 3), dtype=np.uint8)
@@ -933,17 +1182,51 @@ def main(debug=False):
             draw_modern_overlay(camera_portion, track_name, current_volume, action_icon, last_action_time, is_playing)
             composite_frame[:, SIDEBAR_WIDTH:] = camera_portion
 
-            cv2.imshow(window_name, composite_frame)
-            key = cv2.waitKey(1) & 0xFF
+            if show_hud:
+                draw_latency_hud(composite_frame, timer, origin=(SIDEBAR_WIDTH + 10, 10))
+            timer.add('draw', (time.perf_counter() - draw_t0) * 1000.0)
+
+            with timer.stage('display'):
+                cv2.imshow(window_name, composite_frame)
+                key = cv2.waitKey(1) & 0xFF
+            timer.add('frame', (time.perf_counter() - frame_t0) * 1000.0)
             if key == 27 or key == ord('q'):
                 break
+            if key == ord('l'):
+                show_hud = not show_hud
+            if profile_deadline is not None and time.perf_counter() >= profile_deadline:
+                print('Profiling window elapsed, stopping.')
+                break
     finally:
         cap.release()
         cv2.destroyAllWindows()
+        if volume_stage is not None:
+            volume_stage.flush()
+        if controller is not None and hasattr(controller, 'close'):
+            controller.close()
+        if recorder is not None:
+            recorder.close()
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(profile_out)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+            print(f'Profile written to {profile_out}')
+        for name, s in timer.summary().items():
+            print(f'[LATENCY] {name:<10} p50={s["p50"]:.1f}ms p95={s["p95"]:.1f}ms p99={s["p99"]:.1f}ms (n={s["count"]})')
+        if latency_log:
+            timer.export(latency_log)
+            print(f'Latency summary written to {latency_log}')
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Gesture-controlled local music player')
     parser.add_argument('--debug', action='store_true', help='Run in debug mode (no audio playback, prints gestures)')
+    parser.add_argument('--hud', action='store_true', help='Show the per-stage latency HUD at startup (toggle with "l")')
+    parser.add_argument('--latency-log', metavar='PATH', help='Write per-stage p50/p95/p99 on exit (.csv or .jsonl)')
+    parser.add_argument('--profile', type=float, metavar='SECONDS', help='Run the loop under cProfile for N seconds, then exit')
+    parser.add_argument('--profile-out', default='palmplay.prof', metavar='PATH', help='Where to write cProfile stats (default: palmplay.prof)')
+    parser.add_argument('--record', metavar='PATH', help='Record the session for gesture_replay.py (.npz = landmarks, else video)')
     args = parser.parse_args()
-    main(debug=args.debug)
+    main(debug=args.debug, show_hud=args.hud, latency_log=args.latency_log,
+         profile_seconds=args.profile, profile_out=args.profile_out, record_path=args.record)
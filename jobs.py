@@ -0,0 +1,168 @@
+"""
+Background jobs for blocking library work (folder scans, tag parsing, cover reads).
+
+JobManager keeps one thread pool per job kind, so each kind has its own concurrency
+cap and a big folder scan can't starve cover requests (or vice versa):
+
+    jobs = JobManager({'scan': 2, 'cover': 4})
+    job = jobs.submit('scan', scan_folder, folder)   # returns at once
+    jobs.get(job.id).to_dict()                       # status / progress / result
+    jobs.cancel(job.id)
+
+A job function receives its Job first and reports through it: job.progress(done, total)
+updates the counters and raises JobCancelled once cancel() was requested, so long loops
+stop at the next item. Short tasks that don't need tracking (a cover lookup) can use
+run(), which only applies the cap and returns a Future.
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = 'queued'   # queued -> running -> done | failed | cancelled
+        self.done = 0
+        self.total = None
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def progress(self, done, total=None, message=None):
+        """Report progress; raises JobCancelled if the job was cancelled."""
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        self.check()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobManager:
+    def __init__(self, limits, keep=200):
+        # limits: {kind: max concurrent jobs}; finished jobs beyond `keep` are forgotten
+        self.keep = keep
+        self._pools = {kind: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f'job-{kind}')
+                       for kind, n in limits.items()}
+        self._waiting = dict.fromkeys(limits, 0)   # kind -> submitted, not started yet
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args):
+        """Start fn(job, *args) on the `kind` pool and return the Job right away."""
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._submit(kind, self._run, job, fn, args)
+        return job
+
+    def run(self, kind, fn, *args):
+        """Run fn(*args) on the `kind` pool without tracking it. Returns a Future."""
+        return self._submit(kind, fn, *args)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self, kind=None):
+        return [job for job in list(self._jobs.values()) if kind is None or job.kind == kind]
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.status in ('done', 'failed', 'cancelled'):
+            return False
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            # never started: finish it here, the pool won't run it
+            job.status = 'cancelled'
+            job.finished = time.time()
+        return True
+
+    def backlog(self):
+        """{kind: tasks waiting for a free worker}"""
+        with self._lock:
+            return dict(self._waiting)
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, kind, fn, *args):
+        # Counted as waiting until a worker picks it up (or it is cancelled first)
+        with self._lock:
+            self._waiting[kind] += 1
+        future = self._pools[kind].submit(self._started, kind, fn, args)
+        future.add_done_callback(lambda f: f.cancelled() and self._dequeued(kind))
+        return future
+
+    def _dequeued(self, kind):
+        with self._lock:
+            self._waiting[kind] -= 1
+
+    def _started(self, kind, fn, args):
+        self._dequeued(kind)
+        return fn(*args)
+
+    def _run(self, job, fn, args):
+        if job.cancelled:
+            job.status = 'cancelled'
+            job.finished = time.time()
+            return None
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            job.result = fn(job, *args)
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            print(f"Job {job.kind} {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        job.finished = time.time()
+        return job.result
+
+    def _prune(self):
+        # Called with the lock held; drop the oldest finished jobs
+        excess = len(self._jobs) - self.keep
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished is not None][:excess]:
+            del self._jobs[job_id]
@@ -0,0 +1,68 @@
+"""
+On-disk cache of the scanned library, so the server can serve tracks immediately on
+startup and rescan in the background.
+
+The cache is one JSON file holding every track dict as scanned (tags, durations,
+analysis results). Per-second MP3 seek indexes are stored base64-encoded. Each entry
+keeps the file's size and mtime, and `is_fresh()` compares them with a stat() call, so
+a rescan only re-parses files that actually changed.
+"""
+
+import os
+import json
+import base64
+from array import array
+
+CACHE_VERSION = 1
+
+# Runtime-only fields: ids are handed out fresh on every run
+_SKIP = ('id',)
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def is_fresh(track):
+    """True if the file behind a cached track is unchanged since it was scanned."""
+    try:
+        return file_stamp(track['path']) == (track.get('size'), track.get('mtime_ns'))
+    except OSError:
+        return False
+
+
+def _encode(track):
+    out = {k: v for k, v in track.items() if k not in _SKIP}
+    if isinstance(out.get('seek_index'), array):
+        out['seek_index'] = base64.b64encode(out['seek_index'].tobytes()).decode('ascii')
+    return out
+
+
+def _decode(entry):
+    if isinstance(entry.get('seek_index'), str):
+        idx = array('I')
+        idx.frombytes(base64.b64decode(entry['seek_index']))
+        entry['seek_index'] = idx
+    return entry
+
+
+def save_library(path, tracks):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'tracks': [_encode(t) for t in tracks]}, f)
+    os.replace(tmp, path)
+
+
+def load_library(path):
+    """Cached track dicts, or [] if there is no usable cache."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Ignoring library cache {path}: {e}")
+        return []
+    if data.get('version') != CACHE_VERSION:
+        return []
+    return [_decode(entry) for entry in data.get('tracks', [])]
@@ -0,0 +1,155 @@
+"""
+Album and artist aggregates over the library, kept up to date track by track.
+
+MusicPlayer calls add(track) / remove(track) as tracks come and go, so loading,
+adding or removing files costs O(log groups) per track instead of a pass over the whole
+library. Groups are kept in name order, so a page of albums or artists is a slice:
+O(page size) however large the library is.
+
+Albums are keyed by (album, artist), so same-titled albums by different artists
+("Greatest Hits") stay apart. An album keeps its track ids in the order they were
+added; the first one still in the library is its representative track, whose cover is
+the album's cover. An artist's representative is that of its first album.
+"""
+
+import bisect
+import itertools
+
+
+class Album:
+    __slots__ = ('id', 'name', 'artist', 'year', 'seconds', 'track_ids', 'sort_key')
+
+    def __init__(self, group_id, name, artist, year):
+        self.id = group_id
+        self.name = name
+        self.artist = artist
+        self.year = year
+        self.seconds = 0
+        self.track_ids = {}     # track id -> duration_sec, in insertion order
+        self.sort_key = (name.casefold(), artist.casefold(), group_id)
+
+    def cover_track(self):
+        return next(iter(self.track_ids), None)
+
+    def summary(self, index_of):
+        cover = self.cover_track()
+        return {'id': self.id, 'album': self.name, 'artist': self.artist, 'year': self.year,
+                'track_count': len(self.track_ids), 'duration_sec': self.seconds,
+                'cover_idx': index_of(cover) if cover is not None else None}
+
+
+class Artist:
+    __slots__ = ('id', 'name', 'tracks', 'seconds', 'albums', 'sort_key')
+
+    def __init__(self, group_id, name):
+        self.id = group_id
+        self.name = name
+        self.tracks = 0
+        self.seconds = 0
+        self.albums = {}        # Album -> None, in insertion order
+        self.sort_key = (name.casefold(), '', group_id)
+
+    def cover_track(self):
+        album = next(iter(self.albums), None)
+        return album.cover_track() if album is not None else None
+
+    def summary(self, index_of):
+        cover = self.cover_track()
+        return {'id': self.id, 'artist': self.name, 'album_count': len(self.albums), 'track_count': self.tracks,
+                'duration_sec': self.seconds, 'cover_idx': index_of(cover) if cover is not None else None}
+
+
+class SortedGroups:
+    """Groups in `sort_key` order with lookup by id; insert/remove are a bisect plus a
+    list insert/delete."""
+
+    def __init__(self):
+        self._keys = []
+        self._groups = []
+        self._by_id = {}
+
+    def __len__(self):
+        return len(self._groups)
+
+    def get(self, group_id):
+        return self._by_id.get(group_id)
+
+    def insert(self, group):
+        i = bisect.bisect_left(self._keys, group.sort_key)
+        self._keys.insert(i, group.sort_key)
+        self._groups.insert(i, group)
+        self._by_id[group.id] = group
+
+    def remove(self, group):
+        i = bisect.bisect_left(self._keys, group.sort_key)
+        if i < len(self._groups) and self._groups[i] is group:
+            del self._keys[i]
+            del self._groups[i]
+        self._by_id.pop(group.id, None)
+
+    def page(self, offset=0, limit=50, descending=False, start=None):
+        """`limit` groups from `offset` in name order. `start` (a name prefix) jumps to the
+        first name at or after it (at or before it when descending)."""
+        offset, limit = max(0, offset), max(0, limit)
+        if not descending:
+            begin = offset + (bisect.bisect_left(self._keys, (start.casefold(),)) if start else 0)
+            return self._groups[begin:begin + limit]
+        end = bisect.bisect_left(self._keys, (start.casefold() + '\uffff',)) if start else len(self._groups)
+        end -= offset
+        if end <= 0:
+            return []
+        return self._groups[max(0, end - limit):end][::-1]
+
+
+class LibraryIndex:
+    def __init__(self):
+        self._group_ids = itertools.count(1)
+        self.clear()
+
+    def clear(self):
+        self.albums = SortedGroups()
+        self.artists = SortedGroups()
+        self._album_keys = {}   # (album, artist) -> Album
+        self._artist_keys = {}  # artist -> Artist
+
+    @staticmethod
+    def _names(track):
+        return track.get('album', 'Unknown Album'), track.get('artist', 'Unknown Artist')
+
+    def add(self, track):
+        album_name, artist_name = self._names(track)
+        artist = self._artist_keys.get(artist_name)
+        if artist is None:
+            artist = self._artist_keys[artist_name] = Artist(next(self._group_ids), artist_name)
+            self.artists.insert(artist)
+        album = self._album_keys.get((album_name, artist_name))
+        if album is None:
+            album = Album(next(self._group_ids), album_name, artist_name, track.get('year', 'Unknown Year'))
+            self._album_keys[(album_name, artist_name)] = album
+            self.albums.insert(album)
+            artist.albums[album] = None
+        if track['id'] in album.track_ids:
+            return
+        seconds = track.get('duration_sec', 0) or 0
+        album.track_ids[track['id']] = seconds
+        album.seconds += seconds
+        artist.tracks += 1
+        artist.seconds += seconds
+
+    def remove(self, track):
+        album_name, artist_name = self._names(track)
+        album = self._album_keys.get((album_name, artist_name))
+        if album is None or track['id'] not in album.track_ids:
+            return
+        artist = self._artist_keys[artist_name]
+        seconds = album.track_ids.pop(track['id'])
+        album.seconds -= seconds
+        artist.tracks -= 1
+        artist.seconds -= seconds
+        if not album.track_ids:
+            del self._album_keys[(album_name, artist_name)]
+            self.albums.remove(album)
+            artist.albums.pop(album, None)
+        if not artist.albums:
+            del self._artist_keys[artist_name]
+            self.artists.remove(artist)
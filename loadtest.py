@@ -0,0 +1,373 @@
+"""
+Load test for the PalmPlay API: N simulated clients against synthetic libraries.
+
+Client types (all run concurrently, as asyncio tasks):
+- pollers     GET /api/state in a loop, like the web UI (closed loop, or every --poll-interval s)
+- gesture     POST /api/detect-gesture at --fps; a frame that would start late is skipped and
+              counted as dropped, the way a webcam loop falls behind
+- scrollers   page through the track list and fetch /api/cover for every visible row,
+              at most 6 at a time like a browser; now and then scroll back (cache hits)
+
+Libraries of 1k/10k/100k tracks are generated in memory; their paths point at a small
+pool of temp MP3 files, half of them with embedded cover art (needs mutagen), and every
+track gets its own mtime so each one is a distinct cover-cache entry.
+
+Modes (no network needed):
+    python loadtest.py                          # in-process through httpx.ASGITransport
+    python loadtest.py --uvicorn                # through a local uvicorn on 127.0.0.1 (real sockets)
+    python loadtest.py --url http://host:8000   # an already running server, with its own library
+    python loadtest.py --libraries 10000 --pollers 16 --duration 20
+    python loadtest.py --compare old.json       # p99 deltas per endpoint and library size
+
+--uvicorn serves from a thread of the harness process, so server and clients share the GIL;
+numbers are for comparing runs, not absolute. For isolation start the server separately
+and use --url.
+
+Reports throughput and p50/p99 latency per endpoint; results go to loadtest_results.json.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import tempfile
+import platform
+import argparse
+import threading
+
+import numpy as np
+import httpx
+
+LIBRARY_SIZES = [1000, 10000, 100000]
+BROWSER_CONNECTIONS = 6
+
+
+### --- Synthetic library ----------------------------------------------------------
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz): enough for mutagen to parse
+_MP3_FRAME = b'\xff\xfb\x90\x00' + bytes(413)
+
+
+def make_file_pool(directory, n=64, seed=0):
+    """Write `n` small MP3 files, every other one with an embedded cover. Returns paths."""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(n):
+        path = os.path.join(directory, f'pool_{i:03d}.mp3')
+        with open(path, 'wb') as f:
+            f.write(_MP3_FRAME * 20)
+        if i % 2 == 0:
+            try:
+                from mutagen.id3 import ID3, APIC
+                tags = ID3()
+                # Random bytes stand in for JPEG data; the server never decodes covers
+                tags.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='cover',
+                              data=rng.randbytes(rng.randint(8, 48) * 1024)))
+                tags.save(path)
+            except ImportError:
+                pass
+        paths.append(path)
+    return paths
+
+
+def synthetic_tracks(n, pool, seed=0):
+    rng = random.Random(seed)
+    tracks = []
+    for i in range(n):
+        path = pool[i % len(pool)]
+        seconds = rng.randint(90, 420)
+        tracks.append({
+            'name': f'Track {i:06d}',
+            'path': path,
+            'size': os.path.getsize(path),
+            'mtime_ns': 1_700_000_000_000_000_000 + i,
+            'filename': f'{i:06d} - Artist {i % 900} - Track {i:06d}.mp3',
+            'artist': f'Artist {i % 900}',
+            'album': f'Album {i % 2500}',
+            'year': str(1960 + i % 65),
+            'duration': f'{seconds // 60}:{seconds % 60:02d}',
+            'duration_sec': seconds,
+        })
+    return tracks
+
+
+def synthetic_jpeg(seed=0):
+    """A 640x480 JPEG frame if OpenCV is available, else None."""
+    try:
+        import cv2
+    except ImportError:
+        return None
+    rng = np.random.default_rng(seed)
+    frame = (rng.random((480, 640, 3)) * 40 + 100).astype(np.uint8)
+    cv2.rectangle(frame, (260, 180), (380, 360), (120, 160, 210), -1)  # a skin-ish blob
+    ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return buf.tobytes() if ok else None
+
+
+def install_library(server, tracks):
+    # Keep the analyzer away from the synthetic files, and start from a cold cover cache
+    server.player.analyzer = None
+    server.player_commands.call(server.player.add_scanned, tracks, True)
+    server.cover_cache = server.CoverCache(server.cover_cache.max_bytes)
+
+
+### --- Clients ----------------------------------------------------------------------
+
+class Stats:
+    def __init__(self, warmup_until):
+        self.warmup_until = warmup_until
+        self.latencies = {}   # endpoint -> [ms]
+        self.statuses = {}    # endpoint -> {status: count}
+        self.errors = {}      # endpoint -> count
+        self.dropped = 0      # gesture frames skipped client-side
+
+    async def request(self, client, endpoint, method, url, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, url, **kwargs)
+            await r.aread()
+            status = r.status_code
+        except httpx.HTTPError:
+            status = None
+        if t0 < self.warmup_until:
+            return status
+        if status is None:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        else:
+            self.latencies.setdefault(endpoint, []).append((time.perf_counter() - t0) * 1000.0)
+            counts = self.statuses.setdefault(endpoint, {})
+            counts[status] = counts.get(status, 0) + 1
+        return status
+
+
+async def poller(client, stats, deadline, interval):
+    while time.perf_counter() < deadline:
+        await stats.request(client, 'state', 'GET', '/api/state')
+        # sleep(0) still yields: in-process requests that never suspend would starve other clients
+        await asyncio.sleep(interval)
+
+
+async def gesture_client(client, stats, deadline, fps, frame):
+    period = 1.0 / fps
+    next_at = time.perf_counter()
+    while time.perf_counter() < deadline:
+        await stats.request(client, 'detect-gesture', 'POST', '/api/detect-gesture',
+                            files={'file': ('frame.jpg', frame, 'image/jpeg')})
+        next_at += period
+        now = time.perf_counter()
+        while next_at < now:
+            next_at += period
+            if now >= stats.warmup_until:
+                stats.dropped += 1
+        await asyncio.sleep(next_at - now)
+
+
+async def scroller(client, stats, deadline, n_tracks, page, pause, rng):
+    pos = rng.randrange(max(n_tracks - page, 1))
+    limit = asyncio.Semaphore(BROWSER_CONNECTIONS)
+
+    async def cover(idx):
+        async with limit:
+            await stats.request(client, 'cover', 'GET', f'/api/cover/{idx}')
+
+    while time.perf_counter() < deadline:
+        await asyncio.gather(*(cover(i) for i in range(pos, min(pos + page, n_tracks))))
+        await asyncio.sleep(pause)
+        step = page // 2 if rng.random() < 0.8 else -page  # mostly down, sometimes back up
+        pos = min(max(pos + step, 0), max(n_tracks - page, 0))
+
+
+async def run_clients(make_client, n_tracks, args, frame):
+    start = time.perf_counter()
+    stats = Stats(start + args.warmup)
+    deadline = start + args.warmup + args.duration
+    rng = random.Random(args.seed)
+    clients = []
+    tasks = []
+    for _ in range(args.pollers):
+        clients.append(make_client())
+        tasks.append(poller(clients[-1], stats, deadline, args.poll_interval))
+    if frame is not None:
+        for _ in range(args.gesture_clients):
+            clients.append(make_client())
+            tasks.append(gesture_client(clients[-1], stats, deadline, args.fps, frame))
+    if n_tracks:
+        for _ in range(args.scrollers):
+            clients.append(make_client())
+            tasks.append(scroller(clients[-1], stats, deadline, n_tracks, args.page, args.scroll_pause,
+                                  random.Random(rng.random())))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for client in clients:
+            await client.aclose()
+    return stats
+
+
+### --- Reporting --------------------------------------------------------------------
+
+def summarize(stats, params, duration):
+    results = []
+    for endpoint, samples in sorted(stats.latencies.items()):
+        samples = np.asarray(samples)
+        p50, p99 = np.percentile(samples, [50, 99])
+        result = {
+            'name': endpoint,
+            'params': params,
+            'n': int(len(samples)),
+            'throughput_per_s': len(samples) / duration,
+            'p50_ms': float(p50),
+            'p99_ms': float(p99),
+            'max_ms': float(samples.max()),
+            'statuses': {str(k): v for k, v in sorted(stats.statuses[endpoint].items())},
+            'errors': stats.errors.get(endpoint, 0),
+        }
+        if endpoint == 'detect-gesture':
+            result['frames_dropped'] = stats.dropped
+        results.append(result)
+    return results
+
+
+def report(result):
+    params = ' '.join(f'{k}={v}' for k, v in result['params'].items())
+    statuses = ','.join(f'{k}:{v}' for k, v in result['statuses'].items())
+    extra = f" dropped={result['frames_dropped']}" if 'frames_dropped' in result else ''
+    print(f"{result['name']:<16} {params:<16} {result['throughput_per_s']:9.1f} req/s  "
+          f"p50={result['p50_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms  [{statuses}]"
+          f"{' errors=' + str(result['errors']) if result['errors'] else ''}{extra}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['name'], json.dumps(r['params'], sort_keys=True)): r for r in json.load(f)['results']}
+    print(f'\nComparison against {baseline_path} (p99):')
+    for r in results:
+        old = baseline.get((r['name'], json.dumps(r['params'], sort_keys=True)))
+        if old is None:
+            continue
+        delta = (r['p99_ms'] - old['p99_ms']) / old['p99_ms'] * 100 if old['p99_ms'] else 0.0
+        params = ' '.join(f'{k}={v}' for k, v in r['params'].items())
+        print(f"{r['name']:<16} {params:<16} {old['p99_ms']:8.2f} -> {r['p99_ms']:8.2f}ms ({delta:+.1f}%)")
+
+
+### --- Modes ------------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until(predicate, timeout):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def start_uvicorn(server, workdir):
+    import uvicorn
+    # No cache, no startup folders: the library is whatever the harness installs
+    server.LIBRARY_CACHE = os.path.join(workdir, 'library_cache.json')
+    server.STARTUP_FOLDERS = []
+    config = uvicorn.Config(server.app, host='127.0.0.1', port=free_port(), log_level='warning')
+    uv = uvicorn.Server(config)
+    threading.Thread(target=uv.run, name='uvicorn', daemon=True).start()
+    if not wait_until(lambda: uv.started and server.readiness['library']['ready'], 30):
+        raise RuntimeError('uvicorn did not start')
+    return uv, f'http://127.0.0.1:{config.port}'
+
+
+def run_local(args, frame):
+    import server
+
+    workdir = tempfile.mkdtemp(prefix='palmplay_load_')
+    pool = make_file_pool(workdir)
+    uv = None
+    if args.uvicorn:
+        uv, base_url = start_uvicorn(server, workdir)
+        make_client = lambda: httpx.AsyncClient(base_url=base_url, timeout=30)
+    else:
+        server.player_commands.start()
+        transport = httpx.ASGITransport(app=server.app)
+        make_client = lambda: httpx.AsyncClient(transport=transport, base_url='http://load', timeout=30)
+    if frame is not None and args.gesture_clients:
+        if args.uvicorn:
+            wait_until(lambda: server.readiness['gestures']['ready'] or server.readiness['gestures']['error'], 30)
+        else:
+            server.load_gesture_model()
+        if server.hand_detector is None:
+            print('Hand detector not available; detect-gesture only measures the upload path')
+
+    results = []
+    try:
+        for n in args.libraries:
+            install_library(server, synthetic_tracks(n, pool, args.seed))
+            print(f'== {n} tracks ({"uvicorn" if args.uvicorn else "asgi"})')
+            stats = asyncio.run(run_clients(make_client, n, args, frame))
+            for r in summarize(stats, {'tracks': n}, args.duration):
+                report(r)
+                results.append(r)
+    finally:
+        if uv is not None:
+            uv.should_exit = True
+    return results
+
+
+def run_remote(args, frame):
+    n = len(httpx.get(args.url + '/api/state', timeout=30).json()['tracks'])
+    print(f'== {args.url} ({n} tracks)')
+    make_client = lambda: httpx.AsyncClient(base_url=args.url, timeout=30)
+    stats = asyncio.run(run_clients(make_client, n, args, frame))
+    results = summarize(stats, {'tracks': n}, args.duration)
+    for r in results:
+        report(r)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PalmPlay load test')
+    parser.add_argument('--libraries', type=int, nargs='*', default=LIBRARY_SIZES, help='Library sizes (tracks)')
+    parser.add_argument('--uvicorn', action='store_true', help='Serve through a local uvicorn instead of ASGI')
+    parser.add_argument('--url', help='Test a running server instead (its own library)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per library (default: 10)')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Unmeasured seconds first (default: 1)')
+    parser.add_argument('--pollers', type=int, default=8, help='Clients polling /api/state (default: 8)')
+    parser.add_argument('--poll-interval', type=float, default=0.0, help='Seconds between polls (default: 0)')
+    parser.add_argument('--gesture-clients', type=int, default=1, help='Clients sending frames (default: 1)')
+    parser.add_argument('--fps', type=float, default=15.0, help='Frames per second per gesture client')
+    parser.add_argument('--scrollers', type=int, default=2, help='Clients scrolling covers (default: 2)')
+    parser.add_argument('--page', type=int, default=30, help='Rows visible per scroll position')
+    parser.add_argument('--scroll-pause', type=float, default=0.1, help='Seconds between scroll steps')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='loadtest_results.json', help='Where to write JSON results')
+    parser.add_argument('--compare', metavar='PATH', help='Previous results JSON to diff against')
+    args = parser.parse_args()
+
+    frame = synthetic_jpeg(args.seed)
+    if frame is None and args.gesture_clients:
+        print('OpenCV not installed; skipping gesture clients')
+    results = run_remote(args, frame) if args.url else run_local(args, frame)
+
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'mode': 'remote' if args.url else 'uvicorn' if args.uvicorn else 'asgi',
+        'clients': {'pollers': args.pollers, 'gesture': args.gesture_clients if frame is not None else 0,
+                    'scrollers': args.scrollers},
+        'duration': args.duration,
+    }
+    with open(args.out, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f'\nWrote {len(results)} results to {args.out}')
+
+    if args.compare:
+        compare(results, args.compare)
+    sys.exit(0 if results else 1)
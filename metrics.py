@@ -0,0 +1,254 @@
+"""
+In-process metrics in the Prometheus text format, served by the server at /metrics.
+
+Deliberately tiny (no prometheus_client dependency): counters, histograms and gauges,
+optionally labelled, each update a dict lookup plus a few integer adds under a lock.
+
+    REQUESTS = Counter('palmplay_x_total', 'Things done', ('kind',))
+    REQUESTS.labels('scan').inc()
+    DECODE = Histogram('palmplay_decode_seconds', 'Frame decode time')
+    with DECODE.time():
+        ...
+    Gauge('palmplay_queue_depth', 'Pending commands', fn=actor.pending)
+
+Gauges with `fn` are read at scrape time; fn may return a number or, for labelled
+gauges, a {label_values_tuple: number} dict. MetricsMiddleware records the latency of
+every HTTP request per route template, method and status.
+"""
+
+import time
+import bisect
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers sub-millisecond state reads up to multi-second scans/uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            try:
+                lines.extend(metric.samples())
+            except Exception as e:
+                print(f"Metric {metric.name} error: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                    for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        # Unlabelled metrics use a single child with no label values
+        return self.labels()
+
+
+class _CounterValue:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    @property
+    def value(self):
+        return self._default().value
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}'
+
+
+class _Timer:
+    __slots__ = ('_target', '_t0')
+
+    def __init__(self, target):
+        self._target = target
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._target.observe(time.perf_counter() - self._t0)
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return _Timer(self._default())
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ('le', _format_value(bound)))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), fn=None, registry=REGISTRY):
+        self.fn = fn
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def set(self, value):
+        self._default().value = value
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().inc(-amount)
+
+    def samples(self):
+        if self.fn is None:
+            items = [(values, child.value) for values, child in list(self._children.items())]
+        else:
+            value = self.fn()
+            items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, value in items:
+            if value is None:
+                continue
+            values = values if isinstance(values, tuple) else (values,)
+            yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}'
+
+
+class MetricsMiddleware:
+    """Per-request latency (until the response starts) by route template, method and status."""
+
+    def __init__(self, app, histogram, in_flight=None):
+        self.app = app
+        self.histogram = histogram
+        self.in_flight = in_flight
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        status = None
+
+        async def timed_send(message):
+            nonlocal status
+            if status is None and message['type'] == 'http.response.start':
+                status = message['status']
+                self._observe(scope, status, t0)
+            await send(message)
+
+        if self.in_flight is not None:
+            self.in_flight.inc()
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if self.in_flight is not None:
+                self.in_flight.dec()
+            if status is None:
+                self._observe(scope, 500, t0)  # raised before sending anything
+
+    def _observe(self, scope, status, t0):
+        # The router fills in scope['route'] on a match; templates keep label cardinality bounded
+        route = getattr(scope.get('route'), 'path', None) or '<other>'
+        self.histogram.labels(route, scope['method'], status).observe(time.perf_counter() - t0)
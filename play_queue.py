@@ -0,0 +1,129 @@
+"""
+User play queue ("play next" / "add to queue") for the server.
+
+PlayQueue is a doubly linked list threaded through a dict keyed by queue-entry id, plus
+an index from track id to its entries:
+
+- append / play_next / pop / peek are O(1), like a deque
+- remove and move (to the front or after another entry) are O(1) by entry id, which is
+  what a drag-and-drop UI needs; a plain deque would make both O(n)
+- remove_track drops every entry of a track in O(entries of that track)
+
+Entries hold stable track ids (not list indices), so library edits never shift them.
+"""
+
+import itertools
+
+
+class PlayQueue:
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._nodes = {}     # qid -> [prev_qid, next_qid, track_id]
+        self._by_track = {}  # track_id -> set of qids
+        self._head = None
+        self._tail = None
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, qid):
+        return qid in self._nodes
+
+    def __iter__(self):
+        """Yield (qid, track_id) front to back."""
+        qid = self._head
+        while qid is not None:
+            node = self._nodes.get(qid)
+            if node is None:
+                return  # removed under a lock-free reader; stop rather than raise
+            yield qid, node[2]
+            qid = node[1]
+
+    def items(self, limit=None):
+        return list(itertools.islice(self, limit))
+
+    def peek(self):
+        if self._head is None:
+            return None
+        return self._head, self._nodes[self._head][2]
+
+    def pop(self):
+        entry = self.peek()
+        if entry is not None:
+            self.remove(entry[0])
+        return entry
+
+    def append(self, track_id):
+        return self._insert(track_id, after=self._tail)
+
+    def play_next(self, track_id):
+        return self._insert(track_id, after=None)
+
+    def insert_after(self, track_id, after):
+        """Insert after entry `after` (None = at the front). Returns the new qid."""
+        if after is not None and after not in self._nodes:
+            raise KeyError(after)
+        return self._insert(track_id, after)
+
+    def move(self, qid, after=None):
+        """Move entry `qid` right after entry `after` (None = to the front)."""
+        if qid not in self._nodes or (after is not None and after not in self._nodes):
+            return False
+        if qid == after or self._nodes[qid][0] == after:
+            return True
+        track_id = self._nodes[qid][2]
+        self._unlink(qid)
+        self._link(qid, track_id, after)
+        return True
+
+    def remove(self, qid):
+        if qid not in self._nodes:
+            return False
+        track_id = self._nodes[qid][2]
+        self._unlink(qid)
+        qids = self._by_track[track_id]
+        qids.discard(qid)
+        if not qids:
+            del self._by_track[track_id]
+        return True
+
+    def remove_track(self, track_id):
+        """Drop every entry of `track_id` (e.g. the track left the library)."""
+        for qid in list(self._by_track.get(track_id, ())):
+            self.remove(qid)
+
+    def clear(self):
+        self._nodes.clear()
+        self._by_track.clear()
+        self._head = self._tail = None
+
+    # --- internals -----------------------------------------------------------
+
+    def _insert(self, track_id, after):
+        qid = next(self._ids)
+        self._link(qid, track_id, after)
+        self._by_track.setdefault(track_id, set()).add(qid)
+        return qid
+
+    def _link(self, qid, track_id, after):
+        nxt = self._head if after is None else self._nodes[after][1]
+        self._nodes[qid] = [after, nxt, track_id]
+        if after is None:
+            self._head = qid
+        else:
+            self._nodes[after][1] = qid
+        if nxt is None:
+            self._tail = qid
+        else:
+            self._nodes[nxt][0] = qid
+
+    def _unlink(self, qid):
+        prev, nxt, _ = self._nodes.pop(qid)
+        if prev is None:
+            self._head = nxt
+        else:
+            self._nodes[prev][1] = nxt
+        if nxt is None:
+            self._tail = prev
+        else:
+            self._nodes[nxt][0] = prev
@@ -0,0 +1,160 @@
+"""
+File responses with HTTP Range and conditional request support, for streaming audio
+to browsers.
+
+RangeFileResponse answers:
+- `Range: bytes=a-b` / `bytes=a-` / `bytes=-n` with 206 Partial Content (416 when the
+  range is unsatisfiable; multi-range requests get the whole file)
+- `If-None-Match` / `If-Modified-Since` with 304 Not Modified, using an ETag built from
+  size and mtime
+- `If-Range`, so a resumed download never splices two versions of a file
+- HEAD requests with headers only
+
+The body is sent with the ASGI zero-copy extension (`http.response.zerocopysend`, i.e.
+sendfile) when the server offers it, and otherwise streamed in chunks read on the
+threadpool.
+"""
+
+import os
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+CHUNK_SIZE = 256 * 1024
+
+AUDIO_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/ogg',
+    '.wav': 'audio/wav',
+    '.m4a': 'audio/mp4',
+    '.flac': 'audio/flac',
+}
+
+
+def guess_media_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    return AUDIO_TYPES.get(ext) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single byte range, None to ignore the header,
+    or 'unsatisfiable'.
+
+    Malformed specs, including a last byte before the first (`bytes=5-3`), are ignored
+    as RFC 9110 asks; a well-formed range that starts past the end, or an empty suffix
+    (`bytes=-0`), is unsatisfiable.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep or not (first or last) or not all(p.isascii() and p.isdigit() for p in (first, last) if p):
+        return None
+    if first == '':
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            return 'unsatisfiable'
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+class RangeFileResponse(Response):
+    def __init__(self, path, request, media_type=None, cache_control='private, no-cache', stat_result=None):
+        st = stat_result or os.stat(path)
+        self.path = path
+        self.size = st.st_size
+        self.background = None
+        self.media_type = media_type or guess_media_type(path)
+        self.send_body = request.method != 'HEAD'
+        self.start, self.length = 0, self.size
+
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        last_modified = formatdate(st.st_mtime, usegmt=True)
+        headers = {
+            'accept-ranges': 'bytes',
+            'etag': etag,
+            'last-modified': last_modified,
+            'cache-control': cache_control,
+        }
+
+        if self._not_modified(request.headers, etag, int(st.st_mtime)):
+            self.status_code = 304
+            self.send_body = False
+            self.length = 0
+            self.init_headers(headers)
+            return
+
+        self.status_code = 200
+        range_header = request.headers.get('range')
+        if range_header and self._if_range_ok(request.headers.get('if-range'), etag, last_modified):
+            rng = parse_range(range_header, self.size)
+            if rng == 'unsatisfiable':
+                self.status_code = 416
+                self.send_body = False
+                self.length = 0
+                headers['content-range'] = f'bytes */{self.size}'
+                headers['content-length'] = '0'
+                self.init_headers(headers)
+                return
+            if rng is not None:
+                start, end = rng
+                self.status_code = 206
+                self.start, self.length = start, end - start + 1
+                headers['content-range'] = f'bytes {start}-{end}/{self.size}'
+
+        headers['content-length'] = str(self.length)
+        self.init_headers(headers)
+
+    @staticmethod
+    def _not_modified(req_headers, etag, mtime):
+        inm = req_headers.get('if-none-match')
+        if inm is not None:
+            tags = [t.strip().removeprefix('W/') for t in inm.split(',')]
+            return '*' in tags or etag in tags
+        ims = req_headers.get('if-modified-since')
+        if ims:
+            try:
+                return mtime <= parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    def _if_range_ok(if_range, etag, last_modified):
+        # If-Range carries either an ETag or a date; a mismatch means "send it all"
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith(('"', 'W/')):
+            return if_range == etag
+        return if_range == last_modified
+
+    async def __call__(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        if not self.send_body or self.length == 0:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        with open(self.path, 'rb') as f:
+            if 'http.response.zerocopysend' in scope.get('extensions', {}):
+                await send({'type': 'http.response.zerocopysend', 'file': f,
+                            'offset': self.start, 'count': self.length})
+                return
+
+            await run_in_threadpool(f.seek, self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+            if remaining > 0:
+                await send({'type': 'http.response.body', 'body': b''})
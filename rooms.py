@@ -0,0 +1,377 @@
+"""
+Independent player sessions ("rooms") hosted next to the server's own player.
+
+The process has one audio output (pygame's mixer) and the main player owns it. A room
+is a separate session over the same library whose audio plays in the browser through
+/api/stream: the room only keeps playback state (current track, play/pause with a
+position clock, volume, shuffle/repeat), its own play queue and its own gesture
+recognizer, and every client in the room follows it.
+
+Rooms hold track ids, never track dicts. The library (tracks, the encoded track list
+sent to clients, the id -> index map) lives once in the main player and all rooms read it,
+so an idle room is a few hundred bytes; a ShuffleOrder (O(tracks)) only exists while
+shuffle is on. Library edits are picked up lazily via `library.library_version`.
+
+Rooms expose the same control methods as MusicPlayer (play_track, toggle_play,
+next_track, ..., get_state), so API routes can drive either one. Like the main player's,
+room mutations run on the server's command actor.
+"""
+
+import re
+import time
+import uuid
+import threading
+
+from play_queue import PlayQueue
+from shuffle_order import ShuffleOrder
+
+ROOM_ID = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+DEFAULT_VOLUME = 50     # starting volume of the main player and of every new room
+
+
+class Room:
+    __slots__ = ('id', 'library', 'current_id', 'is_playing', 'volume', 'shuffle', 'repeat',
+                 'shuffler', 'play_queue', 'state_version', 'created', 'last_seen',
+                 '_library_version', '_recognizer', '_recognizer_factory',
+                 '_anchor_time', '_anchor_pos', '_anchor_rate')
+
+    def __init__(self, room_id, library, recognizer_factory=None):
+        self.id = room_id
+        self.library = library
+        self.current_id = None
+        self.is_playing = False
+        self.volume = DEFAULT_VOLUME
+        self.shuffle = False
+        self.repeat = False
+        self.shuffler = None
+        self.play_queue = PlayQueue()
+        self.state_version = 0
+        self.created = self.last_seen = time.monotonic()
+        self._library_version = library.library_version
+        self._recognizer = None
+        self._recognizer_factory = recognizer_factory
+        self._set_anchor(0.0)
+
+    @property
+    def recognizer(self):
+        # Created on the first gesture frame; rooms driven by buttons never pay for one
+        if self._recognizer is None and self._recognizer_factory is not None:
+            self._recognizer = self._recognizer_factory()
+        return self._recognizer
+
+    @property
+    def current_idx(self):
+        idx = self.library.index_of(self.current_id) if self.current_id is not None else None
+        return -1 if idx is None else idx
+
+    def _current_track(self):
+        idx = self.current_idx
+        return self.library.tracks[idx] if idx >= 0 else None
+
+    # --- clock ----------------------------------------------------------------
+
+    def _set_anchor(self, position):
+        self._anchor_time = time.monotonic()
+        self._anchor_pos = float(position)
+        self._anchor_rate = 1.0 if self.is_playing else 0.0
+
+    def position(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self._anchor_pos + self._anchor_rate * (now - self._anchor_time)
+
+    def _changed(self):
+        self.state_version += 1
+
+    # --- library sync ---------------------------------------------------------
+
+    def _sync(self):
+        """Catch up with library edits made since the last command (O(tracks), rare)."""
+        version = self.library.library_version
+        if version == self._library_version:
+            return
+        self._library_version = version
+        index_of = self.library.index_of
+        if self.current_id is not None and index_of(self.current_id) is None:
+            self.current_id = None
+            self.is_playing = False
+            self._set_anchor(0.0)
+        for qid, track_id in self.play_queue.items():
+            if index_of(track_id) is None:
+                self.play_queue.remove(qid)
+        if self.shuffler is not None:
+            self.shuffler.reset([t['id'] for t in self.library.tracks], self.current_id)
+        self._changed()
+
+    # --- controls (same names as MusicPlayer) ---------------------------------
+
+    def play_track(self, idx):
+        self._sync()
+        tracks = self.library.tracks
+        if not (0 <= idx < len(tracks)):
+            return False
+        self.current_id = tracks[idx]['id']
+        if self.shuffler is not None:
+            self.shuffler.jump(self.current_id)
+        self.is_playing = True
+        self._set_anchor(0.0)
+        self._changed()
+        return True
+
+    def toggle_play(self):
+        self._sync()
+        if not self.library.tracks:
+            return False
+        if self.current_id is None:
+            self.play_track(0)
+        else:
+            position = self.position()
+            self.is_playing = not self.is_playing
+            self._set_anchor(position)
+            self._changed()
+        return self.is_playing
+
+    def next_track(self):
+        self._sync()
+        idx = self._upcoming_idx(consume=True)
+        return idx is not None and self.play_track(idx)
+
+    def prev_track(self):
+        self._sync()
+        tracks = self.library.tracks
+        if not tracks:
+            return False
+        if self.shuffler is not None:
+            key = self.shuffler.prev()
+            idx = self.library.index_of(key) if key is not None else None
+            return self.play_track(idx if idx is not None else max(self.current_idx, 0))
+        return self.play_track((self.current_idx - 1) % len(tracks))
+
+    def seek(self, seconds):
+        if self.current_id is None:
+            return False
+        self._set_anchor(max(0.0, seconds))
+        self._changed()
+        return True
+
+    def set_volume(self, vol):
+        self.volume = max(0, min(100, vol))
+        self._changed()
+        return self.volume
+
+    def toggle_shuffle(self):
+        self._sync()
+        self.shuffle = not self.shuffle
+        if self.shuffle:
+            self.shuffler = ShuffleOrder([t['id'] for t in self.library.tracks], self.current_id)
+        else:
+            self.shuffler = None
+        self._changed()
+        return self.shuffle
+
+    def toggle_repeat(self):
+        self.repeat = not self.repeat
+        self._changed()
+        return self.repeat
+
+    def ended(self, track_id):
+        """A client's audio element finished `track_id`; advance once, however many report it."""
+        if track_id != self.current_id or not self.is_playing:
+            return False
+        return self._advance()
+
+    def tick(self, now=None):
+        """Advance if the current track has run out by the room clock."""
+        track = self._current_track() if self.is_playing else None
+        if track is None:
+            return False
+        duration = track.get('duration_exact') or track.get('duration_sec') or 0
+        if duration <= 0 or self.position(now) < duration:
+            return False
+        return self._advance()
+
+    def _advance(self):
+        if self.repeat and self.current_id is not None:
+            return self.play_track(self.current_idx)
+        return self.next_track()
+
+    def _upcoming_idx(self, consume=False):
+        tracks = self.library.tracks
+        if not tracks:
+            return None
+        index_of = self.library.index_of
+        for qid, track_id in self.play_queue.items():
+            idx = index_of(track_id)
+            if idx is not None:
+                if consume:
+                    self.play_queue.remove(qid)
+                return idx
+        if self.shuffler is not None and len(tracks) > 1:
+            key = self.shuffler.peek()
+            if key is not None and index_of(key) is not None:
+                return index_of(key)
+        return (self.current_idx + 1) % len(tracks)
+
+    # --- play queue -----------------------------------------------------------
+
+    def enqueue(self, idx, play_next=False):
+        self._sync()
+        tracks = self.library.tracks
+        if not (0 <= idx < len(tracks)):
+            return None
+        track_id = tracks[idx]['id']
+        qid = self.play_queue.play_next(track_id) if play_next else self.play_queue.append(track_id)
+        self._changed()
+        return qid
+
+    def dequeue(self, qid):
+        if not self.play_queue.remove(qid):
+            return False
+        self._changed()
+        return True
+
+    def move_queued(self, qid, after=None):
+        if not self.play_queue.move(qid, after):
+            return False
+        self._changed()
+        return True
+
+    def clear_queue(self):
+        self.play_queue.clear()
+        self._changed()
+
+    def queue_state(self):
+        index_of = self.library.index_of
+        return [{'qid': qid, 'track_id': track_id, 'idx': index_of(track_id)}
+                for qid, track_id in self.play_queue if index_of(track_id) is not None]
+
+    def up_next(self, n=20):
+        tracks = self.library.tracks
+        if not tracks:
+            return []
+        if self.repeat and self.current_idx >= 0:
+            return [self.current_idx]
+        index_of = self.library.index_of
+        out = [idx for idx in (index_of(tid) for _, tid in self.play_queue.items(n)) if idx is not None]
+        n -= len(out)
+        if n <= 0:
+            return out
+        if self.shuffler is not None and len(tracks) > 1:
+            return out + [idx for idx in map(index_of, self.shuffler.upcoming(n)) if idx is not None]
+        return out + [(self.current_idx + i) % len(tracks) for i in range(1, min(n, len(tracks) - 1) + 1)]
+
+    # --- state ----------------------------------------------------------------
+
+    def get_state(self, include_tracks=True):
+        """Same shape as MusicPlayer.get_state(), plus the room id and where audio plays."""
+        track = self._current_track()
+        now = time.monotonic()
+        state = {
+            'room': self.id,
+            'playback': 'browser',
+            'current_idx': self.current_idx,
+            'current_track_id': self.current_id,
+            'current_track': track['name'] if track else None,
+            'is_playing': self.is_playing,
+            'volume': self.volume,
+            'normalize': False,
+            'shuffle': self.shuffle,
+            'repeat': self.repeat,
+            'up_next': self.up_next(),
+            'queue_length': len(self.play_queue),
+            'position': self.position(now),
+            'duration': track.get('duration_exact', track.get('duration_sec', 0)) if track else 0,
+            'version': self.state_version,
+            'anchor': {
+                'server_time': self._anchor_time,
+                'position': self._anchor_pos,
+                'rate': self._anchor_rate,
+                'is_playing': self.is_playing
+            },
+            'server_time': now
+        }
+        if include_tracks:
+            state['tracks'] = self.library.tracks_json()
+        return state
+
+    def summary(self):
+        track = self._current_track()
+        return {'room': self.id, 'current_track': track['name'] if track else None,
+                'is_playing': self.is_playing, 'idle_seconds': round(time.monotonic() - self.last_seen, 1)}
+
+
+class RoomManager:
+    def __init__(self, library, recognizer_factory=None, max_rooms=64, idle_timeout=6 * 3600):
+        self.library = library
+        self.recognizer_factory = recognizer_factory
+        self.max_rooms = max_rooms
+        self.idle_timeout = idle_timeout
+        self._rooms = {}
+        self._ticker = None
+        self._ticker_stop = threading.Event()
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def create(self, room_id=None):
+        """New room (random id unless one is given). Raises ValueError if the id is bad,
+        taken, or the server is full."""
+        room_id = room_id or uuid.uuid4().hex[:8]
+        if not ROOM_ID.match(room_id):
+            raise ValueError("Room ids are 1-32 letters, digits, '-' or '_'")
+        if room_id in self._rooms:
+            raise ValueError(f"Room {room_id} already exists")
+        if len(self._rooms) >= self.max_rooms:
+            raise ValueError("Too many rooms")
+        room = Room(room_id, self.library, self.recognizer_factory)
+        self._rooms[room_id] = room
+        return room
+
+    def get(self, room_id):
+        room = self._rooms.get(room_id)
+        if room is not None:
+            room.last_seen = time.monotonic()
+        return room
+
+    def close(self, room_id):
+        return self._rooms.pop(room_id, None) is not None
+
+    def items(self):
+        """(room_id, room) pairs, without counting as activity."""
+        return list(self._rooms.items())
+
+    def list(self):
+        return [room.summary() for room in list(self._rooms.values())]
+
+    def tick(self):
+        """Advance rooms whose track ran out and drop rooms nobody has touched in a while."""
+        now = time.monotonic()
+        for room_id, room in list(self._rooms.items()):
+            if now - room.last_seen > self.idle_timeout:
+                self._rooms.pop(room_id, None)
+                continue
+            try:
+                room.tick(now)
+            except Exception as e:
+                print(f"Room {room_id} tick error: {e}")
+
+    def start_ticker(self, interval=0.5, dispatch=None):
+        """Run tick() every `interval` s; `dispatch(fn)` -> Future runs it on the command actor."""
+        if self._ticker is not None and self._ticker.is_alive():
+            return
+        self._ticker_stop.clear()
+        self._ticker = threading.Thread(target=self._ticker_loop, args=(interval, dispatch),
+                                        name="room-ticker", daemon=True)
+        self._ticker.start()
+
+    def stop_ticker(self):
+        self._ticker_stop.set()
+
+    def _ticker_loop(self, interval, dispatch):
+        pending = None
+        while not self._ticker_stop.wait(interval):
+            if not self._rooms:
+                continue
+            if dispatch is None:
+                self.tick()
+            elif pending is None or pending.done():
+                pending = dispatch(self.tick)
@@ -3,36 +3,77 @@ PalmPlay - FastAPI Backend Server
 Handles music playback, gesture detection, and serves the web frontend.
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Response
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Response, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import sys
 import json
-import base64
 import asyncio
-import cv2
+import anyio
+import importlib.util
 import numpy as np
-from io import BytesIO
-from PIL import Image
-import pygame
 from collections import deque
 import time
+import mmap
+import itertools
+import threading
+from collections import OrderedDict
+from array import array
+from volume_stage import VolumeStage
+from command_actor import CommandActor
+from jobs import JobManager
+from shuffle_order import ShuffleOrder
+from play_queue import PlayQueue
+from rooms import RoomManager, DEFAULT_VOLUME
+from track_table import Track, TrackTable
+from library_index import LibraryIndex
+from range_response import RangeFileResponse
+from fast_response import FastJSONResponse, CompressionMiddleware, RawJSON, respond, dumps
+from shared_state import StateStore, OwnerLock, WorkerRouter
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Gauge, Histogram, MetricsMiddleware
+from transcode_cache import TranscodeCache
+from audio_analysis import AnalysisWorker, LoudnessTask, WaveformTask
+from library_cache import load_library, save_library, is_fresh, file_stamp
 
-# MediaPipe imports
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
 
-# Mutagen for cover art
-try:
-    from mutagen.mp3 import MP3
-    from mutagen.id3 import ID3, APIC
-    HAS_MUTAGEN = True
-except ImportError:
-    HAS_MUTAGEN = False
+def lazy_import(name):
+    """Module whose import runs on first attribute access instead of right now."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
 
-app = FastAPI(title="PalmPlay API")
+# Startup stays fast: pygame loads when the audio subsystem starts, cv2/MediaPipe when
+# the gesture model loads, and mutagen on the first scan
+pygame = lazy_import('pygame')
+
+# Mutagen for tags and cover art
+HAS_MUTAGEN = importlib.util.find_spec('mutagen') is not None
+
+# Endpoints with big payloads return respond(...) directly (orjson/msgpack, no jsonable_encoder)
+app = FastAPI(title="PalmPlay API", default_response_class=FastJSONResponse)
+STARTED_AT = time.monotonic()
+
+
+def warm_page_cache(path, chunk_size=1 << 20):
+    """Pull a file into the OS page cache so a later load() doesn't wait on disk/network."""
+    try:
+        with open(path, 'rb') as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            while f.read(chunk_size):
+                pass
+        return True
+    except OSError as e:
+        print(f"Prefetch error for {path}: {e}")
+        return False
 
 # CORS for frontend
 app.add_middleware(
@@ -42,195 +83,517 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get("PALMPLAY_COMPRESS_MIN_BYTES", "1400")))
+
+### --- Multi-worker -------------------------------------------------------------
+# Off unless PALMPLAY_SHARED_STATE names a SQLite file (`python server.py --workers N`
+# sets it). One worker owns playback and publishes snapshots; the others answer reads
+# and run gesture inference from those, and forward everything else (see shared_state.py).
+
+SHARED_STATE = os.environ.get("PALMPLAY_SHARED_STATE")
+store = StateStore(SHARED_STATE) if SHARED_STATE else None
+owner_lock = OwnerLock(SHARED_STATE + ".lock") if SHARED_STATE else None
+# Served by every worker; the rest of /api/ runs on the owner
+WORKER_LOCAL_ROUTES = ("/api/state", "/api/tracks", "/api/clock", "/api/cover/", "/api/stream/", "/api/detect-gesture")
+
+def is_owner():
+    return owner_lock is None or owner_lock.held
+
+def owner_url():
+    _, value = store.get("owner")
+    return f"http://127.0.0.1:{json.loads(value)['port']}" if value else None
+
+if store is not None:
+    app.add_middleware(WorkerRouter, is_owner=is_owner, owner_url=owner_url, local_paths=WORKER_LOCAL_ROUTES,
+                       before_local=lambda path: anyio.to_thread.run_sync(sync_shared_library))
+
+### --- Metrics --------------------------------------------------------------------
+# Served at /metrics (Prometheus text format). Gauges for queues are registered next to
+# the objects they read, further down.
+
+REQUEST_LATENCY = Histogram('palmplay_http_request_duration_seconds',
+                            'HTTP request latency until the response starts', ('route', 'method', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('palmplay_http_requests_in_flight', 'HTTP requests being handled')
+GESTURE_STAGE = Histogram('palmplay_gesture_stage_seconds',
+                          'detect-gesture time per stage (decode, inference, recognize)', ('stage',))
+GESTURE_FRAMES = Counter('palmplay_gesture_frames_total', 'Frames posted to detect-gesture')
+GESTURE_DROPPED = Counter('palmplay_gesture_frames_dropped_total',
+                          'Frames that could not be run through the detector', ('reason',))
+GESTURES = Counter('palmplay_gestures_total', 'Gestures recognized', ('gesture',))
+SCAN_FILE = Histogram('palmplay_scan_file_seconds', 'Time to scan one audio file (tags, duration, seek index)')
+COVER_CACHE = Counter('palmplay_cover_cache_requests_total', 'Cover lookups by cache result', ('result',))
+TRACK_ADVANCES = Counter('palmplay_track_advances_total', 'Track changes by cause', ('reason',))
+
+# Outermost middleware, so the recorded latency includes compression
+app.add_middleware(MetricsMiddleware, histogram=REQUEST_LATENCY, in_flight=REQUESTS_IN_FLIGHT)
+
+# --- Seek index ---------------------------------------------------------------
+# VBR MP3s have no fixed byte<->time mapping, so play(start=...) has to decode from the
+# start of the file and is often off. At scan time we walk the MPEG frame headers once and
+# record the byte offset of the first frame of every second; seeking then opens the file
+# at that offset. The same walk gives an exact duration without decoding any audio.
+
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1 Layer III
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],      # MPEG-2/2.5 Layer III
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_frame(buf, pos):
+    """Return (frame_length, samples, sample_rate) for a Layer III header at pos, or None."""
+    if pos + 4 > len(buf) or buf[pos] != 0xFF or (buf[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2 = buf[pos + 1], buf[pos + 2]
+    version = (b1 >> 3) & 3
+    layer = (b1 >> 1) & 3
+    bitrate_idx = b2 >> 4
+    sr_idx = (b2 >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or sr_idx == 3:
+        return None
+    padding = (b2 >> 1) & 1
+    sample_rate = _MP3_SAMPLE_RATES[version][sr_idx]
+    if version == 3:
+        bitrate = _MP3_BITRATES[1][bitrate_idx] * 1000
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+    bitrate = _MP3_BITRATES[2][bitrate_idx] * 1000
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate
+
+
+def build_seek_index(path):
+    """Walk the frames of an MP3 and return (exact_duration_sec, offsets).
+
+    offsets[n] is the byte offset of the first frame at or after second n, as a compact
+    array('I'). Returns (None, None) for non-MP3 files or streams we can't parse.
+    """
+    if not path.lower().endswith('.mp3'):
+        return None, None
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            size = len(buf)
+            pos = 0
+            # Skip an ID3v2 tag (syncsafe size)
+            if size >= 10 and buf[0:3] == b'ID3':
+                tag_size = (buf[6] << 21) | (buf[7] << 14) | (buf[8] << 7) | buf[9]
+                pos = 10 + tag_size + (10 if buf[5] & 0x10 else 0)
+
+            offsets = array('I')
+            samples = 0
+            sample_rate = None
+            while pos + 4 <= size:
+                frame = _mp3_frame(buf, pos)
+                if frame is None or frame[0] <= 4:
+                    if buf[pos:pos + 3] == b'TAG':
+                        break  # ID3v1 trailer
+                    pos += 1  # resync
+                    continue
+                length, frame_samples, rate = frame
+                if sample_rate is None:
+                    # Only trust the first sync if the following frame lines up too
+                    if pos + length + 4 <= size and _mp3_frame(buf, pos + length) is None:
+                        pos += 1
+                        continue
+                    sample_rate = rate
+                while len(offsets) * sample_rate <= samples:
+                    offsets.append(pos)
+                samples += frame_samples
+                pos += length
+    except (OSError, ValueError) as e:
+        print(f"Seek index error for {path}: {e}")
+        return None, None
+
+    if not sample_rate:
+        return None, None
+    return samples / sample_rate, offsets
+
 
 # Global state
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.m4a', '.flac')
+
 class MusicPlayer:
-    def __init__(self):
-        try:
-            pygame.mixer.init()
-        except Exception as e:
-            print(f"Mixer init error: {e}")
+    def __init__(self, transcoder=None, analyzer=None):
         self.tracks = []
         self.current_idx = 0
         self.is_playing = False
-        self.volume = 50
+        self.volume = DEFAULT_VOLUME
         self.shuffle = False
         self.repeat = False
         self.music_folder = None
         self.start_time_offset = 0
-        self._cached_safe_tracks = []
+        # Converts .m4a/.flac into something pygame can stream (None = play files as-is)
+        self.transcoder = transcoder
+        # Background loudness analysis; results land in each track's 'gain_db'
+        self.analyzer = analyzer
+        self._unanalyzed = []       # added since the last _update_cache, not yet handed to the analyzer
+        self.normalize = True
+        # Tracks get a stable id at scan time; the shuffle order and API refer to ids
+        self._track_ids = itertools.count(1)
+        self.shuffler = ShuffleOrder()
+        # User "play next" / "add to queue" entries; auto-advance drains it before the library order
+        self.play_queue = PlayQueue()
+        # Columnar view of the library sent to clients, and its JSON encoding (built on first use)
+        self.table = TrackTable(self.tracks)
+        self._tracks_json = None
+        # Album/artist aggregates for the browse endpoints, updated per added/removed track
+        self.library_index = LibraryIndex()
         self._last_tracks_hash = 0
+        self.library_version = 0    # bumped on every library edit; rooms re-sync against it
+        # Gapless handoff: the upcoming track is prefetched and queued behind the current one
+        self._next_idx = None       # chosen upcoming index (kept stable so skips hit the prefetched file)
+        self._next_qid = None       # play_queue entry _next_idx came from, consumed when it starts
+        self._queued_idx = None     # index currently sitting in pygame.mixer.music.queue()
+        self._queue_gen = 0         # bumped on every load() so stale prefetch threads don't queue
+        self._queue_lock = threading.Lock()
+        self._queued_path = None    # file behind _queued_idx (a transcode cache entry stays pinned)
+        # A track picked before its transcode is ready starts once the conversion finishes
+        self.loading = False
+        self._pending_load = None   # token of that wait; any newer load/seek replaces it
+        self.dispatch = None        # dispatch(fn, *args) -> Future runs fn on the command actor
+        self._last_pos_ms = 0
+        self._seek_file = None      # file object pygame is streaming from after an indexed seek
+        # Track-end handling lives in a monitor thread so get_state() stays a pure read
+        self.lock = threading.RLock()
+        self.state_version = 0
+        self._listeners = []
+        self._monitor_thread = None
+        self._monitor_stop = threading.Event()
+        # Playback clock anchor: position at a server monotonic time, advancing at `rate`.
+        # Clients extrapolate from it and only need a new one on pause/seek/track change.
+        self._anchor_time = time.monotonic()
+        self._anchor_pos = 0.0
+        self._anchor_rate = 0.0
+        self.drift_tolerance = 0.25
         
+    def init_audio(self):
+        """Start the mixer. Deferred to server startup so importing this module stays cheap."""
+        pygame.mixer.init()
+        pygame.mixer.music.set_volume(self._mixer_volume(self._current_track()))
+
     def load_folder(self, folder_path, append=False):
-        if not append:
-            self.tracks = []
-        
-        self.music_folder = folder_path
+        tracks = []
         if os.path.isdir(folder_path):
             print(f"Scanning folder: {folder_path}")
-            # Support multiple formats
-            valid_extensions = ('.mp3', '.wav', '.ogg', '.m4a', '.flac')
-            for f in sorted(os.listdir(folder_path)):
-                if f.lower().endswith(valid_extensions):
-                    full_path = os.path.join(folder_path, f)
-                    metadata = {
-                        'name': os.path.splitext(f)[0],
-                        'path': full_path,
-                        'filename': f,
-                        'artist': 'Unknown Artist',
-                        'album': 'Unknown Album',
-                        'year': 'Unknown Year',
-                        'duration': '0:00',
-                        'duration_sec': 0
-                    }
-                    
-                    if HAS_MUTAGEN:
-                        try:
-                            from mutagen import File
-                            audio = File(full_path)
-                            
-                            if audio is not None:
-                                # Duration
-                                if hasattr(audio.info, 'length'):
-                                    duration_sec = int(audio.info.length)
-                                    mins = duration_sec // 60
-                                    secs = duration_sec % 60
-                                    metadata['duration'] = f"{mins}:{secs:02d}"
-                                    metadata['duration_sec'] = duration_sec
-                                
-                                # Tags
-                                if audio.tags:
-                                    tags = audio.tags
-                                    # Handle different tag formats
-                                    if 'TPE1' in tags: metadata['artist'] = str(tags['TPE1'])
-                                    elif 'artist' in tags: metadata['artist'] = str(tags['artist'][0])
-                                    
-                                    if 'TALB' in tags: metadata['album'] = str(tags['TALB'])
-                                    elif 'album' in tags: metadata['album'] = str(tags['album'][0])
-                                    
-                                    if 'TDRC' in tags: metadata['year'] = str(tags['TDRC'])[:4]
-                                    elif 'TYER' in tags: metadata['year'] = str(tags['TYER'])[:4]
-                                    elif 'date' in tags: metadata['year'] = str(tags['date'][0])[:4]
-                                    
-                        except Exception as e:
-                            print(f"Error reading metadata for {f}: {e}")
-                            
-                    self.tracks.append(metadata)
-        
-        self._update_cache()
+            tracks = self.scan_files(self.list_folder(folder_path))
+        self.add_scanned(tracks, replace=not append, folder=folder_path)
         print(f"Loaded {len(self.tracks)} tracks total")
         return len(self.tracks)
+
+    # Scanning is split from committing so the slow part (directory listing, mutagen,
+    # seek index) can run in a background job while the player keeps serving commands
+
+    @staticmethod
+    def list_folder(folder_path):
+        """Audio files directly inside `folder_path`, sorted by name."""
+        return [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path))
+                if f.lower().endswith(AUDIO_EXTENSIONS)]
+
+    def scan_files(self, paths, progress=None):
+        """Scan tags/duration/seek index for `paths`. Touches no player state.
+
+        progress(done, total) is called before each file and may raise to stop the scan.
+        """
+        tracks = []
+        for i, path in enumerate(paths):
+            if progress is not None:
+                progress(i, len(paths))
+            with SCAN_FILE.time():
+                tracks.append(self._scan_track(path))
+        if progress is not None:
+            progress(len(paths), len(paths))
+        return tracks
+
+    def add_scanned(self, tracks, replace=False, folder=None):
+        """Add already scanned tracks to the library (replacing it if `replace`)."""
+        with self.lock:
+            if replace:
+                self.tracks = []
+                self.shuffler.reset(())
+                self.play_queue.clear()
+                self.library_index.clear()
+                self._unanalyzed = []
+            if folder is not None:
+                self.music_folder = folder
+            for track in tracks:
+                self._append_track(track)
+            if tracks or replace:
+                self._update_cache()
+            return len(tracks)
+
+    def apply_rescan(self, stale_paths, tracks):
+        """Drop tracks whose files changed or vanished, then add the (re)scanned ones."""
+        with self.lock:
+            stale = set(stale_paths)
+            doomed = {idx for idx, track in enumerate(self.tracks) if track['path'] in stale}
+            self._drop_tracks(doomed)
+            for track in tracks:
+                self._append_track(track)
+            if doomed or tracks:
+                self._update_cache()
+            return len(tracks)
+
+    def _scan_track(self, full_path):
+        """Read tags, duration and the seek index for one file."""
+        f = os.path.basename(full_path)
+        size, mtime_ns = file_stamp(full_path)
+        metadata = Track({
+            'id': next(self._track_ids),
+            'name': os.path.splitext(f)[0],
+            'path': full_path,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'filename': f,
+            'artist': 'Unknown Artist',
+            'album': 'Unknown Album',
+            'year': 'Unknown Year',
+            'duration': '0:00',
+            'duration_sec': 0
+        })
+        
+        if HAS_MUTAGEN:
+            try:
+                from mutagen import File
+                audio = File(full_path)
+                
+                if audio is not None:
+                    # Duration
+                    if hasattr(audio.info, 'length'):
+                        metadata['duration_exact'] = float(audio.info.length)
+                    
+                    # Tags
+                    if audio.tags:
+                        tags = audio.tags
+                        # Handle different tag formats
+                        if 'TPE1' in tags: metadata['artist'] = str(tags['TPE1'])
+                        elif 'artist' in tags: metadata['artist'] = str(tags['artist'][0])
+                        
+                        if 'TALB' in tags: metadata['album'] = str(tags['TALB'])
+                        elif 'album' in tags: metadata['album'] = str(tags['album'][0])
+                        
+                        if 'TDRC' in tags: metadata['year'] = str(tags['TDRC'])[:4]
+                        elif 'TYER' in tags: metadata['year'] = str(tags['TYER'])[:4]
+                        elif 'date' in tags: metadata['year'] = str(tags['date'][0])[:4]
+                        
+            except Exception as e:
+                print(f"Error reading metadata for {f}: {e}")
+
+        # Frame-accurate duration and per-second seek table (MP3); mutagen only estimates VBR length
+        exact, seek_index = build_seek_index(full_path)
+        if exact is not None:
+            metadata['duration_exact'] = exact
+            metadata['seek_index'] = seek_index
+
+        if 'duration_exact' in metadata:
+            duration_sec = int(metadata['duration_exact'])
+            metadata['duration'] = f"{duration_sec // 60}:{duration_sec % 60:02d}"
+            metadata['duration_sec'] = duration_sec
+        return metadata
     
+    def _append_track(self, track):
+        track = Track.of(track)
+        if 'id' not in track:
+            track['id'] = next(self._track_ids)  # loaded from the library cache
+        self.tracks.append(track)
+        self.shuffler.add(track['id'])
+        self.library_index.add(track)
+        if self.analyzer is not None:
+            self._unanalyzed.append(track)
+
+    def _playable_path(self, path):
+        # Blocks on ffmpeg; only for the prefetch thread
+        if self.transcoder is None:
+            return path
+        return self.transcoder.playable_path(path)
+
+    def _pin(self, slot, path):
+        if self.transcoder is not None:
+            self.transcoder.pin(slot, path)
+
+    def _load_and_play(self, track, start=0.0):
+        """Load `track` and play it from `start`. Call with _queue_lock held.
+
+        While the track's transcode is still running, returns its Future instead and
+        leaves the mixer empty: the command actor never waits on ffmpeg and pygame never
+        gets a file it can't play. The caller hands the Future to _wait_for_load().
+        """
+        self._pending_load = None
+        self.loading = False
+        ready = self.transcoder.prepare(track['path']) if self.transcoder is not None else None
+        if ready is not None and not ready.done():
+            pygame.mixer.music.stop()
+            pygame.mixer.music.unload()
+            self._release_seek_file()
+            self._pin('playing', None)
+            self._pin('queued', None)
+            return ready
+        path = ready.result() if ready is not None else track['path']
+        pygame.mixer.music.load(path)
+        self._release_seek_file()
+        self._pin('playing', path)
+        self._pin('queued', None)
+        pygame.mixer.music.set_volume(self._mixer_volume(track))
+        pygame.mixer.music.play(start=start)
+        return None
+
+    def _wait_for_load(self, pending, track, start):
+        # Start `track` on the command actor once `pending` (its transcode) is done
+        token = self._pending_load = object()
+        self.loading = True
+        pending.add_done_callback(lambda job: self._dispatch(self._finish_load, token, track, start, job))
+
+    def _dispatch(self, fn, *args):
+        if self.dispatch is not None:
+            self.dispatch(fn, *args)
+        else:
+            with self.lock:
+                fn(*args)
+
+    def _finish_load(self, token, track, start, job):
+        # On the command actor: the transcode _load_and_play waited for is done
+        if token is not self._pending_load or track is not self._current_track():
+            return  # another track was picked (or this one removed) meanwhile
+        error = job.exception()
+        if error is not None:
+            print(f"Play Error: {track['name']} could not be converted: {error}")
+            self._pending_load = None
+            self.loading = False
+            self._notify('play_state')
+            return
+        if start:
+            self._seek(start)
+        else:
+            self._play_track(self.current_idx)
+
     def _update_cache(self):
         """Update the cached metadata for faster state transfers"""
-        self._cached_safe_tracks = []
-        for t in self.tracks:
-            self._cached_safe_tracks.append({
-                'name': t.get('name', 'Unknown'), 
-                'filename': t.get('filename', 'unknown.mp3'),
-                'artist': t.get('artist', 'Unknown Artist'),
-                'album': t.get('album', 'Unknown Album'),
-                'year': t.get('year', 'Unknown Year'),
-                'duration': t.get('duration', '0:00'),
-                'duration_sec': t.get('duration_sec', 0)
-            })
+        self.table = TrackTable(self.tracks)
         self._last_tracks_hash = len(self.tracks) # Simple hash for now
+        self.library_version += 1
+        if self.analyzer is not None:
+            # Only tracks added since the last update; a rescan re-adds changed files
+            self.analyzer.submit(self._unanalyzed)
+            self._unanalyzed = []
+        # Indices may have shifted; re-pick and re-queue the upcoming track
+        self._reset_upcoming()
     
+    def index_of(self, track_id):
+        return self.table.index_of(track_id)
+
+    def tracks_json(self):
+        """The client track list, encoded once per library version."""
+        cached = self._tracks_json
+        if cached is None or cached[0] is not self.table:
+            table = self.table
+            cached = self._tracks_json = (table, RawJSON(dumps(table.records()), table.records))
+        return cached[1]
+
     def add_files(self, file_paths):
         """Add individual audio files to the playlist"""
-        added_count = 0
-        valid_extensions = ('.mp3', '.wav', '.ogg', '.m4a', '.flac')
-        for file_path in file_paths:
-            if os.path.isfile(file_path) and file_path.lower().endswith(valid_extensions):
-                filename = os.path.basename(file_path)
-                name = os.path.splitext(filename)[0]
-                
-                metadata = {
-                    'path': file_path,
-                    'name': name,
-                    'filename': filename,
-                    'artist': 'Unknown Artist',
-                    'album': 'Unknown Album',
-                    'year': 'Unknown Year',
-                    'duration': '0:00',
-                    'duration_sec': 0
-                }
-                
-                if HAS_MUTAGEN:
-                    try:
-                        from mutagen import File
-                        audio = File(file_path)
-                        if audio is not None:
-                            if hasattr(audio.info, 'length'):
-                                duration_sec = int(audio.info.length)
-                                metadata['duration_sec'] = duration_sec
-                                metadata['duration'] = f"{duration_sec // 60}:{duration_sec % 60:02d}"
-                            
-                            if audio.tags:
-                                tags = audio.tags
-                                if 'TPE1' in tags: metadata['artist'] = str(tags['TPE1'])
-                                elif 'artist' in tags: metadata['artist'] = str(tags['artist'][0])
-                                if 'TALB' in tags: metadata['album'] = str(tags['TALB'])
-                                elif 'album' in tags: metadata['album'] = str(tags['album'][0])
-                    except Exception as e:
-                        print(f"Error reading metadata for {file_path}: {e}")
-                
-                self.tracks.append(metadata)
-                added_count += 1
-        
-        if added_count > 0:
-            self._update_cache()
-        return added_count
+        return self.add_scanned(self.scan_files(self.audio_files(file_paths)))
+
+    @staticmethod
+    def audio_files(file_paths):
+        return [p for p in file_paths if os.path.isfile(p) and p.lower().endswith(AUDIO_EXTENSIONS)]
 
     def remove_track(self, idx):
         if 0 <= idx < len(self.tracks):
-            if idx == self.current_idx:
+            self._drop_tracks({idx})
+            self._update_cache()
+            return True
+        return False
+
+    def _drop_tracks(self, doomed):
+        """Remove the tracks at the `doomed` indices in one pass; the caller updates the cache."""
+        if not doomed:
+            return
+        for idx in doomed:
+            track = self.tracks[idx]
+            self.shuffler.remove(track['id'])
+            self.play_queue.remove_track(track['id'])
+            self.library_index.remove(track)
+        cur = self.current_idx
+        if cur in doomed:
+            with self._queue_lock:
+                self._queue_gen += 1
+                self._queued_idx = None
+                self._pending_load = None
+                self.loading = False
                 try:
                     pygame.mixer.music.stop()
                     pygame.mixer.music.unload()
                 except:
                     pass
-                self.is_playing = False
-                self.tracks.pop(idx)
-                if self.tracks:
-                    self.current_idx = self.current_idx % len(self.tracks)
-                else:
-                    self.current_idx = -1
-            else:
-                self.tracks.pop(idx)
-                if idx < self.current_idx:
-                    self.current_idx -= 1
-            self._update_cache()
-            return True
-        return False
+                self._release_seek_file()
+                self._pin('playing', None)
+                self._pin('queued', None)
+            self.is_playing = False
+            self._set_anchor(0.0)
+        # The current track keeps its place; a removed current one is succeeded by the
+        # next surviving track (wrapping to the first)
+        shift = sum(1 for idx in doomed if idx < cur)
+        self.tracks = [track for idx, track in enumerate(self.tracks) if idx not in doomed]
+        if not self.tracks:
+            self.current_idx = -1
+        elif cur in doomed:
+            self.current_idx = (cur - shift) % len(self.tracks)
+        elif cur >= 0:
+            self.current_idx = cur - shift
 
     def play_track(self, idx):
+        with self.lock:
+            return self._play_track(idx)
+
+    def _play_track(self, idx):
         if not self.tracks or idx < 0 or idx >= len(self.tracks):
             print(f"Invalid track index: {idx}")
             return False
             
         try:
             track = self.tracks[idx]
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load(track['path'])
-            pygame.mixer.music.set_volume(self.volume / 100.0)
-            pygame.mixer.music.play()
+            with self._queue_lock:
+                self._queue_gen += 1
+                self._queued_idx = None
+                pygame.mixer.music.stop()
+                pending = self._load_and_play(track)
             self.current_idx = idx
-            self.is_playing = True
+            if self.shuffle:
+                self.shuffler.jump(track['id'])
+            # While its transcode runs the track is current but not playing yet
+            self.is_playing = pending is None
             self.start_time_offset = 0
-            print(f"Playing [{idx}]: {track['name']}")
+            self._set_anchor(0.0)
+            self._last_pos_ms = 0
+            self._next_idx = None
+            if pending is None:
+                print(f"Playing [{idx}]: {track['name']}")
+                self._prepare_next()
+            else:
+                print(f"Converting [{idx}]: {track['name']}")
+            self._notify('track_change')
+            if pending is not None:
+                self._wait_for_load(pending, track, 0.0)
             return True
         except Exception as e:
             print(f"Play Error: {e}")
             return False
 
     def toggle_play(self):
+        with self.lock:
+            return self._toggle_play()
+
+    def _toggle_play(self):
         if not self.tracks:
             return False
             
+        if self.loading:
+            # Paused before its transcode finished: don't start it when it does
+            self._pending_load = None
+            self.loading = False
+            self._notify('play_state')
+            return False
         if self.is_playing:
             pygame.mixer.music.pause()
             self.is_playing = False
+            self._set_anchor(self.playback_position())
         else:
             if not pygame.mixer.music.get_busy() or self.current_idx == -1:
                 # If nothing was playing or reset, play current or first
@@ -239,98 +602,445 @@ class MusicPlayer:
             else:
                 pygame.mixer.music.unpause()
                 self.is_playing = True
+                self._set_anchor(self._anchor_pos)
+        self._notify('play_state')
         return self.is_playing
 
-    def next_track(self):
+    def _upcoming_idx(self):
+        """Index that next_track() will play. Picked once per track so the prefetch stays valid."""
         if not self.tracks:
-            return False
-            
-        if self.shuffle and len(self.tracks) > 1:
-            import random
-            next_idx = self.current_idx
-            while next_idx == self.current_idx:
-                next_idx = random.randint(0, len(self.tracks) - 1)
+            return None
+        if self._next_idx is not None and self._next_idx < len(self.tracks):
+            return self._next_idx
+        self._next_qid = None
+        head = self.play_queue.peek()
+        if head is not None:
+            self._next_qid, track_id = head
+            next_idx = self.index_of(track_id)
+        elif self.shuffle and len(self.tracks) > 1:
+            next_idx = self.index_of(self.shuffler.peek())
         else:
             next_idx = (self.current_idx + 1) % len(self.tracks)
-            
-        return self.play_track(next_idx)
+        self._next_idx = next_idx
+        return next_idx
+
+    def _reset_upcoming(self):
+        """Drop the picked upcoming track (queue/shuffle/library changed) and prefetch again."""
+        self._next_idx = None
+        self._next_qid = None
+        with self._queue_lock:
+            self._queue_gen += 1  # a prefetch still in flight is for the old pick
+        if self.is_playing:
+            self._prepare_next()
+
+    def _consume_upcoming(self, idx):
+        # The upcoming track is starting; if it came from the play queue, that entry is done
+        if self._next_qid is not None and idx == self._next_idx:
+            self.play_queue.remove(self._next_qid)
+            self._next_qid = None
+            self._notify('queue')
+
+    def _prepare_next(self):
+        """Prefetch the track that plays after this one and queue it for a gapless handoff."""
+        if not self.tracks or not (0 <= self.current_idx < len(self.tracks)):
+            return
+        idx = self.current_idx if self.repeat else self._upcoming_idx()
+        if idx is None:
+            return
+        with self._queue_lock:
+            gen = self._queue_gen
+        path = self.tracks[idx]['path']
+        threading.Thread(target=self._prefetch_and_queue, args=(gen, idx, path),
+                         name="prefetch", daemon=True).start()
+
+    def _prefetch_and_queue(self, gen, idx, path):
+        # Convert ahead of time if needed, so the handoff never waits on ffmpeg
+        path = self._playable_path(path)
+        warm_page_cache(path)
+        with self._queue_lock:
+            if gen != self._queue_gen:
+                return  # a newer load() happened; this prefetch is stale
+            try:
+                pygame.mixer.music.queue(path)
+                self._queued_idx = idx
+                self._queued_path = path
+                self._pin('queued', path)
+            except Exception as e:
+                print(f"Queue error: {e}")
+
+    def _on_queued_handoff(self):
+        """pygame started the queued track on its own; move our state over to it."""
+        idx = self._queued_idx
+        prev = self.tracks[self.current_idx]['name'] if 0 <= self.current_idx < len(self.tracks) else 'Unknown'
+        print(f"Track ended: {prev} (gapless -> [{idx}])")
+        self._queued_idx = None
+        self._pin('playing', self._queued_path)
+        self._pin('queued', None)
+        self._consume_upcoming(idx)
+        TRACK_ADVANCES.labels('gapless').inc()
+        self._next_idx = None
+        self.current_idx = idx
+        if self.shuffle:
+            self.shuffler.jump(self.tracks[idx]['id'])
+        self.start_time_offset = 0
+        self._set_anchor(max(0, pygame.mixer.music.get_pos()) / 1000.0)
+        self.set_volume(self.volume)  # new track, new normalization gain
+        self._release_seek_file()
+        self._prepare_next()
+        self._notify('track_change')
+
+    def next_track(self):
+        with self.lock:
+            if not self.tracks:
+                return False
+                
+            idx = self._upcoming_idx()
+            self._consume_upcoming(idx)
+            return self._play_track(idx)
+
+    def toggle_shuffle(self):
+        self.shuffle = not self.shuffle
+        if self.shuffle:
+            # Fresh permutation, anchored at whatever is playing now
+            current = self.tracks[self.current_idx]['id'] if 0 <= self.current_idx < len(self.tracks) else None
+            self.shuffler.reset(self.table.ids.tolist(), current)
+        self._reset_upcoming()
+        return self.shuffle
+
+    def toggle_repeat(self):
+        self.repeat = not self.repeat
+        with self._queue_lock:
+            self._queue_gen += 1  # a prefetch still in flight is for the old target
+        if self.is_playing:
+            self._prepare_next()
+        return self.repeat
 
     def prev_track(self):
+        with self.lock:
+            if not self.tracks:
+                return False
+                
+            if self.shuffle:
+                # Walk back through the shuffle history; at its start, restart the current track
+                key = self.shuffler.prev()
+                prev_idx = self.index_of(key) if key is not None else self.current_idx
+            else:
+                prev_idx = (self.current_idx - 1) % len(self.tracks)
+            return self._play_track(prev_idx)
+
+    def up_next(self, n=20):
+        """Indices of the tracks that auto-advance will play next, in order."""
         if not self.tracks:
-            return False
-            
-        prev_idx = (self.current_idx - 1) % len(self.tracks)
-        return self.play_track(prev_idx)
+            return []
+        if self.repeat and 0 <= self.current_idx < len(self.tracks):
+            return [self.current_idx]
+        # get_state() reads without the lock, so skip ids the index hasn't caught up with
+        index_of = self.table.index_of
+        out = [idx for idx in (index_of(tid) for _, tid in self.play_queue.items(n)) if idx is not None]
+        n -= len(out)
+        if n <= 0:
+            return out
+        if self.shuffle and len(self.tracks) > 1:
+            return out + [idx for idx in map(index_of, self.shuffler.upcoming(n)) if idx is not None]
+        return out + [(self.current_idx + i) % len(self.tracks) for i in range(1, min(n, len(self.tracks) - 1) + 1)]
+
+    # --- play queue -----------------------------------------------------------
+
+    def enqueue(self, idx, play_next=False):
+        """Queue library track `idx` at the end (or front). Returns the entry id, or None."""
+        with self.lock:
+            if not (0 <= idx < len(self.tracks)):
+                return None
+            track_id = self.tracks[idx]['id']
+            qid = self.play_queue.play_next(track_id) if play_next else self.play_queue.append(track_id)
+            if play_next or len(self.play_queue) == 1:
+                self._reset_upcoming()
+            self._notify('queue')
+            return qid
+
+    def dequeue(self, qid):
+        with self.lock:
+            head = self.play_queue.peek()
+            if not self.play_queue.remove(qid):
+                return False
+            if head[0] == qid:
+                self._reset_upcoming()
+            self._notify('queue')
+            return True
+
+    def move_queued(self, qid, after=None):
+        """Move entry `qid` right after entry `after` (None = to the front)."""
+        with self.lock:
+            head = self.play_queue.peek()
+            if not self.play_queue.move(qid, after):
+                return False
+            if self.play_queue.peek() != head:
+                self._reset_upcoming()
+            self._notify('queue')
+            return True
+
+    def clear_queue(self):
+        with self.lock:
+            had_entries = len(self.play_queue) > 0
+            self.play_queue.clear()
+            if had_entries:
+                self._reset_upcoming()
+            self._notify('queue')
+
+    def queue_state(self):
+        index_of = self.table.index_of
+        return [{'qid': qid, 'track_id': track_id, 'idx': index_of(track_id)}
+                for qid, track_id in self.play_queue]
+
+    # --- album / artist browsing -------------------------------------------------
+
+    def albums_page(self, offset=0, limit=50, descending=False, start=None):
+        albums = self.library_index.albums
+        return {'total': len(albums), 'albums': [a.summary(self.index_of)
+                                                 for a in albums.page(offset, limit, descending, start)]}
+
+    def artists_page(self, offset=0, limit=50, descending=False, start=None):
+        artists = self.library_index.artists
+        return {'total': len(artists), 'artists': [a.summary(self.index_of)
+                                                   for a in artists.page(offset, limit, descending, start)]}
+
+    def album_detail(self, album_id):
+        """Album summary plus its tracks (library order), or None."""
+        album = self.library_index.albums.get(album_id)
+        if album is None:
+            return None
+        rows = sorted(idx for idx in map(self.index_of, album.track_ids) if idx is not None)
+        return dict(album.summary(self.index_of), tracks=self.table.records(rows, with_index=True))
+
+    def artist_detail(self, artist_id):
+        """Artist summary plus its albums by name, or None."""
+        artist = self.library_index.artists.get(artist_id)
+        if artist is None:
+            return None
+        albums = sorted(artist.albums, key=lambda a: a.sort_key)
+        return dict(artist.summary(self.index_of), albums=[a.summary(self.index_of) for a in albums])
+
+    def _mixer_volume(self, track=None):
+        """User volume with the track's loudness-normalization gain applied (0.0-1.0)."""
+        level = self.volume / 100.0
+        if self.normalize and track is not None and track.get('gain_db') is not None:
+            level *= 10 ** (track['gain_db'] / 20.0)
+        return max(0.0, min(1.0, level))
+
+    def _current_track(self):
+        if self.tracks and 0 <= self.current_idx < len(self.tracks):
+            return self.tracks[self.current_idx]
+        return None
 
     def set_volume(self, vol):
         self.volume = max(0, min(100, vol))
         try:
-            pygame.mixer.music.set_volume(self.volume / 100.0)
+            pygame.mixer.music.set_volume(self._mixer_volume(self._current_track()))
         except:
             pass
         return self.volume
 
+    def toggle_normalize(self):
+        self.normalize = not self.normalize
+        self.set_volume(self.volume)
+        return self.normalize
+
+    def on_track_analyzed(self, track):
+        # Analysis finished for the playing track: pick up its gain right away
+        if track is self._current_track():
+            self.set_volume(self.volume)
+
     def seek(self, seconds):
+        with self.lock:
+            return self._seek(seconds)
+
+    def _seek(self, seconds):
         if not self.tracks or self.current_idx < 0:
             return False
             
         try:
             track = self.tracks[self.current_idx]
-            # Restart with start=pos
-            pygame.mixer.music.load(track['path'])
-            pygame.mixer.music.set_volume(self.volume / 100.0)
-            pygame.mixer.music.play(start=seconds)
-            self.is_playing = True
+            seek_index = track.get('seek_index')
+            whole = int(seconds)
+            with self._queue_lock:
+                self._queue_gen += 1
+                self._queued_idx = None
+                if seek_index is not None and 0 <= whole < len(seek_index):
+                    # Indexed seek: stream from the first frame of this second, so the
+                    # decoder only has to skip the sub-second remainder
+                    f = open(track['path'], 'rb')
+                    f.seek(seek_index[whole])
+                    pygame.mixer.music.load(f, 'mp3')
+                    self._release_seek_file()
+                    self._seek_file = f
+                    pygame.mixer.music.set_volume(self._mixer_volume(track))
+                    remainder = seconds - whole
+                    pygame.mixer.music.play(start=remainder if remainder >= 0.05 else 0.0)
+                    self._pending_load = None
+                    self.loading = False
+                    self._pin('playing', track['path'])
+                    self._pin('queued', None)
+                    pending = None
+                else:
+                    # Restart with start=pos
+                    pending = self._load_and_play(track, seconds)
+            self.is_playing = pending is None
             self.start_time_offset = seconds
+            self._set_anchor(seconds)
+            self._last_pos_ms = 0
+            if pending is None:
+                # load() dropped the queued track; queue it again
+                self._prepare_next()
+            else:
+                self._wait_for_load(pending, track, seconds)
             return True
         except Exception as e:
             print(f"Seek Error: {e}")
             return False
 
-    def get_state(self):
-        current_track = None
-        if self.tracks and 0 <= self.current_idx < len(self.tracks):
-            current_track = self.tracks[self.current_idx]
-        
-        # Get Current Position
+    def _release_seek_file(self):
+        # Only call once pygame has switched away from the streamed file
+        if self._seek_file is not None:
+            try:
+                self._seek_file.close()
+            except Exception:
+                pass
+            self._seek_file = None
+
+    # --- playback monitor -----------------------------------------------------
+
+    def add_listener(self, callback):
+        """Register callback(event, player); called from the thread that made the change."""
+        self._listeners.append(callback)
+
+    def _notify(self, event):
+        self.state_version += 1
+        for callback in list(self._listeners):
+            try:
+                callback(event, self)
+            except Exception as e:
+                print(f"Listener error: {e}")
+
+    def start_monitor(self, interval=0.2, dispatch=None):
+        """Start the thread that detects track ends and advances exactly once.
+
+        pygame's set_endevent() needs the display/event subsystem, which a headless
+        server doesn't initialize, so this is a cheap timer-driven check instead.
+        `dispatch(fn)` -> Future, if given, runs each check on the command actor.
+        """
+        if self._monitor_thread is not None and self._monitor_thread.is_alive():
+            return
+        self._monitor_stop.clear()
+        self._monitor_thread = threading.Thread(target=self._monitor_loop, args=(interval, dispatch),
+                                                name="playback-monitor", daemon=True)
+        self._monitor_thread.start()
+
+    def stop_monitor(self):
+        self._monitor_stop.set()
+
+    def _monitor_loop(self, interval, dispatch):
+        pending = None
+        while not self._monitor_stop.wait(interval):
+            if dispatch is not None:
+                # one tick in flight at a time, so a busy actor doesn't build a backlog
+                if pending is None or pending.done():
+                    pending = dispatch(self._check_playback)
+                continue
+            try:
+                with self.lock:
+                    self._check_playback()
+            except Exception as e:
+                print(f"Playback monitor error: {e}")
+
+    def _check_playback(self):
+        if not pygame.mixer.get_init():
+            return  # audio subsystem not started (yet)
+        pos_ms = pygame.mixer.music.get_pos()
+        # pygame resets get_pos() when it starts a queued track, so a backwards jump
+        # while something is queued means the gapless handoff happened
+        if self._queued_idx is not None and 0 <= pos_ms < self._last_pos_ms:
+            self._on_queued_handoff()
+        if pos_ms >= 0:
+            self._last_pos_ms = pos_ms
+            # Re-anchor if the audio clock has drifted from the anchor clients extrapolate
+            if self.is_playing:
+                actual = self.start_time_offset + pos_ms / 1000.0
+                if abs(actual - self.anchor_position()) > self.drift_tolerance:
+                    self._set_anchor(actual)
+                    self._notify('clock')
+            return
+
+        # When track ends: pos_ms becomes -1 and get_busy() becomes false
+        # ONLY trigger if we WERE playing (self.is_playing is True)
+        if self.is_playing and not pygame.mixer.music.get_busy() and self.current_idx != -1:
+            current_track = self.tracks[self.current_idx] if 0 <= self.current_idx < len(self.tracks) else None
+            print(f"Track ended: {current_track['name'] if current_track else 'Unknown'}")
+            if self.repeat:
+                TRACK_ADVANCES.labels('repeat').inc()
+                self._play_track(self.current_idx)
+            elif self.next_track():
+                TRACK_ADVANCES.labels('ended').inc()
+            else:
+                TRACK_ADVANCES.labels('end_of_list').inc()
+                self.is_playing = False
+                self._set_anchor(0.0)
+                self._notify('play_state')
+
+    # --- playback clock -------------------------------------------------------
+
+    def _set_anchor(self, position):
+        self._anchor_time = time.monotonic()
+        self._anchor_pos = float(position)
+        self._anchor_rate = 1.0 if self.is_playing else 0.0
+
+    def anchor_position(self, now=None):
+        """Position extrapolated from the anchor (no pygame call)."""
+        now = time.monotonic() if now is None else now
+        return self._anchor_pos + self._anchor_rate * (now - self._anchor_time)
+
+    def playback_position(self):
+        """Position read from the audio clock; pos_ms is time since the last play() call."""
         pos_ms = pygame.mixer.music.get_pos()
-        # pos_ms returns time since last play() call in ms
         position_sec = self.start_time_offset
         if pos_ms >= 0:
             position_sec += pos_ms / 1000.0
+        return position_sec
 
-        # Auto-update playing state and handle track end
-        is_actually_playing = pygame.mixer.music.get_busy()
+    def get_state(self, include_tracks=True):
+        """Snapshot of the player. Side-effect free; track ends are handled by the monitor."""
+        current_track = None
+        if self.tracks and 0 <= self.current_idx < len(self.tracks):
+            current_track = self.tracks[self.current_idx]
         
-        # When track ends: pos_ms becomes -1 and get_busy() becomes false
-        # ONLY trigger if we WERE playing (self.is_playing is True)
-        if self.is_playing and not is_actually_playing and pos_ms == -1:
-            if self.current_idx != -1:
-                print(f"Track ended: {current_track['name'] if current_track else 'Unknown'}")
-                if self.repeat:
-                    self.play_track(self.current_idx)
-                else:
-                    self.next_track()
-            
-            # Update state for immediate return
-            pos_ms = pygame.mixer.music.get_pos()
-            position_sec = self.start_time_offset
-            if pos_ms >= 0:
-                position_sec += pos_ms / 1000.0
-            if self.tracks and 0 <= self.current_idx < len(self.tracks):
-                current_track = self.tracks[self.current_idx]
-
-        return {
-            'tracks': self._cached_safe_tracks,
+        now = time.monotonic()
+        position_sec = self.anchor_position(now)
+
+        state = {
             'current_idx': self.current_idx,
             'current_track': current_track['name'] if current_track else None,
             'is_playing': self.is_playing,
+            'loading': self.loading,
             'volume': self.volume,
+            'normalize': self.normalize,
             'shuffle': self.shuffle,
             'repeat': self.repeat,
+            'up_next': self.up_next(),
+            'queue_length': len(self.play_queue),
             'position': position_sec,
-            'duration': current_track.get('duration_sec', 0) if current_track else 0
+            'duration': current_track.get('duration_exact', current_track.get('duration_sec', 0)) if current_track else 0,
+            'version': self.state_version,
+            # position = anchor.position + anchor.rate * (server_now - anchor.server_time)
+            'anchor': {
+                'server_time': self._anchor_time,
+                'position': self._anchor_pos,
+                'rate': self._anchor_rate,
+                'is_playing': self.is_playing
+            },
+            'server_time': now
         }
+        if include_tracks:
+            state['tracks'] = self.tracks_json()
+        return state
 
 # Gesture Recognizer
 class GestureRecognizer:
@@ -406,13 +1116,133 @@ class GestureRecognizer:
         return None
 
 # Initialize global objects
-player = MusicPlayer()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+transcoder = TranscodeCache(os.path.join(BASE_DIR, "transcode_cache"),
+                            max_bytes=int(os.environ.get("PALMPLAY_TRANSCODE_CACHE_MB", "2048")) * 1024 * 1024)
+waveforms = WaveformTask(os.path.join(BASE_DIR, "waveform_cache"))
+analyzer = AnalysisWorker([LoudnessTask(target_lufs=float(os.environ.get("PALMPLAY_TARGET_LUFS", "-14"))), waveforms])
+player = MusicPlayer(transcoder=transcoder, analyzer=analyzer)
+# Every player mutation runs on this one thread; routes await its futures
+player_commands = CommandActor(lock=player.lock)
+player.dispatch = player_commands.submit
+analyzer.on_done = lambda track: player_commands.submit(player.on_track_analyzed, track)
 gesture_recognizer = GestureRecognizer()
+# Gesture volume is coalesced/rate-limited; the slider endpoint still sets volume directly
+volume_stage = VolumeStage(lambda vol: player_commands.submit(player.set_volume, vol, key='volume'))
+
+
+async def run_command(fn, *args, key=None):
+    """Run a player command on the actor without blocking the event loop."""
+    return await asyncio.wrap_future(player_commands.submit(fn, *args, key=key))
+
+def with_state(fn, *args):
+    # Mutation plus a state snapshot of the same player/room, taken in the same actor step
+    return fn(*args), fn.__self__.get_state()
+
+def with_queue(fn, *args):
+    return fn(*args), fn.__self__.queue_state()
+
+# Extra sessions over the shared library; their audio plays in the browser (see rooms.py)
+MAIN_ROOM = "main"
+rooms = RoomManager(player, recognizer_factory=GestureRecognizer,
+                    max_rooms=int(os.environ.get("PALMPLAY_MAX_ROOMS", "64")))
+
+def session(room=None):
+    """The main player (server audio), or room `room`."""
+    if not room or room == MAIN_ROOM:
+        return player
+    target = rooms.get(room)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Unknown room")
+    return target
+
+# Blocking library work runs as background jobs, capped per kind
+jobs = JobManager({
+    'scan': int(os.environ.get("PALMPLAY_SCAN_JOBS", "2")),
+    'cover': int(os.environ.get("PALMPLAY_COVER_JOBS", "4")),
+})
+
+def scan_job(job, paths, replace=False, folder=None):
+    """Scan `paths` with progress/cancellation, then commit them on the actor."""
+    if folder is not None:
+        job.progress(0, message=f"Listing {folder}")
+        paths = MusicPlayer.list_folder(folder)
+    else:
+        paths = MusicPlayer.audio_files(paths)
+    tracks = player.scan_files(paths, progress=job.progress)
+    job.check()
+    count = player_commands.call(player.add_scanned, tracks, replace, folder)
+    save_library_snapshot()
+    return count
+
+Gauge('palmplay_job_queue_depth', 'Background jobs waiting for a worker', ('kind',), fn=jobs.backlog)
+Gauge('palmplay_command_queue_depth', 'Player commands waiting for the actor', fn=player_commands.pending)
+Gauge('palmplay_rooms', 'Open rooms besides the main player', fn=lambda: len(rooms))
+# anyio's limiter runs sync routes (detect-gesture) and file I/O; only readable on the event loop,
+# which is where /metrics renders
+Gauge('palmplay_threadpool_busy', 'Worker threads in use by sync routes',
+      fn=lambda: anyio.to_thread.current_default_thread_limiter().borrowed_tokens)
+Gauge('palmplay_threadpool_waiting', 'Sync route calls waiting for a worker thread',
+      fn=lambda: anyio.to_thread.current_default_thread_limiter().statistics().tasks_waiting)
+
+
+class CoverCache:
+    """In-memory LRU of cover art, bounded by bytes. Only touched from the event loop.
+
+    "No cover" is cached too, so scrolling past tracks without art doesn't reopen them.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()  # (path, mtime_ns) -> (data, mime) or None
+
+    @staticmethod
+    def key(track):
+        return track['path'], track.get('mtime_ns')
 
-# Hand detector setup
+    def get(self, key):
+        if key not in self._items:
+            COVER_CACHE.labels('miss').inc()
+            return False, None
+        COVER_CACHE.labels('hit').inc()
+        self._items.move_to_end(key)
+        return True, self._items[key]
+
+    def put(self, key, cover):
+        if key in self._items:
+            return
+        cost = len(cover[0]) if cover else 0
+        if cost > self.max_bytes:
+            return
+        self._items[key] = cover
+        self.size += cost
+        while self.size > self.max_bytes:
+            _, old = self._items.popitem(last=False)
+            self.size -= len(old[0]) if old else 0
+
+cover_cache = CoverCache(int(os.environ.get("PALMPLAY_COVER_CACHE_MB", "32")) * 1024 * 1024)
+Gauge('palmplay_cover_cache_bytes', 'Cover art held in memory', fn=lambda: cover_cache.size)
+
+def read_cover(path):
+    """(data, mime) of the embedded cover art, or None."""
+    from mutagen import File
+    audio = File(path)
+    if audio and audio.tags:
+        for tag_name in audio.tags:
+            if 'APIC' in tag_name:
+                tag = audio.tags[tag_name]
+                return tag.data, tag.mime
+            elif tag_name == 'covr':
+                return audio.tags[tag_name][0], 'image/jpeg'
+    return None
+
+# Hand detector setup (runs in the background at startup; see start_subsystems)
 hand_detector = None
 def init_hand_detector():
     global hand_detector
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
     model_path = os.path.abspath("hand_landmarker.task")
     if os.path.exists(model_path):
         base_options = python.BaseOptions(model_asset_path=model_path)
@@ -423,10 +1253,231 @@ def init_hand_detector():
             min_tracking_confidence=0.5)
         hand_detector = vision.HandLandmarker.create_from_options(options)
 
-try:
-    init_hand_detector()
-except Exception as e:
-    print(f"Hand detector init failed: {e}")
+
+### --- Startup --------------------------------------------------------------------
+# The port is bound before anything slow happens: the startup hook only kicks off the
+# work below, and each subsystem reports in `readiness` when it's up.
+
+LIBRARY_CACHE = os.path.join(BASE_DIR, "library_cache.json")
+STARTUP_FOLDERS = ["local_music", "uploaded_music"]
+
+readiness = {name: {"ready": False, "error": None, "seconds": None}
+             for name in ("library", "audio", "gestures", "rescan")}
+CORE_SUBSYSTEMS = ("library", "audio")
+
+def mark_ready(name, error=None):
+    readiness[name].update(ready=error is None, error=error,
+                           seconds=round(time.monotonic() - STARTED_AT, 3))
+    if error:
+        print(f"{name} failed to start: {error}")
+    else:
+        print(f"{name} ready after {readiness[name]['seconds']}s")
+
+def save_library_snapshot():
+    try:
+        save_library(LIBRARY_CACHE, player_commands.call(lambda: [dict(t) for t in player.tracks]))
+    except Exception as e:
+        print(f"Library cache save error: {e}")
+
+def start_audio():
+    try:
+        player.init_audio()
+        mark_ready("audio")
+    except Exception as e:
+        mark_ready("audio", str(e))
+
+def load_gesture_model():
+    try:
+        init_hand_detector()
+        mark_ready("gestures", None if hand_detector is not None else "hand_landmarker.task not found")
+    except Exception as e:
+        mark_ready("gestures", str(e))
+
+def startup_library_job(job):
+    """Serve the cached library at once, then rescan what changed in the background."""
+    cached = load_library(LIBRARY_CACHE)
+    player_commands.call(player.add_scanned, cached, True)
+    mark_ready("library")
+
+    known = {t['path'] for t in cached}
+    stale = [t['path'] for t in cached if not is_fresh(t)]
+    paths = [p for p in stale if os.path.isfile(p)]
+    for folder in STARTUP_FOLDERS:
+        folder_path = os.path.join(os.getcwd(), folder)
+        if os.path.isdir(folder_path):
+            paths += [p for p in MusicPlayer.list_folder(folder_path) if p not in known]
+    job.progress(0, len(paths), "Rescanning library")
+    tracks = player.scan_files(paths, progress=job.progress)
+    player_commands.call(player.apply_rescan, stale, tracks)
+    save_library_snapshot()
+    mark_ready("rescan")
+    return len(tracks)
+
+
+def current_state(room=None, include_tracks=True):
+    """State of the main player or a room: live on the owner, from the store elsewhere."""
+    if is_owner():
+        return session(room).get_state(include_tracks=include_tracks)
+    _, value = store.get("state:" + (room or MAIN_ROOM))
+    if value is None:
+        raise HTTPException(status_code=404, detail="Unknown room")
+    state = json.loads(value)
+    now = time.monotonic()  # system-wide, so the owner's anchor times are valid here
+    anchor = state["anchor"]
+    state["position"] = anchor["position"] + anchor["rate"] * (now - anchor["server_time"])
+    state["server_time"] = now
+    if include_tracks:
+        state["tracks"] = player.tracks_json()  # WorkerRouter synced the library before this route
+    return state
+
+shared_library_version = None
+shared_library_lock = threading.Lock()
+
+def sync_shared_library():
+    """Non-owner: mirror the published library into this process's idle player.
+    Parses and builds the table, so it runs in the threadpool (see WorkerRouter)."""
+    global shared_library_version
+    if is_owner():
+        return
+    with shared_library_lock:  # concurrent requests wait for one rebuild instead of each doing it
+        version, value = store.get("library", newer_than=shared_library_version)
+        if value is None:
+            return
+        data = json.loads(value)
+        # Paths/mtimes come along so /api/cover and /api/stream work here too
+        tracks = [Track(t, path=path, mtime_ns=mtime_ns) for t, (path, mtime_ns) in zip(data["tracks"], data["files"])]
+        player.tracks, player.table = tracks, TrackTable(tracks)
+        shared_library_version = version
+
+def publish_snapshots(published):
+    """Owner: write state/library snapshots that changed since the last call to the store."""
+    if player.library_version != published.get("library"):
+        store.put("library", dumps({"tracks": player.tracks_json(),
+                                    "files": [[t["path"], t.get("mtime_ns")] for t in player.tracks]}), time.time_ns())
+        published["library"] = player.library_version
+    sessions = {MAIN_ROOM: player}
+    sessions.update(rooms.items())
+    for name, target in sessions.items():
+        state = target.get_state(include_tracks=False)
+        del state["position"], state["server_time"]  # readers extrapolate these from the anchor
+        data = dumps(state)
+        if published.get(name) != data:
+            store.put("state:" + name, data, time.time_ns())
+            published[name] = data
+    for key in store.keys("state:"):
+        if key[len("state:"):] not in sessions:
+            store.delete(key)
+            published.pop(key[len("state:"):], None)
+
+def publish_loop(interval=0.05):
+    published = {}
+    while True:
+        try:
+            publish_snapshots(published)
+        except Exception as e:
+            print(f"Publish error: {e}")
+        time.sleep(interval)
+
+def serve_owner_port():
+    """Owner: serve this app on a private localhost port for the other workers."""
+    import socket
+    import uvicorn
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    internal = uvicorn.Server(uvicorn.Config(app, lifespan="off", log_level="warning"))
+    threading.Thread(target=internal.run, kwargs={"sockets": [sock]}, name="owner-port", daemon=True).start()
+    store.put_json("owner", {"port": sock.getsockname()[1], "pid": os.getpid()}, time.time_ns())
+
+def become_owner():
+    """Start everything that needs the single audio output."""
+    player_commands.start()
+    # Runs first on the actor, so every later command sees an initialized mixer
+    player_commands.submit(start_audio)
+    jobs.submit('scan', startup_library_job)
+    player.start_monitor(dispatch=lambda fn: player_commands.submit(fn, key='monitor'))
+    rooms.start_ticker(dispatch=lambda fn: player_commands.submit(fn, key='rooms'))
+    analyzer.start()
+    if store is not None:
+        threading.Thread(target=publish_loop, name="publisher", daemon=True).start()
+        serve_owner_port()
+        print(f"Worker {os.getpid()} owns playback")
+
+def follow_owner(interval=0.1, takeover_every=2.0):
+    """Non-owner: push published state changes to our sockets; take over if the owner dies."""
+    version = None
+    last_try = time.monotonic()
+    while True:
+        time.sleep(interval)
+        if time.monotonic() - last_try >= takeover_every:
+            last_try = time.monotonic()
+            if owner_lock.try_acquire():
+                print(f"Worker {os.getpid()} taking over playback")
+                become_owner()
+                return
+        try:
+            new_version, value = store.get("state:" + MAIN_ROOM, newer_than=version)
+        except Exception as e:
+            print(f"Shared state read error: {e}")
+            continue
+        if value is not None:
+            version = new_version
+            if event_loop is not None and state_sockets:
+                asyncio.run_coroutine_threadsafe(broadcast_state("sync"), event_loop)
+
+
+# Live state push: the playback monitor notifies, we fan out to connected sockets
+state_sockets = set()
+event_loop = None
+
+async def broadcast_state(event):
+    if not state_sockets:
+        return
+    message = {"event": event, "state": current_state(include_tracks=False)}
+    for ws in list(state_sockets):
+        try:
+            await ws.send_json(message)
+        except Exception:
+            state_sockets.discard(ws)
+
+def on_player_event(event, _player):
+    # Called from whichever thread changed the player; hop onto the event loop
+    if event_loop is not None and state_sockets:
+        asyncio.run_coroutine_threadsafe(broadcast_state(event), event_loop)
+
+player.add_listener(on_player_event)
+
+@app.on_event("startup")
+async def start_subsystems():
+    global event_loop
+    event_loop = asyncio.get_running_loop()
+    # Every worker runs gesture inference; only the owner touches audio
+    threading.Thread(target=load_gesture_model, name="gesture-model", daemon=True).start()
+    if store is None or owner_lock.try_acquire():
+        become_owner()
+    else:
+        threading.Thread(target=follow_owner, name="follow-owner", daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_subsystems():
+    player.stop_monitor()
+    rooms.stop_ticker()
+    if readiness["library"]["ready"]:
+        save_library_snapshot()  # keeps analysis results (gain, waveform keys) for next time
+    player_commands.stop()
+    jobs.shutdown()
+
+@app.websocket("/ws/state")
+async def state_socket(websocket: WebSocket):
+    await websocket.accept()
+    state_sockets.add(websocket)
+    try:
+        await websocket.send_json({"event": "hello", "state": current_state(include_tracks=False)})
+        while True:
+            await websocket.receive_text()  # keepalive / ignored
+    except WebSocketDisconnect:
+        pass
+    finally:
+        state_sockets.discard(websocket)
 
 
 # API Routes
@@ -439,15 +1490,76 @@ async def root():
     return FileResponse("static/index.html")
 
 @app.get("/api/state")
-async def get_state():
-    return player.get_state()
+async def get_state(request: Request, room: str = None):
+    return respond(request, current_state(room))
+
+@app.get("/api/tracks")
+def list_tracks(request: Request, sort: str = "index", order: str = "asc", q: str = "",
+                offset: int = 0, limit: int = 200):
+    # One page of the library, sorted/filtered over the track table's columns (sync: runs in the threadpool)
+    if sort not in TrackTable.SORT_KEYS or order not in ("asc", "desc"):
+        return JSONResponse({"error": f"sort is one of {', '.join(TrackTable.SORT_KEYS)}; order is asc or desc"},
+                            status_code=400)
+    table = player.table
+    rows = table.order(sort, descending=order == "desc")
+    if q:
+        rows = table.search(q, rows)
+    offset, limit = max(0, offset), max(1, min(limit, 1000))
+    return respond(request, {"total": len(rows), "offset": offset, "limit": limit,
+                             "tracks": table.records(rows[offset:offset + limit], with_index=True)})
+
+@app.get("/api/albums")
+async def list_albums(request: Request, offset: int = 0, limit: int = 50, order: str = "asc", start: str = None):
+    # Pages come straight off the sorted album index; ?start=M jumps to the first album from "M"
+    limit = max(1, min(limit, 500))
+    page = await run_command(player.albums_page, offset, limit, order == "desc", start)
+    return respond(request, dict(page, offset=offset, limit=limit))
+
+@app.get("/api/albums/{album_id}")
+async def get_album(request: Request, album_id: int):
+    album = await run_command(player.album_detail, album_id)
+    if album is None:
+        return JSONResponse({"error": "Unknown album"}, status_code=404)
+    return respond(request, album)
+
+@app.get("/api/artists")
+async def list_artists(request: Request, offset: int = 0, limit: int = 50, order: str = "asc", start: str = None):
+    limit = max(1, min(limit, 500))
+    page = await run_command(player.artists_page, offset, limit, order == "desc", start)
+    return respond(request, dict(page, offset=offset, limit=limit))
+
+@app.get("/api/artists/{artist_id}")
+async def get_artist(request: Request, artist_id: int):
+    artist = await run_command(player.artist_detail, artist_id)
+    if artist is None:
+        return JSONResponse({"error": "Unknown artist"}, status_code=404)
+    return respond(request, artist)
+
+@app.get("/api/ready")
+async def get_readiness():
+    # 200 once playback and the library are usable; gestures/rescan may still be loading
+    ready = all(readiness[name]["ready"] for name in CORE_SUBSYSTEMS)
+    return JSONResponse({"ready": ready, "subsystems": readiness}, status_code=200 if ready else 503)
+
+@app.get("/api/ready/{name}")
+async def get_subsystem_readiness(name: str):
+    if name not in readiness:
+        return JSONResponse({"error": "Unknown subsystem"}, status_code=404)
+    return JSONResponse(readiness[name], status_code=200 if readiness[name]["ready"] else 503)
+
+@app.get("/api/clock")
+async def get_clock():
+    # Clock-sync handshake: client records send/receive times around this call and
+    # estimates offset = server_time - (t_send + t_recv) / 2 using the lowest-RTT sample
+    return {"server_time": time.monotonic()}
 
 @app.post("/api/load-folder")
 async def load_folder(data: dict):
     folder = data.get('folder', '')
     if os.path.isdir(folder):
-        count = player.load_folder(folder)
-        return {"success": True, "count": count}
+        # Returns at once; poll /api/jobs/{job_id} for progress and the final count
+        job = jobs.submit('scan', scan_job, None, True, folder)
+        return {"success": True, "job_id": job.id, "job": job.to_dict()}
     return {"success": False, "error": "Invalid folder"}
 
 @app.post("/api/add-files")
@@ -456,8 +1568,8 @@ async def add_files(data: dict):
     if not file_paths:
         return {"success": False, "error": "No files provided"}
     
-    count = player.add_files(file_paths)
-    return {"success": True, "count": count, "state": player.get_state()}
+    job = jobs.submit('scan', scan_job, file_paths)
+    return {"success": True, "job_id": job.id, "job": job.to_dict()}
 
 @app.post("/api/upload-files")
 async def upload_files(files: list[UploadFile] = File(...)):
@@ -468,9 +1580,8 @@ async def upload_files(files: list[UploadFile] = File(...)):
     os.makedirs(upload_dir, exist_ok=True)
     
     uploaded_paths = []
-    valid_extensions = ('.mp3', '.wav', '.ogg', '.m4a', '.flac')
     for file in files:
-        if file.filename.lower().endswith(valid_extensions):
+        if file.filename.lower().endswith(AUDIO_EXTENSIONS):
             try:
                 safe_filename = os.path.basename(file.filename)
                 file_path = os.path.join(upload_dir, safe_filename)
@@ -482,55 +1593,141 @@ async def upload_files(files: list[UploadFile] = File(...)):
                 print(f"Error saving file {file.filename}: {e}")
     
     if uploaded_paths:
-        count = player.add_files(uploaded_paths)
-        return {"success": True, "count": count, "state": player.get_state()}
+        job = jobs.submit('scan', scan_job, uploaded_paths)
+        return {"success": True, "job_id": job.id, "job": job.to_dict()}
     
     return {"success": False, "error": "No valid audio files uploaded"}
 
+@app.get("/api/jobs")
+async def list_jobs(request: Request, kind: str = None):
+    return respond(request, {"jobs": [job.to_dict() for job in jobs.list(kind)]})
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    # Takes effect at the next file; scanned tracks are only committed when a scan completes
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return {"success": jobs.cancel(job_id), "job": job.to_dict()}
+
 @app.post("/api/play/{idx}")
-async def play_track(idx: int):
-    success = player.play_track(idx)
-    return {"success": success, "state": player.get_state()}
+async def play_track(idx: int, request: Request, room: str = None):
+    success, state = await run_command(with_state, session(room).play_track, idx)
+    if success:
+        TRACK_ADVANCES.labels('select').inc()
+    return respond(request, {"success": success, "state": state})
 
 @app.post("/api/toggle")
-async def toggle_play():
-    is_playing = player.toggle_play()
+async def toggle_play(room: str = None):
+    is_playing = await run_command(session(room).toggle_play)
     return {"is_playing": is_playing}
 
 @app.post("/api/next")
-async def next_track():
-    success = player.next_track()
-    return {"success": success, "state": player.get_state()}
+async def next_track(request: Request, room: str = None):
+    success, state = await run_command(with_state, session(room).next_track)
+    if success:
+        TRACK_ADVANCES.labels('skip').inc()
+    return respond(request, {"success": success, "state": state})
 
 @app.delete("/api/track/{idx}")
-async def delete_track(idx: int):
-    success = player.remove_track(idx)
-    return {"success": success, "state": player.get_state()}
+async def delete_track(idx: int, request: Request):
+    success, state = await run_command(with_state, player.remove_track, idx)
+    return respond(request, {"success": success, "state": state})
 
 @app.post("/api/prev")
-async def prev_track():
-    success = player.prev_track()
-    return {"success": success, "state": player.get_state()}
+async def prev_track(request: Request, room: str = None):
+    success, state = await run_command(with_state, session(room).prev_track)
+    if success:
+        TRACK_ADVANCES.labels('previous').inc()
+    return respond(request, {"success": success, "state": state})
 
 @app.post("/api/volume/{vol}")
-async def set_volume(vol: int):
-    new_vol = player.set_volume(vol)
+async def set_volume(vol: int, room: str = None):
+    target = session(room)
+    if target is not player:
+        return {"volume": await run_command(target.set_volume, vol, key=f'volume:{target.id}')}
+    new_vol = await run_command(player.set_volume, vol, key='volume')
+    volume_stage.sync(new_vol)
     return {"volume": new_vol}
 
+@app.post("/api/normalize")
+async def toggle_normalize():
+    return {"normalize": await run_command(player.toggle_normalize)}
+
 @app.post("/api/seek/{seconds}")
-async def seek_track(seconds: float):
-    success = player.seek(seconds)
-    return {"success": success, "state": player.get_state()}
+async def seek_track(seconds: float, request: Request, room: str = None):
+    success, state = await run_command(with_state, session(room).seek, seconds)
+    return respond(request, {"success": success, "state": state})
+
+@app.get("/api/queue")
+async def get_queue(room: str = None):
+    return {"queue": await run_command(session(room).queue_state)}
+
+@app.post("/api/queue")
+async def enqueue_track(data: dict, room: str = None):
+    # {"idx": 3} appends; {"idx": 3, "next": true} plays it after the current track
+    qid, queue = await run_command(with_queue, session(room).enqueue, int(data.get('idx', -1)), bool(data.get('next', False)))
+    if qid is None:
+        return {"success": False, "error": "Invalid track"}
+    return {"success": True, "qid": qid, "queue": queue}
+
+@app.post("/api/queue/{qid}/move")
+async def move_queued(qid: int, data: dict, room: str = None):
+    # {"after": <qid>} places the entry right after another one; null/missing moves it to the front
+    success, queue = await run_command(with_queue, session(room).move_queued, qid, data.get('after'))
+    return {"success": success, "queue": queue}
+
+@app.delete("/api/queue/{qid}")
+async def dequeue_track(qid: int, room: str = None):
+    success, queue = await run_command(with_queue, session(room).dequeue, qid)
+    return {"success": success, "queue": queue}
+
+@app.delete("/api/queue")
+async def clear_queue(room: str = None):
+    await run_command(session(room).clear_queue)
+    return {"success": True, "queue": []}
 
 @app.post("/api/shuffle")
-async def toggle_shuffle():
-    player.shuffle = not player.shuffle
-    return {"shuffle": player.shuffle}
+async def toggle_shuffle(room: str = None):
+    return {"shuffle": await run_command(session(room).toggle_shuffle)}
 
 @app.post("/api/repeat")
-async def toggle_repeat():
-    player.repeat = not player.repeat
-    return {"repeat": player.repeat}
+async def toggle_repeat(room: str = None):
+    return {"repeat": await run_command(session(room).toggle_repeat)}
+
+@app.get("/api/rooms")
+async def list_rooms():
+    return {"rooms": rooms.list(), "max_rooms": rooms.max_rooms}
+
+@app.post("/api/rooms")
+async def create_room(data: dict = None):
+    # {"room": "kitchen"} picks the id; without it a random one is generated.
+    # Control routes take ?room=<id>; without it they drive the main player.
+    try:
+        room = rooms.create((data or {}).get('room'))
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=409)
+    return {"success": True, "room": room.id, "state": room.get_state(include_tracks=False)}
+
+@app.delete("/api/rooms/{room_id}")
+async def close_room(room_id: str):
+    return {"success": await run_command(rooms.close, room_id)}
+
+@app.post("/api/rooms/{room_id}/ended")
+async def room_track_ended(request: Request, room_id: str, data: dict):
+    # A client's <audio> finished {"track_id": ...}; the room advances once however many report it
+    target = session(room_id)
+    if target is player:
+        return JSONResponse({"error": "The main player tracks its own audio"}, status_code=400)
+    success, state = await run_command(with_state, target.ended, data.get('track_id'))
+    return respond(request, {"success": success, "state": state})
 
 @app.get("/api/cover/{idx}")
 async def get_cover(idx: int):
@@ -538,63 +1735,145 @@ async def get_cover(idx: int):
         return JSONResponse({"error": "Not found"}, status_code=404)
     
     try:
-        from mutagen import File
-        audio = File(player.tracks[idx]['path'])
-        if audio and audio.tags:
-            for tag_name in audio.tags:
-                if 'APIC' in tag_name:
-                    tag = audio.tags[tag_name]
-                    return Response(content=tag.data, media_type=tag.mime)
-                elif tag_name == 'covr':
-                    return Response(content=audio.tags[tag_name][0], media_type='image/jpeg')
+        track = player.tracks[idx]
+        key = CoverCache.key(track)
+        cached, cover = cover_cache.get(key)
+        if not cached:
+            cover = await asyncio.wrap_future(jobs.run('cover', read_cover, track['path']))
+            cover_cache.put(key, cover)
+        if cover:
+            return Response(content=cover[0], media_type=cover[1])
     except Exception as e:
         print(f"Cover error: {e}")
     
     return JSONResponse({"error": "No cover"}, status_code=404)
 
+@app.api_route("/api/stream/{idx}", methods=["GET", "HEAD"])
+async def stream_track(idx: int, request: Request):
+    # The original file, byte-for-byte: browsers decode it themselves and seek with Range requests
+    if idx < 0 or idx >= len(player.tracks):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    path = player.tracks[idx]['path']
+    try:
+        return RangeFileResponse(path, request)
+    except OSError:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+
+@app.get("/api/waveform/{idx}")
+def get_waveform(idx: int, request: Request, buckets: int = 1024, bits: int = 8):
+    # Raw interleaved (min, max) pairs, int8 by default; 404 until the analyzer gets to the track.
+    # Sync so the file read runs in the threadpool, not on the event loop
+    if idx < 0 or idx >= len(player.tracks) or buckets not in waveforms.resolutions or bits not in (8, 16):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    key = player.tracks[idx].get('waveform')
+    if key is None:
+        return JSONResponse({"error": "Not analyzed yet"}, status_code=404)
+
+    etag = f'"{key}-{buckets}-{bits}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400",
+               "X-Waveform-Buckets": str(buckets), "X-Waveform-Bits": str(bits)}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    try:
+        data = waveforms.read(key, buckets, bits)
+    except OSError:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return Response(content=data, media_type="application/octet-stream", headers=headers)
+
+def apply_landmarks(landmarks, room=None):
+    """Recognize a gesture from 21 hand landmarks and apply it to the main player or a room."""
+    target = session(room)
+    # Each room has its own recognizer, so smoothing buffers and cooldowns don't mix
+    recognizer = gesture_recognizer if target is player else target.recognizer
+    with GESTURE_STAGE.labels('recognize').time():
+        gesture = recognizer.recognize(landmarks)
+    if gesture:
+        GESTURES.labels(gesture[0] if isinstance(gesture, tuple) else gesture).inc()
+        if gesture == 'toggle':
+            player_commands.submit(target.toggle_play)
+            return {"gesture": "toggle", "action": "play/pause"}
+        elif gesture == 'shuffle':
+            return {"gesture": "shuffle", "value": player_commands.call(target.toggle_shuffle)}
+        elif gesture == 'repeat':
+            return {"gesture": "repeat", "value": player_commands.call(target.toggle_repeat)}
+        elif isinstance(gesture, tuple) and gesture[0] == 'volume':
+            if target is player:
+                volume_stage.submit(gesture[1])
+            else:
+                player_commands.submit(target.set_volume, gesture[1], key=f'volume:{target.id}')
+            return {"gesture": "volume", "value": gesture[1]}
+    return {"gesture": None}
+
+owner_client = None
+
+def forward_landmarks(landmarks, room=None):
+    # Non-owner worker: inference happened here, recognition runs next to the player
+    global owner_client
+    import httpx
+    base = owner_url()
+    if base is None:
+        return {"gesture": None, "error": "Playback owner not available"}
+    if owner_client is None:
+        owner_client = httpx.Client(timeout=5.0)
+    response = owner_client.post(base + "/api/gesture/landmarks", json={"landmarks": landmarks},
+                                 params={"room": room} if room else None)
+    return response.json()
+
+@app.post("/api/gesture/landmarks")
+def post_landmarks(data: dict, room: str = None):
+    # {"landmarks": [[x, y, z] * 21]} from a detector running elsewhere (another worker, or a browser)
+    landmarks = [tuple(point) for point in data.get('landmarks') or []]
+    if len(landmarks) != 21:
+        return JSONResponse({"gesture": None, "error": "Expected 21 landmarks"}, status_code=400)
+    return apply_landmarks(landmarks, room)
+
 @app.post("/api/detect-gesture")
-def detect_gesture(file: UploadFile = File(...)):
+def detect_gesture(file: UploadFile = File(...), room: str = None):
+    GESTURE_FRAMES.inc()
     if hand_detector is None:
-        return {"gesture": None, "error": "Hand detector not initialized"}
+        GESTURE_DROPPED.labels('not_ready').inc()
+        return {"gesture": None, "error": readiness["gestures"]["error"] or "Hand detector loading"}
     
+    import cv2
+    import mediapipe as mp
     try:
-        # Use synchronous read since we're in a thread pool now
-        contents = file.file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if frame is None: return {"gesture": None}
-        
-        # Performance optimization: Resize frame if too large
-        h, w = frame.shape[:2]
-        if w > 640:
-            scale = 640 / w
-            frame = cv2.resize(frame, (0,0), fx=scale, fy=scale)
+        with GESTURE_STAGE.labels('decode').time():
+            # Use synchronous read since we're in a thread pool now
+            contents = file.file.read()
+            nparr = np.frombuffer(contents, np.uint8)
+            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            if frame is not None:
+                # Performance optimization: Resize frame if too large
+                h, w = frame.shape[:2]
+                if w > 640:
+                    scale = 640 / w
+                    frame = cv2.resize(frame, (0,0), fx=scale, fy=scale)
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if frame is None:
+            GESTURE_DROPPED.labels('decode').inc()
+            return {"gesture": None}
             
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
-        result = hand_detector.detect(mp_image)
+        with GESTURE_STAGE.labels('inference').time():
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+            result = hand_detector.detect(mp_image)
         
         if result.hand_landmarks:
             landmarks = [(lm.x, lm.y, lm.z) for lm in result.hand_landmarks[0]]
-            gesture = gesture_recognizer.recognize(landmarks)
-            if gesture:
-                if gesture == 'toggle':
-                    player.toggle_play()
-                    return {"gesture": "toggle", "action": "play/pause"}
-                elif gesture == 'shuffle':
-                    player.shuffle = not player.shuffle
-                    return {"gesture": "shuffle", "value": player.shuffle}
-                elif gesture == 'repeat':
-                    player.repeat = not player.repeat
-                    return {"gesture": "repeat", "value": player.repeat}
-                elif isinstance(gesture, tuple) and gesture[0] == 'volume':
-                    player.set_volume(gesture[1])
-                    return {"gesture": "volume", "value": gesture[1]}
+            if is_owner():
+                return apply_landmarks(landmarks, room)
+            return forward_landmarks(landmarks, room)
         return {"gesture": None}
+    except HTTPException:
+        raise
     except Exception as e:
+        GESTURE_DROPPED.labels('error').inc()
         print(f"Gesture error: {e}")
         return {"gesture": None, "error": str(e)}
 
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 # Serve the React production build
 dist_path = os.path.join("frontend", "dist")
 if os.path.exists(dist_path):
@@ -605,13 +1884,17 @@ else:
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    # Load both local and uploaded music on startup
-    cwd = os.getcwd()
-    for folder in ["local_music", "uploaded_music"]:
-        folder_path = os.path.join(cwd, folder)
-        if os.path.exists(folder_path):
-            print(f"Initializing music from: {folder_path}")
-            player.load_folder(folder_path, append=True)
-    
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    parser = argparse.ArgumentParser(description="PalmPlay server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes; with more than one, state is shared through SQLite")
+    args = parser.parse_args()
+    # local_music/ and uploaded_music/ are (re)scanned in the background after startup
+    if args.workers > 1:
+        # Workers import this module fresh; the variable switches them to shared state
+        os.environ.setdefault("PALMPLAY_SHARED_STATE", os.path.join(BASE_DIR, "palmplay_state.db"))
+        uvicorn.run("server:app", host="0.0.0.0", port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=args.port)
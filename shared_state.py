@@ -0,0 +1,182 @@
+"""
+Cross-process pieces for running the server as several worker processes
+(`uvicorn server:app --workers N`, or `python server.py --workers N`).
+
+pygame has one mixer per process, so exactly one worker owns playback: it wins an
+OwnerLock (an OS file lock, released automatically if the process dies) and keeps the
+player, command actor, jobs and rooms. It publishes snapshots (player/room state,
+library) to a StateStore, a SQLite database in WAL mode: one writer, and readers that
+never block it. Every other worker:
+
+- answers state reads, covers and streams from the published snapshots
+- runs gesture inference itself (the CPU-heavy part) and hands the landmarks to the owner
+- forwards all other requests to the owner's private localhost port: WorkerRouter, a
+  middleware, decides per request and hands forwarded ones to an OwnerProxy
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class StateStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS kv ('
+                         'key TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL)')
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections must stay on their thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def put(self, key, value, version):
+        """Store bytes under `key`; readers see `version` change."""
+        self._conn().execute('INSERT OR REPLACE INTO kv (key, version, value) VALUES (?, ?, ?)',
+                             (key, version, value))
+
+    def put_json(self, key, obj, version):
+        self.put(key, json.dumps(obj, separators=(',', ':')).encode('utf-8'), version)
+
+    def get(self, key, newer_than=None):
+        """(version, value) for `key`; value is None if missing or not newer than `newer_than`."""
+        conn = self._conn()
+        if newer_than is not None:
+            row = conn.execute('SELECT version FROM kv WHERE key = ?', (key,)).fetchone()
+            if row is None or row[0] == newer_than:
+                return (row[0] if row else None), None
+        row = conn.execute('SELECT version, value FROM kv WHERE key = ?', (key,)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+    def keys(self, prefix):
+        rows = self._conn().execute('SELECT key FROM kv WHERE key >= ? AND key < ?', (prefix, prefix + '\uffff'))
+        return [row[0] for row in rows]
+
+
+class OwnerLock:
+    """Non-blocking exclusive lock on a file, held for the life of the process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+
+# Hop-by-hop headers are per connection and must not be forwarded
+_HOP_HEADERS = {b'connection', b'keep-alive', b'transfer-encoding', b'te', b'trailer', b'upgrade',
+                b'proxy-authorization', b'proxy-authenticate', b'host'}
+
+
+class OwnerProxy:
+    """ASGI app that forwards an HTTP request to the owner worker and streams the reply."""
+
+    def __init__(self, owner_url):
+        # owner_url() -> 'http://127.0.0.1:<port>' or None while no owner is up
+        self.owner_url = owner_url
+        self._client = None
+
+    async def __call__(self, scope, receive, send):
+        import httpx
+        base = self.owner_url()
+        if base is None:
+            await self._error(send, 503, b'{"error":"Playback owner not available"}')
+            return
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=2.0))
+
+        async def body():
+            while True:
+                message = await receive()
+                chunk = message.get('body', b'')
+                if chunk:
+                    yield chunk
+                if not message.get('more_body'):
+                    return
+
+        url = base + scope['path']
+        if scope.get('query_string'):
+            url += '?' + scope['query_string'].decode('latin-1')
+        headers = [(k, v) for k, v in scope['headers'] if k not in _HOP_HEADERS]
+        request = self._client.build_request(scope['method'], url, headers=headers,
+                                             content=body() if scope['method'] not in ('GET', 'HEAD') else None)
+        try:
+            response = await self._client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            print(f"Proxy to owner failed: {e}")
+            await self._error(send, 502, b'{"error":"Playback owner unreachable"}')
+            return
+        try:
+            await send({'type': 'http.response.start', 'status': response.status_code,
+                        'headers': [(k, v) for k, v in response.headers.raw if k.lower() not in _HOP_HEADERS]})
+            async for chunk in response.aiter_raw():
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await response.aclose()
+
+    @staticmethod
+    async def _error(send, status, body):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+class WorkerRouter:
+    """Middleware: on a non-owner worker, forward requests under `prefix` to the owner
+    unless they start with one of `local_paths`; `await before_local(path)` runs before
+    a local one (e.g. to refresh a mirrored snapshot)."""
+
+    def __init__(self, app, is_owner, owner_url, local_paths, prefix='/api/', before_local=None):
+        self.app = app
+        self.is_owner = is_owner
+        self.proxy = OwnerProxy(owner_url)
+        self.local_paths = tuple(local_paths)
+        self.prefix = prefix
+        self.before_local = before_local
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self.is_owner():
+            await self.app(scope, receive, send)
+            return
+        path = scope['path']
+        if path.startswith(self.prefix) and not path.startswith(self.local_paths):
+            await self.proxy(scope, receive, send)
+            return
+        if self.before_local is not None:
+            await self.before_local(path)
+        await self.app(scope, receive, send)
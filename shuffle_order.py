@@ -0,0 +1,224 @@
+"""
+Shuffle engine shared by the desktop app and the server.
+
+ShuffleOrder keeps one Fisher–Yates permutation of track keys plus a cursor into it:
+
+- order[:pos] is the play history, order[pos] the current track, order[pos + 1:] is
+  "Up Next"; next()/prev() just move the cursor, so both are O(1) and every track plays
+  once before any repeats
+- when the permutation runs out a fresh one replaces it (O(n) once per n plays, so the
+  history covers the current cycle) and never starts with the track that just finished;
+  it is drawn from a seed picked per cycle, so peek()/upcoming() can show it before it
+  starts without changing anything (they only read, and are safe to call from other
+  threads while one thread plays)
+- add() drops the new key into a uniformly random upcoming slot by swapping with the
+  end, remove() swap-pops upcoming keys and tombstones history keys; both are O(1)
+  amortized, and tombstones are compacted once they make up half the list
+- jump() (a track picked by hand) moves the key to the cursor without reshuffling; at
+  the end of a cycle it starts the next one first, like next() does
+
+Keys can be anything hashable: the server uses stable track ids, the desktop app uses
+list indices.
+"""
+
+import random
+
+
+class ShuffleOrder:
+    def __init__(self, keys=(), current=None, rng=None):
+        self.rng = rng or random.Random()
+        self.reset(keys, current)
+
+    def reset(self, keys, current=None):
+        """Start a new permutation over `keys`, with `current` (if given) as the playing key."""
+        self._keys = set(keys)
+        self.order = list(self._keys)
+        self.rng.shuffle(self.order)
+        self.pos = -1
+        self._where = {}
+        self._dead = 0
+        self._new_cycle()
+        self._reindex()
+        if current is not None and current in self._keys:
+            self.jump(current)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def current(self):
+        if 0 <= self.pos < len(self.order):
+            return self.order[self.pos]
+        return None
+
+    def peek(self):
+        """Key that next() will return, without moving the cursor."""
+        p = self._next_pos()
+        if p is not None:
+            return self.order[p]
+        cycle = self._next_cycle()
+        return cycle[0] if cycle else None
+
+    def next(self):
+        p = self._next_pos()
+        if p is None:
+            if not self._keys:
+                return None
+            self._extend()
+            p = 0
+        self.pos = p
+        return self.order[p]
+
+    def prev(self):
+        """Step back through the history. Returns None at the start of it."""
+        p = self.pos - 1
+        while p >= 0 and self.order[p] is None:
+            p -= 1
+        if p < 0:
+            return None
+        self.pos = p
+        return self.order[p]
+
+    def upcoming(self, n):
+        """The next `n` keys in play order, up to the end of the current cycle."""
+        p = self._next_pos()
+        if p is None:
+            return self._next_cycle()[:n]
+        out = []
+        while p < len(self.order) and len(out) < n:
+            if self.order[p] is not None:
+                out.append(self.order[p])
+            p += 1
+        return out
+
+    def add(self, key):
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        self._version += 1
+        # uniform slot among the upcoming positions, including the very end
+        lo = self.pos + 1
+        j = self.rng.randint(lo, len(self.order))
+        self.order.append(key)
+        self._where[key] = len(self.order) - 1
+        if j < len(self.order) - 1:
+            self._swap(j, len(self.order) - 1)
+
+    def remove(self, key):
+        if key not in self._keys:
+            return
+        self._keys.discard(key)
+        self._version += 1
+        self._drop(key)
+
+    def jump(self, key):
+        """Make `key` the current track (played by hand), keeping the rest of the order."""
+        if key not in self._keys:
+            return
+        if self._where.get(key) == self.pos:
+            return
+        if self._next_pos() is None:
+            # The cycle is used up: roll over as next() would, so playing the key peek()
+            # showed (or any other) starts the new permutation instead of reshuffling
+            # the tail of the old one
+            self._extend()
+        self._version += 1
+        p = self._where.get(key)
+        if p is not None and p > self.pos:
+            self._swap(p, self.pos + 1)
+        else:
+            self._drop(key)
+            self._place_next(key)
+        self.pos += 1
+
+    # --- internals -----------------------------------------------------------
+
+    def _next_pos(self):
+        # Live position after the cursor, or None once the cycle is used up. Entries ahead
+        # of the cursor can be tombstones after stepping back with prev()
+        order = self.order
+        p = self.pos + 1
+        while p < len(order) and order[p] is None:
+            p += 1
+        return p if p < len(order) else None
+
+    def _swap(self, i, j):
+        a, b = self.order[i], self.order[j]
+        self.order[i], self.order[j] = b, a
+        if a is not None:
+            self._where[a] = j
+        if b is not None:
+            self._where[b] = i
+
+    def _drop(self, key):
+        # Swap-pop upcoming entries; tombstone history/current ones so the cursor stays put
+        p = self._where.pop(key, None)
+        if p is None:
+            return
+        if p > self.pos:
+            last = len(self.order) - 1
+            if p != last:
+                self._swap(p, last)
+                self._where.pop(key, None)
+            self.order.pop()
+        else:
+            self.order[p] = None
+            self._dead += 1
+            if self._dead * 2 > len(self.order):
+                self._compact()
+
+    def _place_next(self, key):
+        slot = self.pos + 1
+        if slot < len(self.order):
+            displaced = self.order[slot]
+            if displaced is None:
+                self._dead -= 1
+            else:
+                self.order.append(displaced)
+                self._where[displaced] = len(self.order) - 1
+            self.order[slot] = key
+        else:
+            self.order.append(key)
+        self._where[key] = slot
+
+    def _new_cycle(self):
+        self._seed = self.rng.getrandbits(64)
+        self._version = 0
+        self._cycle_memo = None
+
+    def _next_cycle(self):
+        # The permutation _extend() will switch to, computed without touching the current
+        # one: a pure function of the seed, the current order and the playing key, so
+        # peek() now and next() later agree. Memoized until any of those change.
+        cur = self.current()
+        stamp = (self._seed, self._version, cur)
+        memo = self._cycle_memo
+        if memo is not None and memo[0] == stamp:
+            return memo[1]
+        rng = random.Random(self._seed)
+        cycle = [k for k in self.order if k is not None]
+        rng.shuffle(cycle)
+        if len(cycle) > 1 and cycle[0] == cur:
+            j = rng.randint(1, len(cycle) - 1)
+            cycle[0], cycle[j] = cycle[j], cycle[0]
+        self._cycle_memo = (stamp, cycle)
+        return cycle
+
+    def _extend(self):
+        # Next cycle: a fresh permutation replaces the finished one (history included)
+        # and never starts with the track that just played
+        self.order = list(self._next_cycle())
+        self.pos = -1
+        self._dead = 0
+        self._new_cycle()
+        self._reindex()
+
+    def _compact(self):
+        live = [k for k in self.order[:self.pos] if k is not None]
+        self.order = live + self.order[max(self.pos, 0):]
+        if self.pos >= 0:
+            self.pos = len(live)
+        self._dead = sum(1 for k in self.order if k is None)
+        self._reindex()
+
+    def _reindex(self):
+        self._where = {k: i for i, k in enumerate(self.order) if k is not None}
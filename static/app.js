@@ -70,20 +70,35 @@ async function pickFolder() {
     await loadFolder(folderPath.trim());
 }
 
+// Poll a background job until it finishes; returns the final job, or null if it's gone
+async function waitForJob(jobId, interval = 300) {
+    while (true) {
+        const job = await api(`/api/jobs/${jobId}`);
+        if (!job || !job.status) return null;
+        if (['done', 'failed', 'cancelled'].includes(job.status)) return job;
+        if (job.total) {
+            elements.folderDisplay.textContent = `Loading... ${job.done}/${job.total}`;
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
 // Load folder
 async function loadFolder(folder) {
     if (!folder) return;
 
     elements.folderDisplay.textContent = 'Loading...';
 
+    // The scan runs as a server job; the track count comes with the finished job
     const result = await api('/api/load-folder', 'POST', { folder });
-    if (result?.success) {
+    const job = result?.success ? await waitForJob(result.job_id) : null;
+    if (job?.status === 'done') {
         elements.folderDisplay.textContent = folder.split('\\').pop() || folder.split('/').pop() || folder;
-        showNotification(`Loaded ${result.count} tracks!`);
+        showNotification(`Loaded ${job.result} tracks!`);
         await refreshState();
     } else {
         elements.folderDisplay.textContent = 'Failed to load folder';
-        showNotification('Failed to load folder', 'error');
+        showNotification(job?.error ? `Failed to load folder: ${job.error}` : 'Failed to load folder', 'error');
     }
 }
 
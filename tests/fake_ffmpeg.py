@@ -0,0 +1,36 @@
+"""
+Stand-in ffmpeg: "converts" by copying the input file to the output path (the last
+argument), or to stdout when that is `-` (the analyzer's raw f32le decode, so inputs
+for it hold raw float32 samples).
+
+    ffmpeg = fake_ffmpeg(tmp_path, gate=tmp_path / 'go')
+    cache = TranscodeCache(str(tmp_path / 'cache'), ffmpeg=ffmpeg)
+
+With `gate`, every conversion waits until that file exists, so a test can look at the
+caller while the conversion is still running. Input files named `*broken*` fail.
+"""
+
+import os
+import sys
+import textwrap
+
+
+def fake_ffmpeg(tmp_path, gate=None):
+    script = tmp_path / 'ffmpeg'
+    script.write_text(textwrap.dedent(f'''\
+        #!{sys.executable}
+        import os, shutil, sys, time
+        gate = {str(gate) if gate else None!r}
+        while gate and not os.path.exists(gate):
+            time.sleep(0.01)
+        src = sys.argv[sys.argv.index('-i') + 1]
+        if 'broken' in os.path.basename(src):
+            sys.exit('invalid data found when processing input')
+        if sys.argv[-1] == '-':
+            with open(src, 'rb') as f:
+                shutil.copyfileobj(f, sys.stdout.buffer)
+        else:
+            shutil.copyfile(src, sys.argv[-1])
+    '''))
+    os.chmod(script, 0o755)
+    return str(script)
@@ -0,0 +1,109 @@
+"""
+Local stand-in for the parts of the Spotify Web API that SpotifyController uses.
+
+    with FakeSpotify(delay=0.3) as api:
+        ctl = SpotifyController(auth_manager=FakeAuth(), api_prefix=api.prefix)
+        ...
+        assert api.calls_to('PUT', '/v1/me/player/play')
+
+Every request is recorded in `calls` as (method, path, query dict). `delay` makes each
+response slow, to check that nothing on the caller's side waits for it.
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class FakeAuth:
+    """Auth manager that hands spotipy a fixed token (no OAuth round trip)."""
+
+    def get_access_token(self, as_dict=False):
+        return 'test-token'
+
+
+class FakeSpotify:
+    def __init__(self, delay=0.0, is_playing=False, volume=50, track=('Song', ['Artist'])):
+        self.delay = delay
+        self.is_playing = is_playing
+        self.volume = volume
+        self.track = track
+        self.calls = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def prefix(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}/v1/'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def calls_to(self, method, path):
+        with self._lock:
+            return [query for m, p, query in self.calls if m == method and p == path]
+
+    def wait_for(self, method, path, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.calls_to(method, path):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def playback(self):
+        name, artists = self.track
+        return {'is_playing': self.is_playing, 'device': {'volume_percent': self.volume},
+                'item': {'name': name, 'artists': [{'name': a} for a in artists]}}
+
+    def _handle(self, method, path, query):
+        with self._lock:
+            self.calls.append((method, path, query))
+            if method == 'GET' and path == '/v1/me/player':
+                return 200, self.playback()
+            if method == 'PUT' and path == '/v1/me/player/play':
+                self.is_playing = True
+            elif method == 'PUT' and path == '/v1/me/player/pause':
+                self.is_playing = False
+            elif method == 'PUT' and path == '/v1/me/player/volume':
+                self.volume = int(query['volume_percent'])
+            elif not (method == 'POST' and path in ('/v1/me/player/next', '/v1/me/player/previous')):
+                return 404, {'error': {'status': 404, 'message': 'Not found'}}
+            return 204, None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                if fake.delay:
+                    time.sleep(fake.delay)
+                url = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                status, body = fake._handle(self.command, url.path, query)
+                data = json.dumps(body).encode() if body is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_PUT = do_POST = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+import pytest
+
+import audio_analysis
+from audio_analysis import (AnalysisWorker, DecoderUnavailable, LoudnessMeter, LoudnessTask,
+                            PeakMeter, WaveformTask, decode_audio, decode_stream,
+                            measure_loudness, waveform_peaks)
+from fake_ffmpeg import fake_ffmpeg
+
+RATE = 22050
+
+
+def sine(seconds, dbfs=-20.0, freq=997.0, rate=RATE):
+    t = np.arange(int(seconds * rate)) / rate
+    mono = (10 ** (dbfs / 20) * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.stack((mono, mono), axis=1)
+
+
+def noise(frames, seed=0):
+    return np.random.default_rng(seed).uniform(-0.8, 0.8, (frames, 2)).astype(np.float32)
+
+
+def feed(meter, samples, chunk):
+    for i in range(0, len(samples), chunk):
+        meter.add(samples[i:i + chunk])
+    return meter.result()
+
+
+# --- loudness ----------------------------------------------------------------------
+
+def test_sine_reads_at_its_level():
+    # BS.1770: a 997 Hz sine in both channels measures at its level in dBFS
+    lufs, peak = measure_loudness(sine(5, dbfs=-20.0), RATE)
+    assert lufs == pytest.approx(-20.0, abs=0.2)
+    assert peak == pytest.approx(-20.0, abs=0.01)
+
+
+@pytest.mark.parametrize('chunk', [1000, 2205, 22050 * 7 + 13])
+def test_loudness_in_chunks_matches_one_shot(chunk):
+    samples = noise(RATE * 20) * np.linspace(0.1, 1.0, RATE * 20, dtype=np.float32)[:, None]
+    lufs, peak = feed(LoudnessMeter(RATE), samples, chunk)
+    whole_lufs, whole_peak = measure_loudness(samples, RATE)
+    assert lufs == pytest.approx(whole_lufs, abs=1e-9) and peak == whole_peak
+
+
+def test_short_and_silent_clips_have_no_loudness():
+    assert measure_loudness(sine(0.3), RATE)[0] is None
+    assert measure_loudness(np.zeros((RATE, 2), np.float32), RATE) == (None, float('-inf'))
+
+
+# --- waveform peaks ----------------------------------------------------------------
+
+RES = (64, 16, 4)
+
+
+@pytest.mark.parametrize('frames, chunk', [(0, 10), (50, 7), (64 * 9, 100), (1000, 33), (4096, 4096)])
+def test_peaks_in_chunks_match_waveform_peaks_exactly(frames, chunk):
+    # Up to 2 * detail * finest frames the meter never merges blocks
+    samples = noise(frames, seed=frames)
+    got = feed(PeakMeter(RES), samples, chunk)
+    expected = waveform_peaks(samples, RES)
+    for buckets in RES:
+        assert np.array_equal(got[buckets], expected[buckets])
+
+
+@pytest.mark.parametrize('frames, chunk', [(64 * 2 * 16 * 5 + 17, 999), (123457, 4000)])
+def test_peaks_of_long_input_stay_bounded_and_close(frames, chunk):
+    samples = noise(frames, seed=1) * np.sin(np.linspace(0, 9, frames, dtype=np.float32))[:, None]
+    meter = PeakMeter(RES, detail=16)
+    got = feed(meter, samples, chunk)
+    assert meter.per > 1 and len(meter._lo) <= meter.limit
+    expected = waveform_peaks(samples, RES)
+    for buckets in RES:
+        lo, hi = got[buckets].T.astype(int), expected[buckets].T.astype(int)
+        # never narrower than the exact peaks, and only a little wider
+        assert (lo[0] <= hi[0]).all() and (lo[1] >= hi[1]).all()
+    exact = expected[RES[0]].astype(int)
+    assert np.abs(got[RES[0]].astype(int) - exact).mean() < 0.05 * np.abs(exact).mean()
+
+
+# --- decoding ----------------------------------------------------------------------
+
+def raw_file(tmp_path, samples, name='song.flac'):
+    path = tmp_path / name
+    path.write_bytes(samples.astype('<f4').tobytes())
+    return str(path)
+
+
+def test_decode_stream_reads_fixed_size_chunks(tmp_path):
+    samples = noise(10007)
+    path = raw_file(tmp_path, samples)
+    chunks, rate = decode_stream(path, ffmpeg=fake_ffmpeg(tmp_path), chunk_frames=1000)
+    sizes = [len(c) for c in chunks]
+    assert rate == RATE and sizes == [1000] * 10 + [7]
+    whole, _ = decode_audio(path, ffmpeg=fake_ffmpeg(tmp_path))
+    assert np.array_equal(whole, samples)
+
+
+def test_decode_stream_raises_when_ffmpeg_fails(tmp_path):
+    path = raw_file(tmp_path, noise(100), name='broken.flac')
+    chunks, _ = decode_stream(path, ffmpeg=fake_ffmpeg(tmp_path))
+    with pytest.raises(Exception):
+        list(chunks)
+
+
+def test_no_decoder_before_the_mixer_starts(monkeypatch):
+    pygame = pytest.importorskip('pygame')
+    monkeypatch.setattr(audio_analysis.shutil, 'which', lambda name: None)
+    monkeypatch.setattr(pygame.mixer, 'get_init', lambda: None)
+    with pytest.raises(DecoderUnavailable):
+        decode_stream('/music/song.mp3')
+
+
+# --- worker ------------------------------------------------------------------------
+
+def run_worker(worker, tracks, until):
+    worker.start()
+    worker.submit(tracks)
+    deadline = time.monotonic() + 10
+    while not until():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_worker_fills_in_every_task(tmp_path):
+    waveforms = WaveformTask(str(tmp_path / 'waveforms'), resolutions=RES)
+    worker = AnalysisWorker([LoudnessTask(), waveforms], ffmpeg=fake_ffmpeg(tmp_path), throttle=0)
+    track = {'path': raw_file(tmp_path, sine(3, dbfs=-20.0))}
+    run_worker(worker, [track], lambda: worker.analyzed == 1)
+    assert track['loudness_lufs'] == pytest.approx(-20.0, abs=0.2)
+    assert track['gain_db'] == pytest.approx(6.0, abs=0.2)
+    assert len(waveforms.read(track['waveform'], 64, bits=16)) == 64 * 4
+
+
+def test_worker_remembers_decode_failures(tmp_path):
+    worker = AnalysisWorker([LoudnessTask()], ffmpeg=fake_ffmpeg(tmp_path), throttle=0)
+    track = {'path': raw_file(tmp_path, noise(100), name='broken.flac')}
+    run_worker(worker, [track], lambda: worker.failed)
+    assert 'gain_db' not in track
+
+
+def test_worker_retries_tracks_until_a_decoder_is_available(tmp_path, monkeypatch):
+    ready = []
+    real = audio_analysis.decode_stream
+
+    def decode_stream(path, ffmpeg=None):
+        if not ready:
+            ready.append(True)   # the first attempt comes before the mixer is up
+            raise DecoderUnavailable("no ffmpeg and the mixer isn't initialized")
+        return real(path, ffmpeg=ffmpeg)
+
+    monkeypatch.setattr(audio_analysis, 'decode_stream', decode_stream)
+    worker = AnalysisWorker([LoudnessTask()], ffmpeg=fake_ffmpeg(tmp_path), throttle=0, retry_delay=0.01)
+    track = {'path': raw_file(tmp_path, sine(1))}
+    run_worker(worker, [track], lambda: worker.analyzed == 1)
+    assert not worker.failed and 'gain_db' in track
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+import pytest
+
+from command_actor import CommandActor
+
+
+@pytest.fixture
+def actor():
+    a = CommandActor()
+    a.start()
+    yield a
+    a.stop()
+
+
+def blocked(actor):
+    """Park the actor on a command until the returned event is set, so later submits pile up."""
+    running, release = threading.Event(), threading.Event()
+    actor.submit(lambda: (running.set(), release.wait(5)))
+    assert running.wait(5)
+    return release
+
+
+def test_results_come_back_through_futures(actor):
+    assert actor.submit(lambda a, b: a + b, 2, 3).result(5) == 5
+
+
+def test_exceptions_reach_the_submitter_and_the_actor_keeps_going(actor):
+    def boom():
+        raise ValueError('nope')
+    with pytest.raises(ValueError, match='nope'):
+        actor.submit(boom).result(5)
+    assert actor.submit(lambda: 'still alive').result(5) == 'still alive'
+
+
+def test_commands_run_in_order_on_one_thread(actor):
+    seen = []
+    release = blocked(actor)
+    futures = [actor.submit(lambda i=i: seen.append((i, threading.current_thread().name))) for i in range(50)]
+    release.set()
+    for f in futures:
+        f.result(5)
+    assert [i for i, _ in seen] == list(range(50))
+    assert {name for _, name in seen} == {actor.name}
+
+
+def test_keyed_commands_collapse_to_the_last_one(actor):
+    applied = []
+    release = blocked(actor)
+    futures = [actor.submit(lambda v=v: applied.append(v) or v, key='volume') for v in range(10, 60, 10)]
+    other = actor.submit(lambda: 'other')
+    release.set()
+    assert [f.result(5) for f in futures] == [50] * 5   # superseded submitters get the winner's result
+    assert other.result(5) == 'other'
+    assert applied == [50]
+    assert actor.collapsed == 4
+
+
+def test_collapsed_command_keeps_its_own_position(actor):
+    order = []
+    release = blocked(actor)
+    actor.submit(lambda: order.append('seek 1'), key='seek')
+    actor.submit(lambda: order.append('play'))
+    last = actor.submit(lambda: order.append('seek 2'), key='seek')
+    release.set()
+    last.result(5)
+    assert order == ['play', 'seek 2']
+
+
+def test_batch_runs_under_the_lock(actor):
+    def probe():
+        # Another thread can't take the lock while a command runs
+        got = []
+        t = threading.Thread(target=lambda: got.append(actor.lock.acquire(blocking=False)))
+        t.start()
+        t.join()
+        return got[0]
+    assert actor.submit(probe).result(5) is False
+
+
+def test_call_runs_inline_on_the_actor_thread(actor):
+    # A command that calls back into the actor must not deadlock waiting on itself
+    assert actor.submit(lambda: actor.call(lambda: 7)).result(5) == 7
+    assert actor.call(lambda: 8, timeout=5) == 8
+
+
+def test_futures_can_be_awaited(actor):
+    async def main():
+        return await asyncio.wrap_future(actor.submit(lambda: 'done'))
+    assert asyncio.run(main()) == 'done'
+
+
+def test_stop_finishes_queued_commands():
+    a = CommandActor()
+    a.start()
+    release = blocked(a)
+    f = a.submit(lambda: 'queued before stop')
+    a.stop()
+    release.set()
+    assert f.result(5) == 'queued before stop'
+    a._thread.join(5)
+    assert not a._thread.is_alive()
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+pytest.importorskip('starlette')
+
+from fast_response import RawJSON, dumps, _default
+
+
+TRACKS = [{'id': 1, 'name': 'Ünïcode'}, {'id': 2, 'name': 'b'}]
+
+
+def raw_tracks():
+    def rebuild():
+        raise AssertionError('dumps() re-encoded the raw part')
+    return RawJSON(json.dumps(TRACKS).encode(), rebuild)
+
+
+def plain(content):
+    return json.loads(json.dumps(content, default=lambda o: TRACKS if isinstance(o, RawJSON) else _default(o)))
+
+
+@pytest.mark.parametrize('content', [
+    {'tracks': None},
+    {'is_playing': True, 'tracks': None, 'up_next': [3, 4]},
+    {'success': True, 'state': {'volume': 50, 'tracks': None}},
+    {'state': {'tracks': None}},
+    {'a': {'b': {'tracks': None}}, 'c': {}},
+])
+def test_raw_parts_are_spliced_at_any_dict_depth(content):
+    def fill(d):
+        return {k: raw_tracks() if v is None else fill(v) if isinstance(v, dict) else v for k, v in d.items()}
+    content = fill(content)
+    assert json.loads(dumps(content)) == plain(content)
+
+
+def test_raw_inside_a_list_falls_back_to_value():
+    raw = RawJSON(b'[]', lambda: TRACKS)
+    assert json.loads(dumps({'rooms': [{'tracks': raw}]})) == {'rooms': [{'tracks': TRACKS}]}
+
+
+def test_plain_content():
+    assert json.loads(dumps({'a': [1, 2], 'b': {'c': None}})) == {'a': [1, 2], 'b': {'c': None}}
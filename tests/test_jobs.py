@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+from jobs import Job, JobCancelled, JobManager
+
+
+@pytest.fixture
+def jobs():
+    m = JobManager({'scan': 1, 'cover': 2})
+    yield m
+    m.shutdown()
+
+
+def gate():
+    """A job function that blocks until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def fn(job):
+        started.set()
+        release.wait(5)
+        return 'released'
+    return fn, started, release
+
+
+def test_job_lifecycle_and_progress(jobs):
+    def count(job, n):
+        for i in range(n):
+            job.progress(i, n, 'counting')
+        return n
+
+    job = jobs.submit('scan', count, 3)
+    assert job.future.result(5) == 3
+    d = jobs.get(job.id).to_dict()
+    assert d['status'] == 'done' and d['result'] == 3
+    assert (d['done'], d['total'], d['message']) == (2, 3, 'counting')
+    assert d['started'] >= d['created'] and d['finished'] >= d['started']
+
+
+def test_failed_job_records_the_error(jobs):
+    def boom(job):
+        raise RuntimeError('disk on fire')
+    job = jobs.submit('scan', boom)
+    job.future.result(5)
+    assert job.status == 'failed' and job.error == 'disk on fire'
+
+
+def test_cancel_a_running_job_at_its_next_progress_call(jobs):
+    started = threading.Event()
+
+    def loop(job):
+        started.set()
+        while True:
+            job.progress(0)
+            time.sleep(0.01)
+
+    job = jobs.submit('scan', loop)
+    assert started.wait(5)
+    assert jobs.cancel(job.id)
+    job.future.result(5)
+    assert job.status == 'cancelled'
+    assert not jobs.cancel(job.id)   # already finished
+
+
+def test_cancel_a_queued_job_before_it_starts(jobs):
+    fn, started, release = gate()
+    first = jobs.submit('scan', fn)
+    assert started.wait(5)
+    queued = jobs.submit('scan', lambda job: pytest.fail('cancelled job ran'))
+    assert queued.status == 'queued'
+    assert jobs.cancel(queued.id)
+    assert queued.status == 'cancelled' and queued.finished is not None
+    release.set()
+    assert first.future.result(5) == 'released'
+
+
+def test_kinds_have_separate_caps(jobs):
+    fn, started, release = gate()
+    jobs.submit('scan', fn)
+    assert started.wait(5)
+    # the scan pool is full, covers still run
+    assert jobs.run('cover', lambda: 'cover').result(5) == 'cover'
+    release.set()
+
+
+def test_backlog_counts_jobs_waiting_for_a_worker(jobs):
+    fn, started, release = gate()
+    jobs.submit('scan', fn)
+    assert started.wait(5)
+    waiting = [jobs.submit('scan', lambda job: None) for _ in range(3)]
+    jobs.run('scan', lambda: None)
+    assert jobs.backlog() == {'scan': 4, 'cover': 0}
+    jobs.cancel(waiting[0].id)
+    assert jobs.backlog()['scan'] == 3
+    release.set()
+    for job in waiting[1:]:
+        job.future.result(5)
+    deadline = time.monotonic() + 5
+    while jobs.backlog()['scan'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert jobs.backlog() == {'scan': 0, 'cover': 0}
+
+
+def test_list_and_prune():
+    m = JobManager({'scan': 1}, keep=3)
+    try:
+        done = [m.submit('scan', lambda job, i=i: i) for i in range(5)]
+        for job in done:
+            job.future.result(5)
+        fn, started, release = gate()
+        running = m.submit('scan', fn)
+        assert started.wait(5)
+        # the oldest finished jobs are forgotten, never a running one
+        assert [j.id for j in m.list()] == [j.id for j in done[3:]] + [running.id]
+        assert m.get(done[0].id) is None
+        assert m.list('cover') == []
+        release.set()
+    finally:
+        m.shutdown()
+
+
+def test_progress_raises_once_cancelled():
+    job = Job('scan')
+    job.progress(1, 10)
+    job._cancel.set()
+    with pytest.raises(JobCancelled):
+        job.progress(2)
@@ -0,0 +1,123 @@
+import random
+
+from library_index import LibraryIndex
+
+
+def track(track_id, album, artist, seconds=100, year='2000'):
+    return {'id': track_id, 'album': album, 'artist': artist, 'duration_sec': seconds, 'year': year}
+
+
+def summaries(index):
+    albums = {(a.name, a.artist): (len(a.track_ids), a.seconds) for a in index.albums.page(0, 10 ** 6)}
+    artists = {a.name: (len(a.albums), a.tracks, a.seconds) for a in index.artists.page(0, 10 ** 6)}
+    return albums, artists
+
+
+def built(tracks):
+    index = LibraryIndex()
+    for t in tracks:
+        index.add(t)
+    return index
+
+
+def random_library(n, seed):
+    rng = random.Random(seed)
+    return [track(i, f'Album {rng.randint(0, 15)}', f'Artist {rng.randint(0, 5)}', rng.randint(0, 400))
+            for i in range(n)]
+
+
+def test_counts_and_durations():
+    index = built([track(1, 'Roja', 'A.R. Rahman', 200), track(2, 'Roja', 'A.R. Rahman', 150),
+                   track(3, 'Bombay', 'A.R. Rahman', 300), track(4, 'Homogenic', 'Björk', 250)])
+    albums, artists = summaries(index)
+    assert albums == {('Roja', 'A.R. Rahman'): (2, 350), ('Bombay', 'A.R. Rahman'): (1, 300),
+                      ('Homogenic', 'Björk'): (1, 250)}
+    assert artists == {'A.R. Rahman': (2, 3, 650), 'Björk': (1, 1, 250)}
+
+
+def test_same_album_title_by_different_artists_stays_apart():
+    index = built([track(1, 'Greatest Hits', 'Queen'), track(2, 'Greatest Hits', 'ABBA')])
+    assert len(index.albums) == 2
+    assert [a.artist for a in index.albums.page()] == ['ABBA', 'Queen']
+
+
+def test_adding_a_track_twice_counts_it_once():
+    t = track(1, 'X', 'Y', 10)
+    index = built([t, t])
+    assert summaries(index) == ({('X', 'Y'): (1, 10)}, {'Y': (1, 1, 10)})
+
+
+def test_remove_drops_empty_groups():
+    a, b = track(1, 'X', 'Y'), track(2, 'Z', 'Y')
+    index = built([a, b])
+    index.remove(a)
+    assert summaries(index) == ({('Z', 'Y'): (1, 100)}, {'Y': (1, 1, 100)})
+    index.remove(b)
+    assert len(index.albums) == 0 and len(index.artists) == 0
+    index.remove(b)   # unknown: no-op
+    index.remove(track(3, 'Never', 'Added'))
+
+
+def test_aggregates_after_a_rescan_match_a_fresh_build():
+    library = random_library(500, seed=4)
+    index = built(library)
+    rng = random.Random(7)
+    stale = rng.sample(library, 200)
+    for t in stale:
+        index.remove(t)
+    # changed files come back with new ids and possibly new tags
+    rescanned = [track(1000 + i, f'Album {rng.randint(0, 20)}', t['artist'], t['duration_sec'])
+                 for i, t in enumerate(stale[:120])]
+    for t in rescanned:
+        index.add(t)
+    survivors = [t for t in library if t not in stale] + rescanned
+    assert summaries(index) == summaries(built(survivors))
+
+
+def test_pages_are_in_name_order():
+    names = ['beta', 'Alpha', 'gamma', 'Delta', 'epsilon']
+    index = built([track(i, name, 'Artist') for i, name in enumerate(names)])
+    assert [a.name for a in index.albums.page(0, 10)] == ['Alpha', 'beta', 'Delta', 'epsilon', 'gamma']
+    assert [a.name for a in index.albums.page(1, 2)] == ['beta', 'Delta']
+    assert [a.name for a in index.albums.page(0, 2, descending=True)] == ['gamma', 'epsilon']
+    assert [a.name for a in index.albums.page(4, 5, descending=True)] == ['Alpha']
+    assert index.albums.page(10, 5) == [] and index.albums.page(10, 5, descending=True) == []
+
+
+def test_page_start_prefix():
+    names = ['Abba', 'Bach', 'Beatles', 'Bowie', 'Cash']
+    index = built([track(i, 'Album', name) for i, name in enumerate(names)])
+    assert [a.name for a in index.artists.page(0, 2, start='b')] == ['Bach', 'Beatles']
+    assert [a.name for a in index.artists.page(1, 2, start='be')] == ['Bowie', 'Cash']
+    assert [a.name for a in index.artists.page(0, 2, descending=True, start='B')] == ['Bowie', 'Beatles']
+    assert [a.name for a in index.artists.page(0, 10, start='z')] == []
+
+
+def test_cover_track_follows_removals():
+    first, second = track(1, 'X', 'Y'), track(2, 'X', 'Y')
+    index = built([first, second, track(3, 'W', 'Y')])
+    album = index.albums.page()[1]
+    assert album.name == 'X' and album.cover_track() == 1
+    artist = index.artists.page()[0]
+    assert artist.cover_track() == 1
+    index.remove(first)
+    assert album.cover_track() == 2 and artist.cover_track() == 2
+    assert album.summary(lambda tid: tid * 10)['cover_idx'] == 20
+
+
+def test_group_ids_are_stable_and_looked_up():
+    index = built(random_library(100, seed=1))
+    for album in index.albums.page(0, 1000):
+        assert index.albums.get(album.id) is album
+    for artist in index.artists.page(0, 1000):
+        assert index.artists.get(artist.id) is artist
+    ids = {a.id for a in index.albums.page(0, 1000)} | {a.id for a in index.artists.page(0, 1000)}
+    assert len(ids) == len(index.albums) + len(index.artists)
+
+
+def test_clear():
+    index = built(random_library(20, seed=2))
+    index.clear()
+    assert len(index.albums) == 0 and len(index.artists) == 0
+    index.add(track(1, 'X', 'Y'))
+    assert len(index.albums) == 1
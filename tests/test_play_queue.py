@@ -0,0 +1,112 @@
+import pytest
+
+from play_queue import PlayQueue
+
+
+def tracks(q):
+    return [tid for _, tid in q]
+
+
+def check_invariants(q):
+    # Links agree both ways, head/tail are the ends, and the track index matches the nodes
+    order = [qid for qid, _ in q]
+    assert len(order) == len(q) == len(set(order))
+    assert q._head == (order[0] if order else None)
+    assert q._tail == (order[-1] if order else None)
+    for i, qid in enumerate(order):
+        prev, nxt, _ = q._nodes[qid]
+        assert prev == (order[i - 1] if i else None)
+        assert nxt == (order[i + 1] if i + 1 < len(order) else None)
+    by_track = {}
+    for qid, tid in q:
+        by_track.setdefault(tid, set()).add(qid)
+    assert q._by_track == by_track
+
+
+def filled(*track_ids):
+    q = PlayQueue()
+    qids = [q.append(tid) for tid in track_ids]
+    return q, qids
+
+
+def test_append_play_next_and_pop():
+    q, _ = filled(1, 2)
+    q.play_next(3)
+    assert tracks(q) == [3, 1, 2]
+    assert q.pop()[1] == 3
+    assert q.peek()[1] == 1
+    check_invariants(q)
+    assert [q.pop()[1] for _ in range(2)] == [1, 2]
+    assert q.pop() is None and q.peek() is None
+    check_invariants(q)
+
+
+def test_insert_after():
+    q, (a, b) = filled(1, 2)
+    q.insert_after(9, a)
+    q.insert_after(8, None)
+    q.insert_after(7, b)
+    assert tracks(q) == [8, 1, 9, 2, 7]
+    check_invariants(q)
+    with pytest.raises(KeyError):
+        q.insert_after(5, 12345)
+
+
+@pytest.mark.parametrize('move, after, expected', [
+    (0, None, [1, 2, 3, 4]),    # already at the front
+    (3, None, [4, 1, 2, 3]),    # tail to front
+    (0, 3, [2, 3, 4, 1]),       # head to the end
+    (1, 2, [1, 3, 2, 4]),       # one step down
+    (2, 0, [1, 3, 2, 4]),       # one step up
+    (1, 1, [1, 2, 3, 4]),       # after itself
+    (2, 1, [1, 2, 3, 4]),       # already right after
+])
+def test_move(move, after, expected):
+    q, qids = filled(1, 2, 3, 4)
+    assert q.move(qids[move], None if after is None else qids[after])
+    assert tracks(q) == expected
+    check_invariants(q)
+
+
+def test_move_unknown_entries():
+    q, (a, b) = filled(1, 2)
+    assert not q.move(999)
+    assert not q.move(a, 999)
+    assert tracks(q) == [1, 2]
+
+
+@pytest.mark.parametrize('victim', [0, 1, 2])
+def test_remove_head_middle_tail(victim):
+    q, qids = filled(1, 2, 3)
+    assert q.remove(qids[victim])
+    assert tracks(q) == [t for i, t in enumerate([1, 2, 3]) if i != victim]
+    check_invariants(q)
+    assert not q.remove(qids[victim])
+
+
+def test_remove_track_drops_every_entry():
+    q, _ = filled(1, 2, 1, 3, 1)
+    q.remove_track(1)
+    assert tracks(q) == [2, 3]
+    check_invariants(q)
+    q.remove_track(42)
+    assert tracks(q) == [2, 3]
+
+
+def test_entry_ids_survive_other_edits():
+    q, (a, b, c) = filled(1, 2, 3)
+    q.remove(a)
+    d = q.play_next(4)
+    q.move(c, None)
+    assert q.items() == [(c, 3), (d, 4), (b, 2)]
+    assert q.items(limit=1) == [(c, 3)]
+    check_invariants(q)
+
+
+def test_clear():
+    q, _ = filled(1, 2)
+    q.clear()
+    assert len(q) == 0 and tracks(q) == []
+    check_invariants(q)
+    q.append(5)
+    assert tracks(q) == [5]
@@ -0,0 +1,236 @@
+import random
+import time
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('pygame')
+
+import server
+from fake_ffmpeg import fake_ffmpeg
+from shuffle_order import ShuffleOrder
+from track_table import Track
+from transcode_cache import TranscodeCache
+
+
+def track(i, album='Album', artist='Artist', seconds=60):
+    return Track({'id': i, 'name': f'Track {i}', 'path': f'/music/{i}.mp3', 'filename': f'{i}.mp3',
+                  'artist': artist, 'album': album, 'year': '2020',
+                  'duration': f'{seconds // 60}:{seconds % 60:02d}', 'duration_sec': seconds})
+
+
+class FakeMusic:
+    """Stands in for pygame.mixer.music and records what was loaded and queued."""
+
+    def __init__(self):
+        self.loaded = []
+        self.queued = []
+
+    def load(self, path, *args):
+        self.loaded.append(path)
+
+    def queue(self, path, *args):
+        self.queued.append(path)
+
+    def get_busy(self):
+        return bool(self.loaded)
+
+    def get_pos(self):
+        return 0
+
+    def stop(self, *args, **kwargs):
+        pass
+
+    unload = play = pause = unpause = set_volume = stop
+
+
+@pytest.fixture
+def music(monkeypatch):
+    fake = FakeMusic()
+    monkeypatch.setattr(server.pygame.mixer, 'music', fake)
+    monkeypatch.setattr(server, 'warm_page_cache', lambda path: True)
+    return fake
+
+
+def make_player(n, **kwargs):
+    player = server.MusicPlayer()
+    player.add_scanned([track(i, **kwargs) for i in range(1, n + 1)])
+    return player
+
+
+def ids(player):
+    return [t['id'] for t in player.tracks]
+
+
+def check_consistent(player):
+    assert player.table.ids.tolist() == ids(player)
+    for idx, t in enumerate(player.tracks):
+        assert player.index_of(t['id']) == idx
+    assert sorted(player.shuffler._keys) == sorted(ids(player))
+
+
+def test_remove_before_current_shifts_it_down():
+    player = make_player(5)
+    player.current_idx = 3
+    assert player.remove_track(1)
+    assert ids(player) == [1, 3, 4, 5]
+    assert player.current_idx == 2 and player.tracks[2]['id'] == 4
+    check_consistent(player)
+
+
+def test_remove_after_current_keeps_it():
+    player = make_player(5)
+    player.current_idx = 1
+    player.remove_track(3)
+    assert player.current_idx == 1 and player.tracks[1]['id'] == 2
+    check_consistent(player)
+
+
+def test_remove_current_moves_to_the_next_track():
+    player = make_player(5)
+    player.current_idx = 2
+    player.is_playing = False
+    player.remove_track(2)
+    assert player.tracks[player.current_idx]['id'] == 4
+    assert not player.is_playing
+
+
+def test_remove_last_current_wraps():
+    player = make_player(3)
+    player.current_idx = 2
+    player.remove_track(2)
+    assert player.current_idx == 0
+
+
+def test_remove_out_of_range():
+    player = make_player(2)
+    assert not player.remove_track(2)
+    assert not player.remove_track(-1)
+    assert ids(player) == [1, 2]
+
+
+def test_remove_drops_queue_entries():
+    player = make_player(4)
+    player.play_queue.append(3)
+    player.play_queue.append(4)
+    player.remove_track(2)
+    assert [tid for _, tid in player.play_queue.items()] == [4]
+
+
+def test_apply_rescan_updates_the_cache_once(monkeypatch):
+    player = make_player(10)
+    player.current_idx = 6          # id 7
+    updates = []
+    real = player._update_cache
+    monkeypatch.setattr(player, '_update_cache', lambda: (updates.append(1), real()))
+    stale = ['/music/2.mp3', '/music/5.mp3', '/music/9.mp3', '/music/404.mp3']
+    assert player.apply_rescan(stale, [track(11), track(12)]) == 2
+    assert len(updates) == 1
+    assert ids(player) == [1, 3, 4, 6, 7, 8, 10, 11, 12]
+    assert player.tracks[player.current_idx]['id'] == 7
+    check_consistent(player)
+
+
+def test_apply_rescan_of_the_current_track():
+    player = make_player(6)
+    player.current_idx = 3          # id 4
+    player.apply_rescan(['/music/1.mp3', '/music/4.mp3', '/music/5.mp3'], [track(7)])
+    assert ids(player) == [2, 3, 6, 7]
+    assert player.tracks[player.current_idx]['id'] == 6
+    check_consistent(player)
+
+
+def test_apply_rescan_keeps_aggregates_in_step():
+    player = server.MusicPlayer()
+    player.add_scanned([track(1, album='A'), track(2, album='A'), track(3, album='B'),
+                        track(4, album='B', artist='Other')])
+    player.apply_rescan(['/music/1.mp3', '/music/3.mp3'], [track(5, album='C', seconds=30)])
+    page = player.albums_page()
+    counts = {(a['album'], a['artist']): (a['track_count'], a['duration_sec']) for a in page['albums']}
+    assert counts == {('A', 'Artist'): (1, 60), ('B', 'Other'): (1, 60), ('C', 'Artist'): (1, 30)}
+    artists = {a['artist']: (a['album_count'], a['track_count']) for a in player.artists_page()['artists']}
+    assert artists == {'Artist': (2, 2), 'Other': (1, 1)}
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_shuffle_plays_every_track_once_per_cycle(music, seed):
+    player = make_player(10)
+    player.shuffler = ShuffleOrder(rng=random.Random(seed))
+    player.toggle_shuffle()         # anchored at the current track, id 1
+    played = [player.tracks[player.current_idx]['id']]
+    for _ in range(49):
+        assert player.next_track()
+        played.append(player.tracks[player.current_idx]['id'])
+    for start in range(0, 50, 10):
+        assert sorted(played[start:start + 10]) == list(range(1, 11))
+
+
+@pytest.fixture
+def converting(tmp_path):
+    """A player whose first track is an .m4a whose conversion waits for `go` to exist."""
+    gate = tmp_path / 'go'
+    cache = TranscodeCache(str(tmp_path / 'cache'), ffmpeg=fake_ffmpeg(tmp_path, gate=gate))
+    source = tmp_path / 'song.m4a'
+    source.write_bytes(b'm4a' * 100)
+    player = server.MusicPlayer(transcoder=cache)
+    player.add_scanned([Track(dict(track(1), path=str(source))), track(2)])
+    yield player, cache, gate
+    cache.shutdown()
+
+
+def wait_until(cond, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_play_waits_for_the_transcode_instead_of_loading_the_source(music, converting):
+    player, cache, gate = converting
+    assert player.play_track(0)
+    assert music.loaded == []                  # the .m4a never reaches pygame
+    assert player.loading and not player.is_playing and player.current_idx == 0
+    assert player.get_state(include_tracks=False)['loading']
+    gate.touch()
+    wait_until(lambda: music.loaded)
+    entry = cache.playable_path(player.tracks[0]['path'])
+    assert music.loaded == [entry]
+    assert player.is_playing and not player.loading
+
+
+def test_a_newer_pick_cancels_the_pending_load(music, converting):
+    player, cache, gate = converting
+    player.play_track(0)
+    player.play_track(1)
+    assert music.loaded == ['/music/2.mp3'] and not player.loading
+    gate.touch()
+    cache.prepare(player.tracks[0]['path']).result(5)
+    time.sleep(0.1)
+    assert music.loaded == ['/music/2.mp3'] and player.current_idx == 1
+
+
+def test_pause_while_converting_cancels_the_start(music, converting):
+    player, cache, gate = converting
+    player.play_track(0)
+    assert player.toggle_play() is False
+    assert not player.loading
+    gate.touch()
+    cache.prepare(player.tracks[0]['path']).result(5)
+    time.sleep(0.1)
+    assert music.loaded == [] and not player.is_playing
+
+
+def test_toggle_repeat_drops_a_prefetch_still_in_flight(music, monkeypatch):
+    player = make_player(3)
+    started = []
+    real = player._prefetch_and_queue
+    # Hold every prefetch so the test decides the order they finish in
+    monkeypatch.setattr(player, '_prefetch_and_queue', lambda *args: started.append(args))
+    player.play_track(0)
+    player.toggle_repeat()
+    wait_until(lambda: len(started) == 2)
+    for_next, for_repeat = started
+    assert for_next[1] == 1 and for_repeat[1] == 0
+    real(*for_repeat)
+    real(*for_next)        # the stale one finishes last
+    assert music.queued == ['/music/1.mp3'] and player._queued_idx == 0
@@ -0,0 +1,136 @@
+import os
+from email.utils import formatdate
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('httpx')
+
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from range_response import RangeFileResponse, parse_range
+
+DATA = bytes(range(256)) * 4    # 1024 bytes
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 1023)),
+    ('bytes=1000-5000', (1000, 1023)),     # end clamped to the file
+    ('bytes=-100', (924, 1023)),           # suffix
+    ('bytes=-5000', (0, 1023)),            # suffix longer than the file
+    ('bytes=5-5', (5, 5)),
+    ('BYTES = 0-0', (0, 0)),
+    ('bytes=1024-', 'unsatisfiable'),
+    ('bytes=2000-3000', 'unsatisfiable'),
+    ('bytes=-0', 'unsatisfiable'),
+    ('bytes=5-3', None),                   # last before first: invalid, ignored
+    ('bytes=0-1,5-6', None),               # multi-range: whole file
+    ('items=0-5', None),
+    ('bytes=', None),
+    ('bytes=-', None),
+    ('bytes=abc-', None),
+    ('bytes=--5', None),
+    ('bytes=5', None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(DATA)) == expected
+
+
+def test_parse_range_empty_file():
+    assert parse_range('bytes=0-', 0) == 'unsatisfiable'
+    assert parse_range('bytes=-10', 0) == 'unsatisfiable'
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / 'song.mp3'
+    path.write_bytes(DATA)
+
+    async def stream(request):
+        return RangeFileResponse(str(path), request)
+
+    app = Starlette(routes=[Route('/stream', stream, methods=['GET', 'HEAD'])])
+    with TestClient(app) as c:
+        c.path = path
+        yield c
+
+
+def test_whole_file(client):
+    r = client.get('/stream')
+    assert r.status_code == 200
+    assert r.content == DATA
+    assert r.headers['content-length'] == str(len(DATA))
+    assert r.headers['accept-ranges'] == 'bytes'
+    assert r.headers['content-type'] == 'audio/mpeg'
+
+
+@pytest.mark.parametrize('header, start, end', [
+    ('bytes=10-19', 10, 19),
+    ('bytes=1000-', 1000, 1023),
+    ('bytes=-24', 1000, 1023),
+    ('bytes=0-99999', 0, 1023),
+])
+def test_partial_content(client, header, start, end):
+    r = client.get('/stream', headers={'range': header})
+    assert r.status_code == 206
+    assert r.content == DATA[start:end + 1]
+    assert r.headers['content-range'] == f'bytes {start}-{end}/{len(DATA)}'
+    assert r.headers['content-length'] == str(end - start + 1)
+
+
+def test_large_range_spans_several_chunks(tmp_path):
+    import range_response
+    data = os.urandom(range_response.CHUNK_SIZE * 2 + 123)
+    path = tmp_path / 'big.ogg'
+    path.write_bytes(data)
+
+    async def stream(request):
+        return RangeFileResponse(str(path), request)
+
+    with TestClient(Starlette(routes=[Route('/s', stream)])) as c:
+        r = c.get('/s', headers={'range': 'bytes=100-'})
+    assert r.status_code == 206 and r.content == data[100:]
+
+
+@pytest.mark.parametrize('header', ['bytes=1024-', 'bytes=-0'])
+def test_unsatisfiable(client, header):
+    r = client.get('/stream', headers={'range': header})
+    assert r.status_code == 416
+    assert r.headers['content-range'] == f'bytes */{len(DATA)}'
+    assert r.content == b''
+
+
+@pytest.mark.parametrize('header', ['bytes=5-3', 'bytes=0-1,4-5', 'lines=1-2'])
+def test_ignored_range_sends_everything(client, header):
+    r = client.get('/stream', headers={'range': header})
+    assert r.status_code == 200 and r.content == DATA
+
+
+def test_head_sends_headers_only(client):
+    r = client.head('/stream', headers={'range': 'bytes=0-9'})
+    assert r.status_code == 206
+    assert r.headers['content-length'] == '10'
+    assert r.content == b''
+
+
+def test_conditional_requests(client):
+    etag = client.get('/stream').headers['etag']
+    assert client.get('/stream', headers={'if-none-match': etag}).status_code == 304
+    assert client.get('/stream', headers={'if-none-match': f'"x", W/{etag}'}).status_code == 304
+    assert client.get('/stream', headers={'if-none-match': '"other"'}).status_code == 200
+    later = formatdate(os.stat(client.path).st_mtime + 60, usegmt=True)
+    earlier = formatdate(os.stat(client.path).st_mtime - 60, usegmt=True)
+    assert client.get('/stream', headers={'if-modified-since': later}).status_code == 304
+    assert client.get('/stream', headers={'if-modified-since': earlier}).status_code == 200
+
+
+def test_if_range(client):
+    r = client.get('/stream')
+    etag, last_modified = r.headers['etag'], r.headers['last-modified']
+    assert client.get('/stream', headers={'range': 'bytes=0-9', 'if-range': etag}).status_code == 206
+    assert client.get('/stream', headers={'range': 'bytes=0-9', 'if-range': last_modified}).status_code == 206
+    stale = client.get('/stream', headers={'range': 'bytes=0-9', 'if-range': '"stale"'})
+    assert stale.status_code == 200 and stale.content == DATA
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from rooms import DEFAULT_VOLUME, Room
+from shuffle_order import ShuffleOrder
+
+
+class Library:
+    """The slice of MusicPlayer a room reads: tracks, index_of and library_version."""
+
+    def __init__(self, n):
+        self.tracks = [{'id': i, 'name': f'Track {i}', 'duration_sec': 60} for i in range(1, n + 1)]
+        self.library_version = 0
+
+    def index_of(self, track_id):
+        for idx, t in enumerate(self.tracks):
+            if t['id'] == track_id:
+                return idx
+        return None
+
+
+def test_new_room_defaults():
+    room = Room('r', Library(3))
+    assert room.volume == DEFAULT_VOLUME
+    assert room.current_idx == -1 and not room.is_playing
+
+
+def test_next_track_walks_the_library_in_order():
+    room = Room('r', Library(3))
+    room.play_track(1)
+    assert [room.next_track() and room.current_idx for _ in range(3)] == [2, 0, 1]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_shuffle_plays_every_track_once_per_cycle(seed):
+    library = Library(10)
+    room = Room('r', library)
+    room.play_track(0)
+    room.toggle_shuffle()
+    room.shuffler = ShuffleOrder(range(1, 11), room.current_id, rng=random.Random(seed))
+    played = [room.current_id]
+    for _ in range(49):
+        assert room.next_track()
+        played.append(room.current_id)
+    for start in range(0, 50, 10):
+        assert sorted(played[start:start + 10]) == list(range(1, 11))
+
+
+def test_queued_tracks_play_before_the_shuffle():
+    room = Room('r', Library(10))
+    room.play_track(0)
+    room.toggle_shuffle()
+    room.enqueue(7)
+    assert room.up_next(1) == [7]
+    room.next_track()
+    assert room.current_idx == 7 and room.queue_state() == []
+
+
+def test_repeat_replays_the_current_track():
+    room = Room('r', Library(4))
+    room.play_track(2)
+    room.toggle_repeat()
+    assert room.ended(3)
+    assert room.current_idx == 2
+    assert not room.ended(1)      # not the current track: ignored
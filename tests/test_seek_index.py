@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('pygame')
+
+from server import build_seek_index
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417-byte frames of 1152 samples
+HEADER = b'\xff\xfb\x90\x00'
+FRAME = HEADER + bytes(417 - len(HEADER))
+PADDED = b'\xff\xfb\x92\x00' + bytes(418 - 4)   # same with the padding bit set
+FRAME_SECONDS = 1152 / 44100
+
+
+def id3v2(payload_size):
+    syncsafe = bytes((payload_size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b'ID3\x04\x00\x00' + syncsafe + bytes(payload_size)
+
+
+def write(tmp_path, data, name='t.mp3'):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def expected_offsets(n_frames, start=0, frame_len=417):
+    # offsets[s] is the first frame whose start time is at or after second s
+    seconds = math.ceil(n_frames * 1152 / 44100)
+    return [start + math.ceil(s * 44100 / 1152) * frame_len for s in range(seconds)]
+
+
+def test_duration_and_per_second_offsets(tmp_path):
+    n = 200
+    duration, offsets = build_seek_index(write(tmp_path, FRAME * n))
+    assert duration == pytest.approx(n * FRAME_SECONDS)
+    assert list(offsets) == expected_offsets(n)
+
+
+def test_skips_id3v2_tag(tmp_path):
+    tag = id3v2(1000)
+    duration, offsets = build_seek_index(write(tmp_path, tag + FRAME * 100))
+    assert duration == pytest.approx(100 * FRAME_SECONDS)
+    assert list(offsets) == expected_offsets(100, start=len(tag))
+
+
+def test_stops_at_id3v1_trailer(tmp_path):
+    data = FRAME * 50 + b'TAG' + bytes(125)
+    duration, _ = build_seek_index(write(tmp_path, data))
+    assert duration == pytest.approx(50 * FRAME_SECONDS)
+
+
+def test_resyncs_past_garbage_and_false_syncs(tmp_path):
+    # A lone 0xFF 0xFB... that isn't followed by another frame must not be trusted
+    junk = b'\x00\x01' + HEADER + b'\x00' * 20
+    duration, offsets = build_seek_index(write(tmp_path, junk + FRAME * 60))
+    assert duration == pytest.approx(60 * FRAME_SECONDS)
+    assert offsets[0] == len(junk)
+
+
+def test_padded_frames(tmp_path):
+    data = (FRAME + PADDED) * 40
+    duration, offsets = build_seek_index(write(tmp_path, data))
+    assert duration == pytest.approx(80 * FRAME_SECONDS)
+    # second 1 starts at frame 39, after 20 plain and 19 padded frames
+    assert offsets[1] == 20 * 417 + 19 * 418
+
+
+def test_not_an_mp3(tmp_path):
+    assert build_seek_index(write(tmp_path, FRAME * 10, name='t.wav')) == (None, None)
+    assert build_seek_index(write(tmp_path, bytes(5000))) == (None, None)
+    assert build_seek_index(str(tmp_path / 'missing.mp3')) == (None, None)
@@ -0,0 +1,144 @@
+import random
+
+from shuffle_order import ShuffleOrder
+
+
+def make(n, seed=1, current=None):
+    return ShuffleOrder(range(n), current=current, rng=random.Random(seed))
+
+
+def snapshot(s):
+    return list(s.order), s.pos, dict(s._where)
+
+
+def check_invariants(s):
+    live = [k for k in s.order if k is not None]
+    assert sorted(live) == sorted(s._keys)
+    assert len(live) == len(set(live))
+    assert s._where == {k: i for i, k in enumerate(s.order) if k is not None}
+    assert s._dead == s.order.count(None)
+
+
+def test_every_key_plays_once_per_cycle():
+    s = make(50)
+    for _ in range(3):
+        cycle = [s.next() for _ in range(50)]
+        assert sorted(cycle) == list(range(50))
+        check_invariants(s)
+
+
+def test_new_cycle_never_starts_with_the_track_that_just_played():
+    for seed in range(30):
+        s = make(3, seed)
+        for _ in range(3):
+            last = s.next()
+        assert s.next() != last
+
+
+def test_peek_matches_next_across_cycle_boundaries():
+    s = make(7)
+    for _ in range(40):
+        expected = s.peek()
+        assert s.next() == expected
+
+
+def test_peek_and_upcoming_do_not_change_the_order():
+    s = make(5)
+    for _ in range(5):
+        s.next()  # cycle used up: the next read has to look into the next cycle
+    before = snapshot(s)
+    first = s.peek()
+    ahead = s.upcoming(10)
+    assert snapshot(s) == before
+    assert ahead[0] == first and sorted(ahead) == list(range(5))
+    assert [s.next() for _ in range(5)] == ahead
+
+
+def test_upcoming_follows_next_within_a_cycle():
+    s = make(20)
+    s.next()
+    ahead = s.upcoming(5)
+    assert [s.next() for _ in range(5)] == ahead
+
+
+def test_add_lands_in_upcoming_part():
+    s = make(10)
+    for _ in range(4):
+        s.next()
+    history = s.order[:s.pos + 1]
+    s.add(99)
+    check_invariants(s)
+    assert s.order[:s.pos + 1] == history
+    assert 99 in s.upcoming(100)
+
+
+def test_remove_upcoming_and_history_keys():
+    s = make(10)
+    played = [s.next() for _ in range(5)]
+    ahead = s.upcoming(10)
+    s.remove(ahead[0])
+    s.remove(played[1])
+    check_invariants(s)
+    assert s.current() == played[-1]
+    assert ahead[0] not in s.upcoming(10)
+    assert sorted(s.upcoming(10)) == sorted(ahead[1:])
+    # prev() skips the tombstone
+    assert [s.prev() for _ in range(3)] == [played[3], played[2], played[0]]
+
+
+def test_remove_compacts_tombstones():
+    s = make(10)
+    played = [s.next() for _ in range(8)]
+    for key in played[:6]:
+        s.remove(key)
+    check_invariants(s)
+    assert s._dead * 2 <= len(s.order)
+    assert s.current() == played[-1]
+
+
+def test_jump_keeps_the_rest_of_the_order():
+    s = make(10)
+    s.next()
+    ahead = s.upcoming(10)
+    s.jump(ahead[4])
+    check_invariants(s)
+    assert s.current() == ahead[4]
+    assert sorted(s.upcoming(10)) == sorted(ahead[:4] + ahead[5:])
+
+
+def test_jump_to_a_played_key_moves_it_to_the_cursor():
+    s = make(10)
+    played = [s.next() for _ in range(4)]
+    s.jump(played[0])
+    check_invariants(s)
+    assert s.current() == played[0]
+    assert s.prev() == played[3]
+
+
+def test_empty_order():
+    s = ShuffleOrder()
+    assert s.peek() is None and s.next() is None and s.upcoming(5) == []
+    s.add(1)
+    assert s.peek() == 1 and s.next() == 1
+
+
+def test_peek_then_jump_plays_full_cycles():
+    # The players pick the next track with peek() and start it with jump()
+    s = make(10, seed=3)
+    s.jump(s.peek())
+    played = [s.current()]
+    for _ in range(49):
+        s.jump(s.peek())
+        played.append(s.current())
+        check_invariants(s)
+    for start in range(0, 50, 10):
+        assert sorted(played[start:start + 10]) == list(range(10))
+
+
+def test_jump_at_the_end_of_a_cycle_starts_a_new_one():
+    s = make(6)
+    for _ in range(6):
+        s.next()
+    s.jump(s.order[2])   # played earlier in the finished cycle
+    check_invariants(s)
+    assert s.pos == 0 and len(s.upcoming(10)) == 5
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+try:
+    import gesture_spotify_player as gsp
+except (ImportError, RuntimeError) as e:  # mediapipe/cv2/tkinter missing
+    pytest.skip(f'gesture_spotify_player unavailable: {e}', allow_module_level=True)
+if gsp.spotipy is None:
+    pytest.skip('spotipy not installed', allow_module_level=True)
+
+from fake_spotify import FakeSpotify, FakeAuth
+
+
+def wait_until(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def spotify():
+    """spotify(refresh_interval, **fake_kwargs) -> (fake API, controller pointed at it)."""
+    made = []
+
+    def make(refresh_interval=0.1, **fake_kwargs):
+        api = FakeSpotify(**fake_kwargs).__enter__()
+        ctl = gsp.SpotifyController(auth_manager=FakeAuth(), api_prefix=api.prefix,
+                                    refresh_interval=refresh_interval)
+        made.append((api, ctl))
+        return api, ctl
+
+    yield make
+    for api, ctl in made:
+        ctl.close()  # stop the worker before its server goes away
+        api.__exit__(None, None, None)
+
+
+def test_refresh_fills_the_cache(spotify):
+    api, ctl = spotify(is_playing=True, volume=35, track=('Roja', ['A.R. Rahman']))
+    assert wait_until(lambda: ctl.currently_playing() is not None)
+    assert ctl.is_playing()
+    assert ctl.currently_playing() == 'Roja - A.R. Rahman'
+
+
+def test_toggle_is_decided_locally_and_sent_in_the_background(spotify):
+    api, ctl = spotify(delay=0.3, is_playing=False)
+    assert wait_until(lambda: api.calls_to('GET', '/v1/me/player'))
+    t0 = time.perf_counter()
+    ctl.toggle_play_pause()
+    assert time.perf_counter() - t0 < 0.1  # the slow API is never waited on
+    assert ctl.is_playing()
+    assert api.wait_for('PUT', '/v1/me/player/play')
+    assert wait_until(lambda: api.is_playing)
+
+
+def test_skip_commands_reach_the_api(spotify):
+    api, ctl = spotify(refresh_interval=10)
+    ctl.next()
+    ctl.previous()
+    assert api.wait_for('POST', '/v1/me/player/next')
+    assert api.wait_for('POST', '/v1/me/player/previous')
+
+
+def test_volume_updates_are_coalesced(spotify):
+    api, ctl = spotify(refresh_interval=10, delay=0.2)
+    ctl.next()  # keeps the worker busy while the volume changes pile up
+    for vol in range(10, 60, 5):
+        ctl.set_volume(vol)
+    assert wait_until(lambda: api.volume == 55)
+    sent = api.calls_to('PUT', '/v1/me/player/volume')
+    assert len(sent) < 10
+    assert sent[-1]['volume_percent'] == '55'
@@ -0,0 +1,149 @@
+import random
+
+import numpy as np
+import pytest
+
+from track_table import Track, TrackTable
+
+ARTISTS = ['Anirudh', 'anirudh', 'Björk', 'Zakir Hussain', 'Unknown Artist']
+ALBUMS = ['Roja', 'Homogenic', 'homogenic', 'Live', 'Unknown Album']
+
+
+def make_tracks(n, seed=0):
+    rng = random.Random(seed)
+    tracks = []
+    for i in range(n):
+        seconds = rng.randint(0, 600)
+        tracks.append(Track({
+            'id': i * 3 + 1,
+            'name': rng.choice(['Intro', 'intro', 'Jai Ho', 'Army of Me', 'Ünder', 'Song']) + f' {rng.randint(0, 9)}',
+            'path': f'/m/{i}.mp3', 'filename': f'{i}.mp3',
+            'artist': rng.choice(ARTISTS), 'album': rng.choice(ALBUMS),
+            'year': rng.choice(['1992', '1997', 'Unknown Year']),
+            'duration': f'{seconds // 60}:{seconds % 60:02d}', 'duration_sec': seconds,
+        }))
+    return tracks
+
+
+# --- Track -------------------------------------------------------------------------
+
+def test_track_behaves_like_a_dict():
+    data = {'id': 1, 'name': 'a', 'path': '/a.mp3', 'gain_db': -3.0, 'custom': [1]}
+    t = Track(data)
+    assert dict(t) == data and t == data and len(t) == 5
+    assert t['custom'] == [1] and t.get('missing', 'x') == 'x' and t.get('album') is None
+    assert 'album' not in t and 'custom' in t
+    with pytest.raises(KeyError):
+        t['album']
+    del t['gain_db'], t['custom']
+    assert dict(t) == {'id': 1, 'name': 'a', 'path': '/a.mp3'}
+    with pytest.raises(KeyError):
+        del t['gain_db']
+    with pytest.raises(KeyError):
+        del t['custom']
+    assert Track.of(t) is t and Track.of(data) == data
+
+
+def test_track_interns_repeated_labels():
+    a = Track({'artist': ''.join(['Bjö', 'rk']), 'name': ''.join(['x', 'y'])})
+    b = Track({'artist': ''.join(['B', 'jörk']), 'name': ''.join(['x', 'y'])})
+    assert a['artist'] is b['artist']
+
+
+# --- TrackTable ----------------------------------------------------------------------
+
+def test_records_match_the_tracks():
+    tracks = make_tracks(30)
+    table = TrackTable(tracks)
+    keys = ('id', 'name', 'filename', 'artist', 'album', 'year', 'duration', 'duration_sec')
+    assert table.records() == [{k: t[k] for k in keys} for t in tracks]
+    rows = table.records([5, 2], with_index=True)
+    assert [(r['idx'], r['id']) for r in rows] == [(5, tracks[5]['id']), (2, tracks[2]['id'])]
+
+
+def test_missing_fields_get_defaults():
+    table = TrackTable([Track({'id': 7, 'path': '/x'})])
+    assert table.records() == [{'id': 7, 'name': 'Unknown', 'filename': 'unknown.mp3',
+                                'artist': 'Unknown Artist', 'album': 'Unknown Album',
+                                'year': 'Unknown Year', 'duration': '0:00', 'duration_sec': 0}]
+
+
+def test_index_of_after_deletes():
+    tracks = make_tracks(50)
+    for victim in (0, 10, 11, 46):
+        del tracks[victim]
+        table = TrackTable(tracks)
+        for row, t in enumerate(tracks):
+            assert table.index_of(t['id']) == row
+    assert table.index_of(1) is None           # first id, deleted
+    assert table.index_of(10 ** 9) is None
+    assert table.index_of(None) is None and table.index_of('3') is None
+    assert table.index_of(np.int64(tracks[0]['id'])) == 0
+
+
+def test_index_of_unsorted_ids():
+    tracks = make_tracks(20)
+    random.Random(3).shuffle(tracks)
+    table = TrackTable(tracks)
+    assert [table.index_of(t['id']) for t in tracks] == list(range(20))
+
+
+def reference_order(tracks, key, descending):
+    fold = lambda t, k: t[k].casefold()
+    keyfns = {
+        'index': lambda t: (),
+        'name': lambda t: (fold(t, 'name'),),
+        'artist': lambda t: (fold(t, 'artist'), fold(t, 'album'), fold(t, 'name')),
+        'album': lambda t: (fold(t, 'album'), fold(t, 'name')),
+        'year': lambda t: (fold(t, 'year'), fold(t, 'artist'), fold(t, 'album')),
+        'duration': lambda t: (t['duration_sec'],),
+    }
+    rows = range(len(tracks))
+    if key == 'index':
+        return list(rows)[::-1] if descending else list(rows)
+    # sorted() is stable with reverse=True too: ties keep library order either way
+    return sorted(rows, key=lambda r: keyfns[key](tracks[r]), reverse=descending)
+
+
+@pytest.mark.parametrize('key', TrackTable.SORT_KEYS)
+@pytest.mark.parametrize('descending', [False, True])
+def test_order_matches_a_plain_sort(key, descending):
+    tracks = make_tracks(200, seed=5)
+    table = TrackTable(tracks)
+    assert table.order(key, descending).tolist() == reference_order(tracks, key, descending)
+
+
+def test_order_rejects_unknown_keys():
+    with pytest.raises(ValueError):
+        TrackTable(make_tracks(3)).order('path')
+
+
+@pytest.mark.parametrize('query', ['intro', 'INTRO', 'homo', 'björk', 'ünder', 'o', 'zzz', 'y 3', 'Jai Ho 1'])
+def test_search_matches_a_plain_filter(query):
+    tracks = make_tracks(300, seed=9)
+    table = TrackTable(tracks)
+    q = query.casefold()
+    expected = [i for i, t in enumerate(tracks)
+                if q in t['name'].casefold() or q in t['artist'].casefold() or q in t['album'].casefold()]
+    assert table.search(query).tolist() == expected
+
+
+def test_search_keeps_the_given_row_order():
+    tracks = make_tracks(100, seed=2)
+    table = TrackTable(tracks)
+    rows = table.order('duration', descending=True)
+    hits = table.search('intro', rows).tolist()
+    assert set(hits) == set(table.search('intro').tolist())
+    assert hits == [r for r in rows.tolist() if r in set(hits)]
+
+
+def test_search_does_not_match_across_names():
+    tracks = [Track({'id': 1, 'name': 'ab'}), Track({'id': 2, 'name': 'cd'})]
+    assert TrackTable(tracks).search('bc').tolist() == []
+
+
+def test_empty_table():
+    table = TrackTable([])
+    assert len(table) == 0 and table.records() == []
+    assert table.index_of(1) is None
+    assert table.order('name').tolist() == [] and table.search('x').tolist() == []
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from fake_ffmpeg import fake_ffmpeg
+from transcode_cache import TranscodeCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = TranscodeCache(str(tmp_path / 'cache'), ffmpeg=fake_ffmpeg(tmp_path))
+    yield c
+    c.shutdown()
+
+
+def audio(tmp_path, name, size=100, fill=b'x'):
+    path = tmp_path / name
+    path.write_bytes(fill * size)
+    return str(path)
+
+
+def test_native_files_are_ready_as_they_are(cache, tmp_path):
+    path = audio(tmp_path, 'song.mp3')
+    ready = cache.prepare(path)
+    assert ready.done() and ready.result() == path
+    assert cache.playable_path(path) == path
+
+
+def test_prepare_converts_in_the_background(cache, tmp_path):
+    path = audio(tmp_path, 'song.m4a')
+    entry = cache.prepare(path).result(10)
+    assert entry.startswith(cache.cache_dir) and entry.endswith('.ogg')
+    assert open(entry, 'rb').read() == open(path, 'rb').read()
+    # converted once: now ready right away, and the blocking call agrees
+    again = cache.prepare(path)
+    assert again.done() and again.result() == entry
+    assert cache.playable_path(path) == entry
+
+
+def test_same_contents_share_one_entry(cache, tmp_path):
+    a = cache.prepare(audio(tmp_path, 'a.flac')).result(10)
+    b = cache.prepare(audio(tmp_path, 'b.flac')).result(10)
+    assert a == b and len(os.listdir(cache.cache_dir)) == 1
+
+
+def test_failed_conversion_fails_the_future(cache, tmp_path):
+    path = audio(tmp_path, 'broken.m4a')
+    with pytest.raises(Exception):
+        cache.prepare(path).result(10)
+    assert cache.playable_path(path) == path   # the blocking call falls back to the original
+
+
+def test_eviction_keeps_least_recently_used_out(tmp_path):
+    cache = TranscodeCache(str(tmp_path / 'cache'), max_bytes=250, ffmpeg=fake_ffmpeg(tmp_path))
+    try:
+        entries = [cache.prepare(audio(tmp_path, f'{c}.m4a', fill=c.encode())).result(10) for c in 'abc']
+        assert [os.path.exists(e) for e in entries] == [False, True, True]
+    finally:
+        cache.shutdown()
+
+
+def test_eviction_skips_pinned_files(tmp_path):
+    cache = TranscodeCache(str(tmp_path / 'cache'), max_bytes=250, ffmpeg=fake_ffmpeg(tmp_path))
+    try:
+        a = cache.prepare(audio(tmp_path, 'a.m4a', fill=b'a')).result(10)
+        b = cache.prepare(audio(tmp_path, 'b.m4a', fill=b'b')).result(10)
+        cache.pin('playing', a)
+        cache.pin('queued', b)
+        c = cache.prepare(audio(tmp_path, 'c.m4a', fill=b'c')).result(10)
+        assert all(os.path.exists(e) for e in (a, b, c))
+        cache.pin('queued', None)
+        d = cache.prepare(audio(tmp_path, 'd.m4a', fill=b'd')).result(10)
+        assert [os.path.exists(e) for e in (a, b, c, d)] == [True, False, False, True]
+    finally:
+        cache.shutdown()
@@ -0,0 +1,263 @@
+"""
+Compact in-memory track library.
+
+- Track is a `__slots__` record that reads and writes like the track dicts it replaces
+  (`track['path']`, `track.get('gain_db')`, `dict(track)`), so the scanner, analyzer and
+  library cache are unchanged. Artist, album, year and the duration label are interned:
+  a library with 2,000 albums keeps 2,000 album strings, not one per track.
+- TrackTable is the client-facing view of the library (what used to be a second list
+  of "safe" track dicts): ids and durations in typed numpy arrays, artist/album/year/
+  duration labels as int32 codes into a pool of distinct values, and names/filenames
+  shared with the Tracks. Dicts are only built on demand, for the rows a response needs.
+
+Sorting and filtering run over the columns: a sort key is a per-row rank array
+(`rank[codes]` for the coded columns), searches test each distinct artist/album once
+and scan the names as one casefolded string.
+"""
+
+import sys
+import operator
+from collections.abc import MutableMapping
+
+import numpy as np
+
+# Fields every scanned track may have; anything else lives in a per-track overflow dict
+FIELDS = ('id', 'name', 'path', 'filename', 'size', 'mtime_ns', 'artist', 'album', 'year',
+          'duration', 'duration_sec', 'duration_exact', 'seek_index',
+          'loudness_lufs', 'peak_dbfs', 'gain_db', 'waveform')
+_FIELD_SET = frozenset(FIELDS)
+# Repeated across many tracks; interned so equal values share one string object
+INTERNED = frozenset(('artist', 'album', 'year', 'duration'))
+
+
+class Track(MutableMapping):
+    """One library entry. Unset fields are missing keys, exactly as in a dict."""
+    __slots__ = FIELDS + ('_extra',)
+
+    def __init__(self, fields=(), **kwargs):
+        self._extra = None
+        self.update(fields, **kwargs)
+
+    @classmethod
+    def of(cls, track):
+        return track if isinstance(track, cls) else cls(track)
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def get(self, key, default=None):
+        # Hot path (table rebuilds, state reads); skips Mapping.get's try/except round trip
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        return default if self._extra is None else self._extra.get(key, default)
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            if key in INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from list(self._extra)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'Track({dict(self)!r})'
+
+
+def casefold_rank(strings):
+    """Rank of each string in case-insensitive order; strings that fold equal tie."""
+    folded = [s.casefold() for s in strings]
+    order = sorted(range(len(folded)), key=folded.__getitem__)
+    ordered = [folded[i] for i in order]
+    # a new rank starts wherever the sorted value changes
+    new = np.fromiter(map(operator.ne, ordered[1:], ordered[:-1]), dtype=np.int32, count=max(0, len(order) - 1))
+    rank = np.empty(len(folded), dtype=np.int32)
+    if order:
+        rank[order[0]] = 0
+        rank[order[1:]] = np.cumsum(new, dtype=np.int32)
+    return rank
+
+
+class StringColumn:
+    """Strings stored as int32 codes into `values` (each distinct string once)."""
+    __slots__ = ('values', 'codes', '_rank')
+
+    def __init__(self, strings):
+        index = {}
+        self.codes = np.fromiter((index.setdefault(s, len(index)) for s in strings), dtype=np.int32,
+                                 count=len(strings))
+        self.values = list(index)
+        self._rank = None
+
+    def sort_key(self):
+        """Per-row rank in case-insensitive order of the values."""
+        if self._rank is None:
+            self._rank = casefold_rank(self.values)
+        return self._rank[self.codes]
+
+    def contains(self, folded_query):
+        """Boolean row mask: value contains the (casefolded) query."""
+        hits = np.fromiter((folded_query in v.casefold() for v in self.values), dtype=bool,
+                           count=len(self.values))
+        return hits[self.codes]
+
+
+class TrackTable:
+    """Columnar, read-only view of a track list for the API. Rebuilt on library edits."""
+
+    SORT_KEYS = ('index', 'name', 'artist', 'album', 'year', 'duration')
+
+    def __init__(self, tracks):
+        n = len(tracks)
+        self.ids = np.fromiter((t['id'] for t in tracks), dtype=np.int64, count=n)
+        self.names = [t.get('name', 'Unknown') for t in tracks]
+        self.filenames = [t.get('filename', 'unknown.mp3') for t in tracks]
+        self.artist = StringColumn([t.get('artist', 'Unknown Artist') for t in tracks])
+        self.album = StringColumn([t.get('album', 'Unknown Album') for t in tracks])
+        self.year = StringColumn([t.get('year', 'Unknown Year') for t in tracks])
+        self.duration = StringColumn([t.get('duration', '0:00') for t in tracks])
+        self.seconds = np.fromiter((t.get('duration_sec', 0) or 0 for t in tracks), dtype=np.int32, count=n)
+        # id -> row lookups by binary search (ids are unique, usually already ascending)
+        self._id_rows = np.argsort(self.ids, kind='stable')
+        self._sorted_ids = self.ids[self._id_rows]
+        self._name_rank = None
+        self._name_text = None    # casefolded names joined by '\0', and each name's start offset
+        self._name_starts = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def index_of(self, track_id):
+        """Row of the track with id `track_id`, or None."""
+        if not isinstance(track_id, (int, np.integer)):
+            return None
+        sorted_ids = self._sorted_ids
+        pos = int(np.searchsorted(sorted_ids, track_id))
+        if pos < len(sorted_ids) and sorted_ids[pos] == track_id:
+            return int(self._id_rows[pos])
+        return None
+
+    # --- views ----------------------------------------------------------------
+
+    def records(self, indices=None, with_index=False):
+        """Track dicts (the shape clients get) for `indices`, or every row."""
+        rows = np.arange(len(self)) if indices is None else np.asarray(indices, dtype=np.int64)
+        names, filenames = self.names, self.filenames
+        artists, albums, years, durations = (c.values for c in (self.artist, self.album, self.year, self.duration))
+        columns = zip(rows.tolist(), self.ids[rows].tolist(), self.artist.codes[rows].tolist(),
+                      self.album.codes[rows].tolist(), self.year.codes[rows].tolist(),
+                      self.duration.codes[rows].tolist(), self.seconds[rows].tolist())
+        out = []
+        for r, track_id, a, b, y, d, seconds in columns:
+            rec = {
+                'id': track_id,
+                'name': names[r],
+                'filename': filenames[r],
+                'artist': artists[a],
+                'album': albums[b],
+                'year': years[y],
+                'duration': durations[d],
+                'duration_sec': seconds
+            }
+            if with_index:
+                rec['idx'] = r
+            out.append(rec)
+        return out
+
+    # --- sort / filter --------------------------------------------------------
+
+    def _name_key(self):
+        if self._name_rank is None:
+            self._name_rank = casefold_rank(self.names)
+        return self._name_rank
+
+    def order(self, key='index', descending=False):
+        """Row indices sorted by `key` (one of SORT_KEYS); ties keep library order."""
+        if key not in self.SORT_KEYS:
+            raise ValueError(f"Unknown sort key {key!r}")
+        n = len(self)
+        if key == 'index':
+            rows = np.arange(n)
+            return rows[::-1] if descending else rows
+        # Secondary keys make album and artist listings read naturally
+        if key == 'name':
+            keys = [self._name_key()]
+        elif key == 'artist':
+            keys = [self.artist.sort_key(), self.album.sort_key(), self._name_key()]
+        elif key == 'album':
+            keys = [self.album.sort_key(), self._name_key()]
+        elif key == 'year':
+            keys = [self.year.sort_key(), self.artist.sort_key(), self.album.sort_key()]
+        else:
+            keys = [self.seconds]
+        if descending:
+            keys = [-k.astype(np.int64) for k in keys]
+        return np.lexsort(keys[::-1])
+
+    def _name_index(self):
+        if self._name_text is None:
+            folded = [n.casefold().replace('\0', ' ') for n in self.names]
+            starts = np.zeros(len(folded), dtype=np.int64)
+            if folded:
+                np.cumsum([len(s) + 1 for s in folded[:-1]], out=starts[1:])
+            self._name_text = '\0'.join(folded)
+            self._name_starts = starts
+        return self._name_text, self._name_starts
+
+    def _name_contains(self, folded_query):
+        mask = np.zeros(len(self), dtype=bool)
+        text, starts = self._name_index()
+        find = text.find
+        pos = find(folded_query)
+        while pos >= 0:
+            row = int(np.searchsorted(starts, pos, side='right')) - 1
+            mask[row] = True
+            if row + 1 >= len(starts):
+                break
+            pos = find(folded_query, int(starts[row + 1]))
+        return mask
+
+    def search(self, query, rows=None):
+        """Row indices whose name, artist or album contains `query` (case-insensitive),
+        in the order of `rows` (default: library order)."""
+        q = query.casefold().replace('\0', '')
+        if not q:
+            return np.arange(len(self)) if rows is None else rows
+        mask = self.artist.contains(q) | self.album.contains(q) | self._name_contains(q)
+        if rows is None:
+            return np.flatnonzero(mask)
+        return rows[mask[rows]]
@@ -0,0 +1,238 @@
+"""
+Background transcoding cache for formats pygame.mixer.music can't stream reliably.
+
+`.m4a` and `.flac` are accepted by the library scanners but fail (or stutter) at play
+time. TranscodeCache converts such files once with ffmpeg into Ogg Vorbis and keeps
+the results in a size-bounded on-disk cache:
+
+- entries are keyed by a BLAKE2 hash of the file contents, so renamed/moved files
+  and duplicate uploads share one entry
+- the cache is LRU: hits refresh the file mtime, and the least recently used entries
+  are evicted once the total size exceeds `max_bytes`
+- hashing and conversion run on a small worker pool; concurrent requests for the same
+  file share one job
+- files the mixer has loaded or queued are pinned and never evicted
+
+MusicPlayer transcodes the upcoming track from its prefetch thread. A track started
+directly before its conversion is ready waits for it (prepare() hands back a Future)
+and starts once the file exists.
+"""
+
+import os
+import shutil
+import hashlib
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+NATIVE_EXTENSIONS = ('.mp3', '.wav', '.ogg')
+
+
+class TranscodeCache:
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, workers=1, ffmpeg=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transcode')
+        self._lock = threading.Lock()
+        self._pending = {}            # (path, size, mtime) -> Future of a submitted job
+        self._jobs = {}               # key -> Future of a conversion in progress
+        self._keys = {}               # (path, size, mtime) -> content key
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._pinned = {}             # mixer slot ('playing', 'queued') -> path it holds
+        self._total = 0
+        self._warned = False
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        # Rebuild LRU order from mtimes left by previous runs
+        found = []
+        for name in os.listdir(self.cache_dir):
+            full = os.path.join(self.cache_dir, name)
+            if name.endswith('.part.ogg'):
+                os.remove(full)  # interrupted conversion
+            elif name.endswith('.ogg'):
+                st = os.stat(full)
+                found.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+
+    def needs_transcode(self, path):
+        return not path.lower().endswith(NATIVE_EXTENSIONS)
+
+    def _memo(self, path):
+        st = os.stat(path)
+        return (path, st.st_size, st.st_mtime_ns)
+
+    def content_key(self, path, chunk_size=1 << 20):
+        memo = self._memo(path)
+        key = self._keys.get(memo)
+        if key is None:
+            h = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+            key = h.hexdigest()
+            self._keys[memo] = key
+        return key
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.ogg')
+
+    def _cached_entry(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        entry = self._entry_path(key)
+        try:
+            os.utime(entry)
+        except OSError:
+            return None
+        return entry
+
+    def lookup(self, path):
+        """Return the cached playable file for `path`, or None if it isn't converted yet.
+        Hashes the file the first time it is seen."""
+        return self._cached_entry(self.content_key(path))
+
+    def submit(self, path):
+        """Start converting `path` in the background (no-op if cached or in flight). Returns
+        a Future. Only stats the file; hashing happens on the worker."""
+        memo = self._memo(path)
+        with self._lock:
+            job = self._pending.get(memo)
+            if job is None:
+                job = self._pool.submit(self._convert, path, memo)
+                self._pending[memo] = job
+            return job
+
+    def _direct(self, path):
+        # True if pygame should get `path` as it is
+        if not self.needs_transcode(path):
+            return True
+        if not self.ffmpeg:
+            if not self._warned:
+                print("ffmpeg not found; playing .m4a/.flac files directly")
+                self._warned = True
+            return True
+        return False
+
+    def playable_path(self, path):
+        """Path pygame can play for `path`: the original, a cached conversion, or a
+        freshly converted file (blocks until it's done). Falls back to the original if
+        ffmpeg is missing or the conversion fails."""
+        if self._direct(path):
+            return path
+        try:
+            return self.lookup(path) or self.submit(path).result()
+        except Exception as e:
+            print(f"Transcode error for {path}: {e}")
+            return path
+
+    def prepare(self, path):
+        """Non-blocking playable_path() for the command actor: a Future of the path to
+        load. It is already done for native files and cached conversions; otherwise the
+        conversion (hashing included) runs in the background and the Future fails if it
+        does, rather than falling back to a file pygame can't play."""
+        if self._direct(path):
+            ready = Future()
+            ready.set_result(path)
+            return ready
+        key = self._keys.get(self._memo(path))
+        cached = self._cached_entry(key) if key is not None else None
+        if cached:
+            ready = Future()
+            ready.set_result(cached)
+            return ready
+        return self.submit(path)
+
+    def pin(self, slot, path):
+        """Record that the mixer's `slot` ('playing' or 'queued') holds `path` (None when
+        empty), so eviction leaves that file alone."""
+        with self._lock:
+            if path is None:
+                self._pinned.pop(slot, None)
+            else:
+                self._pinned[slot] = path
+
+    def _convert(self, path, memo):
+        try:
+            key = self.content_key(path)
+            cached = self._cached_entry(key)
+            if cached:
+                return cached
+            with self._lock:
+                job = self._jobs.get(key)  # same contents under another path, already converting
+                if job is None:
+                    done = self._jobs[key] = Future()
+            if job is not None:
+                return job.result()
+            return self._transcode(path, key, done)
+        except Exception as e:
+            print(f"Transcode error for {path}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(memo, None)
+
+    def _transcode(self, path, key, done):
+        try:
+            entry = self._entry_path(key)
+            if os.path.exists(entry):
+                with self._lock:
+                    if key not in self._entries:
+                        self._entries[key] = os.path.getsize(entry)
+                        self._total += self._entries[key]
+                done.set_result(entry)
+                return entry
+            tmp = os.path.join(self.cache_dir, key + '.part.ogg')
+            cmd = [self.ffmpeg, '-nostdin', '-v', 'error', '-y', '-i', path,
+                   '-vn', '-map_metadata', '-1', '-c:a', 'libvorbis', '-q:a', '6', tmp]
+            try:
+                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            except Exception:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            os.replace(tmp, entry)
+            size = os.path.getsize(entry)
+            with self._lock:
+                self._entries[key] = size
+                self._total += size
+                self._evict()
+            print(f"Transcoded {os.path.basename(path)} -> {os.path.basename(entry)}")
+            done.set_result(entry)
+            return entry
+        except BaseException as e:
+            done.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._jobs.pop(key, None)
+
+    def _evict(self):
+        # Called with the lock held; never evict the newest entry or a pinned file
+        if self._total <= self.max_bytes or not self._entries:
+            return
+        pinned = set(self._pinned.values())
+        newest = next(reversed(self._entries))
+        for key in list(self._entries):
+            if self._total <= self.max_bytes:
+                break
+            if key == newest or self._entry_path(key) in pinned:
+                continue
+            self._total -= self._entries.pop(key)
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
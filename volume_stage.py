@@ -0,0 +1,122 @@
+"""
+Coalescing, rate-limited volume stage shared by the desktop app and the server.
+
+The two-finger gesture reports a volume on every frame while it is held. Pushing each
+of those to the backend (a Spotify API request, or pygame.mixer.music.set_volume) is
+wasteful, so gesture volumes go through a VolumeStage instead:
+
+- deadband:      changes smaller than `deadband` percent are not sent mid-gesture
+                 (this absorbs landmark jitter)
+- rate limit:    at most one backend update every `min_interval` seconds
+- trailing edge: once the hand settles for `settle` seconds (or the rate window
+                 reopens), the latest value is applied exactly, so the final volume
+                 always matches the last gesture reading
+
+A one-second gesture typically costs 3-6 backend updates instead of ~30.
+"""
+
+import time
+import threading
+
+
+class VolumeStage:
+    def __init__(self, apply, deadband=3, min_interval=0.2, settle=0.25, clock=time.monotonic):
+        # apply(vol) pushes a 0-100 volume to the backend
+        self.apply = apply
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self.settle = settle
+        self.clock = clock
+
+        self.target = None
+        self.applied = None
+        self.last_apply = float('-inf')
+        self.last_submit = float('-inf')
+        self.submitted_count = 0
+        self.applied_count = 0
+
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def submit(self, vol):
+        """Offer a new gesture volume. Returns True if it was applied immediately."""
+        vol = max(0, min(100, int(vol)))
+        with self._lock:
+            t = self.clock()
+            self.target = vol
+            self.last_submit = t
+            self.submitted_count += 1
+            if vol == self.applied:
+                return False
+            if self._significant(vol) and t - self.last_apply >= self.min_interval:
+                self._mark_applied(vol, t)
+            else:
+                self._schedule(self._trailing_delay(vol, t))
+                return False
+        self.apply(vol)
+        return True
+
+    def flush(self):
+        """Apply the pending target right away (e.g. when the hand leaves the frame)."""
+        with self._lock:
+            self._cancel_timer()
+            vol = self.target
+            if vol is None or vol == self.applied:
+                return False
+            self._mark_applied(vol, self.clock())
+        self.apply(vol)
+        return True
+
+    def sync(self, vol):
+        """Record a volume set outside the stage (e.g. the UI slider) without re-applying it."""
+        with self._lock:
+            self._cancel_timer()
+            self.target = self.applied = vol
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_timer()
+
+    # --- internals (call with the lock held) ---------------------------------
+
+    def _significant(self, vol):
+        return self.applied is None or abs(vol - self.applied) >= self.deadband
+
+    def _mark_applied(self, vol, t):
+        self.applied = vol
+        self.last_apply = t
+        self.applied_count += 1
+
+    def _trailing_delay(self, vol, t):
+        rate_wait = max(0.0, self.min_interval - (t - self.last_apply))
+        if self._significant(vol):
+            return rate_wait
+        # small change: wait for the hand to settle before landing on the exact value
+        return max(rate_wait, self.settle - (t - self.last_submit))
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(max(0.0, delay), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            vol = self.target
+            if vol is None or vol == self.applied:
+                return
+            t = self.clock()
+            rate_ok = t - self.last_apply >= self.min_interval
+            settled = t - self.last_submit >= self.settle
+            if not (rate_ok and (self._significant(vol) or settled)):
+                self._schedule(self._trailing_delay(vol, t))
+                return
+            self._mark_applied(vol, t)
+        self.apply(vol)